@@ -0,0 +1,77 @@
+"""
+Micro-benchmark: JSON encode time of an /api/execute-query payload
+
+Compares FastAPI's default path for a returned dict (jsonable_encoder, then
+JSONResponse's json.dumps) against ResultJSONResponse (orjson with the
+Decimal/memoryview handlers in result_encoding).
+
+Usage:
+    python bench_result_encoding.py [--rows 100000] [--iterations 5]
+"""
+import argparse
+import datetime
+import time
+import uuid
+from decimal import Decimal
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from result_encoding import ResultJSONResponse
+
+def build_payload(row_count: int) -> dict:
+    """Synthetic orders result with the types psycopg2 returns"""
+    order_date = datetime.date(2024, 1, 1)
+    created_at = datetime.datetime(2024, 1, 1, 9, 30, 15, 123456)
+    rows = [
+        {
+            'order_id': i,
+            'order_uuid': uuid.UUID(int=i),
+            'customer_name': f"Customer {i % 1000}",
+            'order_date': order_date + datetime.timedelta(days=i % 365),
+            'created_at': created_at + datetime.timedelta(seconds=i),
+            'quantity': i % 20 + 1,
+            'unit_price': Decimal(f"{i % 500}.{i % 100:02d}"),
+            'total_amount': Decimal(f"{i % 9000}.{i % 100:02d}"),
+            'status': 'shipped' if i % 3 else 'pending'
+        }
+        for i in range(row_count)
+    ]
+    return {
+        'success': True,
+        'data': rows,
+        'columns': list(rows[0].keys()) if rows else [],
+        'row_count': row_count,
+        'has_more': False
+    }
+
+def time_per_call(func, iterations: int) -> float:
+    """Average milliseconds per call"""
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start_time) * 1000 / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    payload = build_payload(args.rows)
+
+    def before():
+        return JSONResponse(jsonable_encoder(payload)).body
+
+    def after():
+        return ResultJSONResponse(payload).body
+
+    before_ms = time_per_call(before, args.iterations)
+    after_ms = time_per_call(after, args.iterations)
+    per_100k = 100000 / args.rows
+
+    print(f"Payload: {args.rows} rows x {len(payload['columns'])} columns ({len(after()) / 1024 / 1024:.1f} MB)")
+    print(f"Per 100k rows, jsonable_encoder + json:  {before_ms * per_100k:.1f} ms")
+    print(f"Per 100k rows, ResultJSONResponse:       {after_ms * per_100k:.1f} ms")
+    print(f"Speedup: {before_ms / after_ms:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark: per-request cache key cost on a large schema
+
+Compares deriving the cache key with a full schema hash on every call
+(the pre-memoization behaviour) against the identity-memoized schema
+version used by QueryCache.
+
+Usage:
+    python bench_schema_version.py [--tables 500] [--columns 20] [--iterations 200]
+"""
+import argparse
+import time
+from query_cache import QueryCache
+
+def build_schema(table_count: int, column_count: int) -> dict:
+    """Synthetic schema in the get_all_schemas() format"""
+    return {
+        f"table_{t:04d}": {
+            'comment': None,
+            'columns': [
+                {
+                    'column_name': f"column_{c:03d}",
+                    'data_type': 'integer' if c % 3 else 'character varying',
+                    'is_nullable': 'YES',
+                    'column_default': None,
+                    'column_comment': None
+                }
+                for c in range(column_count)
+            ],
+            'primary_key': ['column_000'],
+            'foreign_keys': [],
+            'indexes': []
+        }
+        for t in range(table_count)
+    }
+
+def time_per_call(func, iterations: int) -> float:
+    """Average milliseconds per call"""
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start_time) * 1000 / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tables', type=int, default=500)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    schemas = build_schema(args.tables, args.columns)
+    question = "top 5 customers by revenue"
+
+    def before():
+        # get() and put() each hashed the full schema
+        for _ in range(2):
+            version = QueryCache._compute_schema_version(schemas)
+            QueryCache._get_cache_key(question, "bench", version)
+
+    def after():
+        for _ in range(2):
+            version = QueryCache._get_schema_version(schemas)
+            QueryCache._get_cache_key(question, "bench", version)
+
+    QueryCache._get_schema_version(schemas)  # first request after a schema load pays once
+
+    before_ms = time_per_call(before, args.iterations)
+    after_ms = time_per_call(after, args.iterations * 100)
+
+    print(f"Schema: {args.tables} tables x {args.columns} columns")
+    print(f"Per request (get + put), full hash:  {before_ms:.4f} ms")
+    print(f"Per request (get + put), memoized:   {after_ms:.4f} ms")
+    print(f"Speedup: {before_ms / after_ms:.0f}x")
+
+if __name__ == "__main__":
+    main()
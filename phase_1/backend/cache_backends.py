@@ -0,0 +1,593 @@
+"""
+Storage backends for the query cache's shared (L2) tier
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from cloudwatch_logger import get_logger
+
+logger = get_logger(__name__)
+
+def _stats_key(database_name: str) -> str:
+    """Key of a database's aggregate stats item (cache keys are hex digests, so no clash)"""
+    return f"stats#{database_name}"
+
+def merge_hot_questions(
+    current: List[Dict[str, Any]],
+    candidates: List[Dict[str, Any]],
+    top_n: int
+) -> List[Dict[str, Any]]:
+    """Merge questions with fresh hit totals into a top-N list (highest hit_count first)"""
+    merged = {question['cache_key']: question for question in current}
+    for question in candidates:
+        existing = merged.get(question['cache_key'])
+        if existing is None or question['hit_count'] >= existing['hit_count']:
+            merged[question['cache_key']] = question
+    return sorted(merged.values(), key=lambda question: question['hit_count'], reverse=True)[:top_n]
+
+class CacheBackend:
+    """
+    Interface for query cache storage
+
+    Items are dicts with the attributes QueryCache writes: cache_key,
+    natural_language_query, database_name, schema_version, generated_sql,
+    hit_count, created_at, last_accessed_at and ttl (epoch seconds).
+    """
+
+    name = "base"
+
+    def get_item(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Get a live (non-expired) item, or None"""
+        raise NotImplementedError
+
+    def put_item(self, item: Dict[str, Any]) -> bool:
+        """Insert or replace an item; returns True if the key was new"""
+        raise NotImplementedError
+
+    def increment_hits(self, pending: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Apply coalesced hit counts
+
+        Args:
+            pending: cache_key -> {'database_name', 'schema_version',
+                'natural_language_query', 'count', 'last_accessed_at'}
+
+        Returns:
+            cache_key -> hit_count after the increment, for keys that still exist
+        """
+        raise NotImplementedError
+
+    def update_stats(
+        self,
+        database_name: str,
+        entries_by_version: Dict[str, int],
+        hits_by_version: Dict[str, int],
+        hot_questions: List[Dict[str, Any]],
+        top_n: int
+    ) -> None:
+        """
+        Add to a database's aggregate counters
+
+        Args:
+            entries_by_version: schema_version -> new entries
+            hits_by_version: schema_version -> new hits
+            hot_questions: [{'cache_key', 'natural_language_query', 'hit_count'}]
+                with current totals, merged into the stored top-N list
+        """
+        raise NotImplementedError
+
+    def get_stats_record(self, database_name: str) -> Dict[str, Any]:
+        """
+        Read a database's aggregate counters (a single lookup)
+
+        Returns:
+            Dict with 'entries_by_version', 'hits_by_version' and 'hot_questions'
+        """
+        raise NotImplementedError
+
+    def connect(self) -> None:
+        """Open remote resources ahead of the first request (blocking; optional)"""
+
+    def close(self) -> None:
+        """Release backend resources"""
+
+class DynamoDBCacheBackend(CacheBackend):
+    """
+    DynamoDB table shared by every backend instance
+
+    boto3 is imported and the table looked up (or created) on first use or
+    in connect(), not in the constructor.
+    """
+
+    name = "dynamodb"
+
+    def __init__(
+        self,
+        table_name: str = "text2sql_query_cache",
+        region_name: str = "ap-south-1",
+        aws_access_key_id: Optional[str] = None,
+        aws_secret_access_key: Optional[str] = None
+    ):
+        self.table_name = table_name
+
+        self._session_kwargs = {'region_name': region_name}
+        if aws_access_key_id and aws_secret_access_key:
+            self._session_kwargs['aws_access_key_id'] = aws_access_key_id
+            self._session_kwargs['aws_secret_access_key'] = aws_secret_access_key
+
+        self.dynamodb = None
+        self.table = None
+        self._table_lock = threading.Lock()
+
+        logger.info(f"DynamoDB cache backend initialized", extra={
+            "extra_fields": {
+                "table_name": table_name,
+                "region": region_name
+            }
+        })
+
+    def _ensure_table_exists(self):
+        """Ensure DynamoDB table exists, create if it doesn't (checked once per process)"""
+        if self.table is not None:
+            return
+        
+        with self._table_lock:
+            if self.table is not None:
+                return
+            self._load_or_create_table()
+
+    def connect(self) -> None:
+        """Look up (or create) the table now instead of on the first request"""
+        self._ensure_table_exists()
+
+    def _load_or_create_table(self):
+        """Load the table, creating it if it doesn't exist"""
+        import boto3
+        from botocore.exceptions import ClientError
+
+        if self.dynamodb is None:
+            self.dynamodb = boto3.resource('dynamodb', **self._session_kwargs)
+
+        try:
+            table = self.dynamodb.Table(self.table_name)
+            # Try to load table to verify it exists
+            table.load()
+            self.table = table
+            logger.info(f"Connected to existing cache table", extra={
+                "extra_fields": {"table_name": self.table_name}
+            })
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ResourceNotFoundException':
+                logger.info(f"Cache table not found, creating...", extra={
+                    "extra_fields": {"table_name": self.table_name}
+                })
+                self._create_table()
+            else:
+                raise
+
+    def _create_table(self):
+        """Create DynamoDB table with proper schema"""
+        try:
+            table = self.dynamodb.create_table(
+                TableName=self.table_name,
+                KeySchema=[
+                    {
+                        'AttributeName': 'cache_key',
+                        'KeyType': 'HASH'  # Partition key
+                    }
+                ],
+                AttributeDefinitions=[
+                    {
+                        'AttributeName': 'cache_key',
+                        'AttributeType': 'S'
+                    },
+                    {
+                        'AttributeName': 'database_name',
+                        'AttributeType': 'S'
+                    },
+                    {
+                        'AttributeName': 'created_at',
+                        'AttributeType': 'N'
+                    }
+                ],
+                GlobalSecondaryIndexes=[
+                    {
+                        'IndexName': 'database-index',
+                        'KeySchema': [
+                            {
+                                'AttributeName': 'database_name',
+                                'KeyType': 'HASH'
+                            },
+                            {
+                                'AttributeName': 'created_at',
+                                'KeyType': 'RANGE'
+                            }
+                        ],
+                        'Projection': {
+                            'ProjectionType': 'ALL'
+                        }
+                    }
+                ],
+                BillingMode='PAY_PER_REQUEST',  # On-demand pricing
+                Tags=[
+                    {
+                        'Key': 'Application',
+                        'Value': 'Text2SQL'
+                    },
+                    {
+                        'Key': 'Purpose',
+                        'Value': 'Query Cache'
+                    }
+                ]
+            )
+            
+            # Wait for table to be created
+            table.meta.client.get_waiter('table_exists').wait(TableName=self.table_name)
+            
+            # Enable TTL
+            table.meta.client.update_time_to_live(
+                TableName=self.table_name,
+                TimeToLiveSpecification={
+                    'Enabled': True,
+                    'AttributeName': 'ttl'
+                }
+            )
+            
+            self.table = table
+            logger.info(f"Cache table created successfully", extra={
+                "extra_fields": {"table_name": self.table_name}
+            })
+            
+        except Exception as e:
+            logger.error(f"Failed to create cache table", extra={
+                "extra_fields": {
+                    "table_name": self.table_name,
+                    "error": str(e)
+                }
+            }, exc_info=True)
+            raise
+
+    def get_item(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Get an item by key (DynamoDB TTL deletion is lazy, so check expiry too)"""
+        self._ensure_table_exists()
+
+        response = self.table.get_item(Key={'cache_key': cache_key})
+        item = response.get('Item')
+        if item is None or int(item.get('ttl', 0)) <= time.time():
+            return None
+        return item
+
+    def put_item(self, item: Dict[str, Any]) -> bool:
+        """Insert or replace an item; returns True if the key was new"""
+        self._ensure_table_exists()
+        response = self.table.put_item(Item=item, ReturnValues='ALL_OLD')
+        return 'Attributes' not in response
+
+    def increment_hits(self, pending: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        """Apply coalesced hit increments (one update per key)"""
+        from botocore.exceptions import ClientError
+
+        self._ensure_table_exists()
+
+        totals = {}
+        for cache_key, hits in pending.items():
+            try:
+                response = self.table.update_item(
+                    Key={'cache_key': cache_key},
+                    UpdateExpression='ADD hit_count :inc SET last_accessed_at = :now',
+                    ConditionExpression='attribute_exists(cache_key)',
+                    ExpressionAttributeValues={
+                        ':inc': hits['count'],
+                        ':now': hits['last_accessed_at']
+                    },
+                    ReturnValues='UPDATED_NEW'
+                )
+                totals[cache_key] = int(response['Attributes']['hit_count'])
+            except ClientError as e:
+                # Entry expired or was deleted since the hit; nothing to count
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        return totals
+
+    def update_stats(
+        self,
+        database_name: str,
+        entries_by_version: Dict[str, int],
+        hits_by_version: Dict[str, int],
+        hot_questions: List[Dict[str, Any]],
+        top_n: int
+    ) -> None:
+        """
+        ADD to the database's stats item, then merge the hot-question list
+
+        Per-version counters are top-level attributes (entries#<version>,
+        hits#<version>) because ADD cannot create nested map paths.
+        """
+        self._ensure_table_exists()
+
+        names = {}
+        values = {
+            ':entries': sum(entries_by_version.values()),
+            ':hits': sum(hits_by_version.values())
+        }
+        adds = ['total_entries :entries', 'total_hits :hits']
+        for prefix, counts in (('entries', entries_by_version), ('hits', hits_by_version)):
+            for i, (schema_version, count) in enumerate(counts.items()):
+                names[f'#{prefix}{i}'] = f'{prefix}#{schema_version}'
+                values[f':{prefix}{i}'] = count
+                adds.append(f'#{prefix}{i} :{prefix}{i}')
+
+        update_kwargs = {
+            'Key': {'cache_key': _stats_key(database_name)},
+            'UpdateExpression': 'ADD ' + ', '.join(adds),
+            'ExpressionAttributeValues': values,
+            'ReturnValues': 'ALL_NEW'
+        }
+        if names:
+            update_kwargs['ExpressionAttributeNames'] = names
+        response = self.table.update_item(**update_kwargs)
+
+        if not hot_questions:
+            return
+
+        # Read-merge-write; concurrent flushes may briefly lose a candidate,
+        # which the next flush of that key restores
+        current = [
+            {**question, 'hit_count': int(question['hit_count'])}
+            for question in response['Attributes'].get('hot_questions', [])
+        ]
+        merged = merge_hot_questions(current, hot_questions, top_n)
+        if merged != current:
+            self.table.update_item(
+                Key={'cache_key': _stats_key(database_name)},
+                UpdateExpression='SET hot_questions = :hot',
+                ExpressionAttributeValues={':hot': merged}
+            )
+
+    def get_stats_record(self, database_name: str) -> Dict[str, Any]:
+        """Read the database's stats item"""
+        self._ensure_table_exists()
+
+        item = self.table.get_item(Key={'cache_key': _stats_key(database_name)}).get('Item', {})
+
+        record = {'entries_by_version': {}, 'hits_by_version': {}, 'hot_questions': []}
+        for attribute, value in item.items():
+            if attribute.startswith('entries#'):
+                record['entries_by_version'][attribute[len('entries#'):]] = int(value)
+            elif attribute.startswith('hits#'):
+                record['hits_by_version'][attribute[len('hits#'):]] = int(value)
+        record['hot_questions'] = [
+            {**question, 'hit_count': int(question['hit_count'])}
+            for question in item.get('hot_questions', [])
+        ]
+        return record
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Local, persistent cache in a SQLite file (WAL mode)
+
+    For single-node deployments, CI and benchmarks: no network and no AWS
+    account needed. Each thread gets its own connection; WAL lets readers
+    proceed while a write is in progress.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "query_cache.sqlite3"):
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS query_cache (
+                cache_key TEXT PRIMARY KEY,
+                natural_language_query TEXT NOT NULL,
+                database_name TEXT NOT NULL,
+                schema_version TEXT NOT NULL,
+                generated_sql TEXT NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0,
+                created_at INTEGER NOT NULL,
+                last_accessed_at INTEGER NOT NULL,
+                ttl INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_query_cache_database
+                ON query_cache (database_name, created_at);
+            CREATE INDEX IF NOT EXISTS idx_query_cache_ttl
+                ON query_cache (ttl);
+            CREATE TABLE IF NOT EXISTS query_cache_stats (
+                database_name TEXT NOT NULL,
+                schema_version TEXT NOT NULL,
+                entries INTEGER NOT NULL DEFAULT 0,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (database_name, schema_version)
+            );
+            CREATE TABLE IF NOT EXISTS query_cache_hot_questions (
+                database_name TEXT NOT NULL,
+                cache_key TEXT NOT NULL,
+                natural_language_query TEXT NOT NULL,
+                hit_count INTEGER NOT NULL,
+                PRIMARY KEY (database_name, cache_key)
+            );
+        """)
+
+        logger.info(f"SQLite cache backend initialized", extra={
+            "extra_fields": {"path": os.path.abspath(path)}
+        })
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def get_item(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Get a live item by key"""
+        row = self._connection().execute(
+            "SELECT * FROM query_cache WHERE cache_key = ? AND ttl > ?",
+            (cache_key, int(time.time()))
+        ).fetchone()
+        return dict(row) if row else None
+
+    def put_item(self, item: Dict[str, Any]) -> bool:
+        """Insert or replace an item, dropping expired rows along the way"""
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            existing = connection.execute(
+                "SELECT 1 FROM query_cache WHERE cache_key = ?", (item['cache_key'],)
+            ).fetchone()
+            connection.execute(
+                """
+                INSERT OR REPLACE INTO query_cache
+                (cache_key, natural_language_query, database_name, schema_version,
+                 generated_sql, hit_count, created_at, last_accessed_at, ttl)
+                VALUES (:cache_key, :natural_language_query, :database_name, :schema_version,
+                        :generated_sql, :hit_count, :created_at, :last_accessed_at, :ttl)
+                """,
+                item
+            )
+            connection.execute("DELETE FROM query_cache WHERE ttl <= ?", (int(time.time()),))
+        return existing is None
+
+    def increment_hits(self, pending: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        """Apply coalesced hit increments in one transaction"""
+        connection = self._connection()
+        totals = {}
+        with connection:
+            connection.execute("BEGIN")
+            for cache_key, hits in pending.items():
+                row = connection.execute(
+                    """
+                    UPDATE query_cache
+                    SET hit_count = hit_count + ?, last_accessed_at = ?
+                    WHERE cache_key = ?
+                    RETURNING hit_count
+                    """,
+                    (hits['count'], hits['last_accessed_at'], cache_key)
+                ).fetchone()
+                if row is not None:
+                    totals[cache_key] = row['hit_count']
+        return totals
+
+    def update_stats(
+        self,
+        database_name: str,
+        entries_by_version: Dict[str, int],
+        hits_by_version: Dict[str, int],
+        hot_questions: List[Dict[str, Any]],
+        top_n: int
+    ) -> None:
+        """Upsert per-version counters and trim the hot-question table to top_n"""
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            for schema_version in set(entries_by_version) | set(hits_by_version):
+                connection.execute(
+                    """
+                    INSERT INTO query_cache_stats (database_name, schema_version, entries, hits)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (database_name, schema_version) DO UPDATE SET
+                        entries = entries + excluded.entries,
+                        hits = hits + excluded.hits
+                    """,
+                    (
+                        database_name,
+                        schema_version,
+                        entries_by_version.get(schema_version, 0),
+                        hits_by_version.get(schema_version, 0)
+                    )
+                )
+
+            if hot_questions:
+                connection.executemany(
+                    """
+                    INSERT OR REPLACE INTO query_cache_hot_questions
+                    (database_name, cache_key, natural_language_query, hit_count)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    [
+                        (database_name, question['cache_key'], question['natural_language_query'], question['hit_count'])
+                        for question in hot_questions
+                    ]
+                )
+                connection.execute(
+                    """
+                    DELETE FROM query_cache_hot_questions
+                    WHERE database_name = ? AND cache_key NOT IN (
+                        SELECT cache_key FROM query_cache_hot_questions
+                        WHERE database_name = ?
+                        ORDER BY hit_count DESC
+                        LIMIT ?
+                    )
+                    """,
+                    (database_name, database_name, top_n)
+                )
+
+    def get_stats_record(self, database_name: str) -> Dict[str, Any]:
+        """Read the database's counters (one row per schema version) and hot questions"""
+        connection = self._connection()
+        record = {'entries_by_version': {}, 'hits_by_version': {}, 'hot_questions': []}
+
+        for row in connection.execute(
+            "SELECT schema_version, entries, hits FROM query_cache_stats WHERE database_name = ?",
+            (database_name,)
+        ):
+            record['entries_by_version'][row['schema_version']] = row['entries']
+            record['hits_by_version'][row['schema_version']] = row['hits']
+
+        record['hot_questions'] = [
+            dict(row) for row in connection.execute(
+                """
+                SELECT cache_key, natural_language_query, hit_count
+                FROM query_cache_hot_questions
+                WHERE database_name = ?
+                ORDER BY hit_count DESC
+                """,
+                (database_name,)
+            )
+        ]
+        return record
+
+    def close(self) -> None:
+        """Close every thread's connection"""
+        with self._connections_lock:
+            for connection in self._connections:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            self._connections.clear()
+
+def create_cache_backend(
+    backend: str = "dynamodb",
+    table_name: str = "text2sql_query_cache",
+    region_name: str = "ap-south-1",
+    aws_access_key_id: Optional[str] = None,
+    aws_secret_access_key: Optional[str] = None,
+    sqlite_path: str = "query_cache.sqlite3"
+) -> CacheBackend:
+    """Build the configured cache backend ('dynamodb' or 'sqlite')"""
+    if backend == "sqlite":
+        return SQLiteCacheBackend(path=sqlite_path)
+    if backend == "dynamodb":
+        return DynamoDBCacheBackend(
+            table_name=table_name,
+            region_name=region_name,
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key
+        )
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -0,0 +1,253 @@
+"""
+Background query cache warm-up from feedback history
+"""
+import asyncio
+import time
+from typing import Dict, Any, Iterable, Optional, Set
+from database import AsyncDatabaseManager
+from query_cache import QueryCache
+from cloudwatch_logger import get_logger
+
+logger = get_logger(__name__)
+
+class CacheWarmer:
+    """
+    Pre-generates SQL for popular questions so users hit a warm cache
+
+    For each database, the most often rated and best rated questions from
+    query_feedback are replayed against the current schema: questions that
+    already have a cache entry are skipped, the rest are generated (at most
+    `concurrency` at a time) and stored. A pass starts no new generations once
+    it has spent `max_cost_usd` (calls already in flight still finish).
+    Passes run at startup and whenever the schema cache sees a database's
+    schema change.
+    """
+
+    def __init__(
+        self,
+        query_cache: QueryCache,
+        schema_cache,
+        sql_generator,
+        flights,
+        max_questions: int = 50,
+        concurrency: int = 2,
+        lookback_days: int = 30,
+        max_cost_usd: float = 1.0
+    ):
+        self.query_cache = query_cache
+        self.schema_cache = schema_cache
+        self.sql_generator = sql_generator
+        self.flights = flights
+        self.max_questions = max_questions
+        self.concurrency = concurrency
+        self.lookback_days = lookback_days
+        self.max_cost_usd = max_cost_usd
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._requested: Set[str] = set()
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._total_cost_usd = 0.0
+
+        logger.info(f"CacheWarmer initialized", extra={
+            "extra_fields": {
+                "max_questions": max_questions,
+                "concurrency": concurrency,
+                "lookback_days": lookback_days,
+                "max_cost_usd": max_cost_usd
+            }
+        })
+
+    def start(self, database_names: Iterable[str]) -> None:
+        """Queue a warm-up pass for each database; call from the event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._requested.update(database_names)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def schedule(self, database_name: str) -> None:
+        """Queue a warm-up pass from any thread (schema cache listener)"""
+        if self._loop is None or self._loop.is_closed():
+            return
+
+        logger.info(f"Schema changed, scheduling cache warm-up", extra={
+            "extra_fields": {"database": database_name}
+        })
+        self._loop.call_soon_threadsafe(self.start, [database_name])
+
+    async def _run(self) -> None:
+        """Warm queued databases one at a time"""
+        while self._requested:
+            database_name = self._requested.pop()
+            try:
+                await self.warm_database(database_name)
+            except asyncio.CancelledError:
+                self._progress[database_name]['status'] = 'cancelled'
+                raise
+            except Exception as e:
+                self._progress[database_name].update({
+                    'status': 'failed',
+                    'error': str(e),
+                    'finished_at': time.time()
+                })
+                logger.error(f"Cache warm-up failed", extra={
+                    "extra_fields": {
+                        "database": database_name,
+                        "error": str(e)
+                    }
+                }, exc_info=True)
+
+    async def warm_database(self, database_name: str) -> Dict[str, Any]:
+        """Run one warm-up pass for a database and return its progress record"""
+        start_time = time.time()
+        progress = {
+            'status': 'running',
+            'questions': 0,
+            'processed': 0,
+            'warmed': 0,
+            'already_cached': 0,
+            'coalesced': 0,
+            'failed': 0,
+            'skipped_budget': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'cost_usd': 0.0,
+            'started_at': start_time,
+            'finished_at': None
+        }
+        self._progress[database_name] = progress
+
+        db_manager = AsyncDatabaseManager(database_name)
+        await db_manager.connect()
+
+        try:
+            schemas = await self.schema_cache.aget(db_manager)
+            questions = await db_manager.get_popular_questions(self.max_questions, self.lookback_days)
+        finally:
+            await db_manager.disconnect()
+
+        progress['questions'] = len(questions)
+
+        logger.info(f"Cache warm-up started", extra={
+            "extra_fields": {
+                "database": database_name,
+                "question_count": len(questions),
+                "concurrency": self.concurrency
+            }
+        })
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*[
+            self._warm_question(question['natural_language_query'], database_name, schemas, semaphore, progress)
+            for question in questions
+        ])
+
+        duration = time.time() - start_time
+        progress['status'] = 'completed'
+        progress['finished_at'] = time.time()
+
+        logger.info(f"Cache warm-up finished", extra={
+            "extra_fields": {
+                "database": database_name,
+                **{key: progress[key] for key in (
+                    'questions', 'warmed', 'already_cached', 'coalesced',
+                    'failed', 'skipped_budget', 'input_tokens', 'output_tokens'
+                )},
+                "cost_usd": round(progress['cost_usd'], 6),
+                "duration_ms": round(duration * 1000, 2)
+            }
+        })
+
+        return progress
+
+    async def _warm_question(
+        self,
+        question: str,
+        database_name: str,
+        schemas: Dict[str, Any],
+        semaphore: asyncio.Semaphore,
+        progress: Dict[str, Any]
+    ) -> None:
+        """Generate and cache one question unless it is cached or the budget is spent"""
+        async with semaphore:
+            try:
+                if await asyncio.to_thread(self.query_cache.contains, question, database_name, schemas):
+                    progress['already_cached'] += 1
+                    return
+
+                if progress['cost_usd'] >= self.max_cost_usd:
+                    progress['skipped_budget'] += 1
+                    return
+
+                async def generate_and_cache() -> Dict[str, Any]:
+                    result = await self.sql_generator.generate_sql(
+                        natural_language_query=question,
+                        database_schema=schemas,
+                        database_name=database_name,
+                        user_id="cache_warmer"
+                    )
+                    if result.get("success") and result.get("sql_query"):
+                        await asyncio.to_thread(
+                            self.query_cache.put, question, database_name, schemas, result["sql_query"]
+                        )
+                    return result
+
+                # Share the call with a user asking the same question right now
+                flight_key = QueryCache.build_cache_key(question, database_name, schemas)
+                result, shared = await self.flights.do(flight_key, generate_and_cache)
+
+                if shared:
+                    progress['coalesced'] += 1
+                elif result.get("success"):
+                    progress['warmed'] += 1
+                else:
+                    progress['failed'] += 1
+
+                usage = result.get('usage') if not shared else None
+                if usage:
+                    progress['input_tokens'] += usage['input_tokens'] + usage['cache_creation_input_tokens'] + usage['cache_read_input_tokens']
+                    progress['output_tokens'] += usage['output_tokens']
+                    progress['cost_usd'] += usage['cost_usd']
+                    self._total_cost_usd += usage['cost_usd']
+
+            except Exception as e:
+                progress['failed'] += 1
+                logger.warning(f"Cache warm-up question failed", extra={
+                    "extra_fields": {
+                        "database": database_name,
+                        "error": str(e)
+                    }
+                })
+            finally:
+                progress['processed'] += 1
+                logger.debug(f"Cache warm-up progress", extra={
+                    "extra_fields": {
+                        "database": database_name,
+                        "processed": progress['processed'],
+                        "questions": progress['questions'],
+                        "cost_usd": round(progress['cost_usd'], 6)
+                    }
+                })
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Progress and spend of the latest pass per database"""
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'queued': sorted(self._requested),
+            'total_cost_usd': round(self._total_cost_usd, 6),
+            'databases': {
+                name: {**progress, 'cost_usd': round(progress['cost_usd'], 6)}
+                for name, progress in self._progress.items()
+            }
+        }
+
+    async def close(self) -> None:
+        """Cancel a running pass; call on shutdown"""
+        self._requested.clear()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -2,17 +2,35 @@
 CloudWatch-based logging configuration for the application
 """
 import logging
+import queue
 import sys
 import json
-import os
+import threading
+import time
 from datetime import datetime
 from typing import Optional
-import boto3
-from botocore.exceptions import ClientError
+
+# PutLogEvents limits: 10,000 events and 1,048,576 bytes per batch, where each
+# event counts its UTF-8 message size plus 26 bytes; 256 KB per event
+MAX_BATCH_COUNT = 10000
+MAX_BATCH_BYTES = 1048576
+EVENT_OVERHEAD_BYTES = 26
+MAX_EVENT_BYTES = 262144 - EVENT_OVERHEAD_BYTES
 
 class CloudWatchHandler(logging.Handler):
     """
     Custom handler that sends logs to AWS CloudWatch Logs
+    
+    emit() only formats the record and puts it on a bounded queue; a
+    background thread sends batches of up to the PutLogEvents limits every
+    `flush_interval_seconds` (sooner when a batch fills up) and once more on
+    flush/close. When the queue is full, emit() waits up to
+    `queue_block_seconds` for space (0 = never wait) and then drops the
+    record, counting it.
+    
+    Construction does no network I/O: records queue up until connect()
+    has created the client and the log group/stream, so the remote setup
+    can run after the application is already serving.
     """
     def __init__(
         self, 
@@ -20,28 +38,69 @@ class CloudWatchHandler(logging.Handler):
         log_stream: str,
         region_name: str = 'ap-south-1',
         aws_access_key_id: Optional[str] = None,
-        aws_secret_access_key: Optional[str] = None
+        aws_secret_access_key: Optional[str] = None,
+        flush_interval_seconds: float = 2.0,
+        max_queue_size: int = 10000,
+        queue_block_seconds: float = 0.0,
+        max_send_attempts: int = 3
     ):
         super().__init__()
         
         self.log_group = log_group
         self.log_stream = log_stream
+        self.flush_interval_seconds = flush_interval_seconds
+        self.queue_block_seconds = queue_block_seconds
+        self.max_send_attempts = max_send_attempts
         
-        # Initialize CloudWatch Logs client
-        session_kwargs = {'region_name': region_name}
+        self._session_kwargs = {'region_name': region_name}
         if aws_access_key_id and aws_secret_access_key:
-            session_kwargs['aws_access_key_id'] = aws_access_key_id
-            session_kwargs['aws_secret_access_key'] = aws_secret_access_key
+            self._session_kwargs['aws_access_key_id'] = aws_access_key_id
+            self._session_kwargs['aws_secret_access_key'] = aws_secret_access_key
         
-        self.client = boto3.client('logs', **session_kwargs)
+        self.client = None
         self.sequence_token = None
+        self.status = 'pending'
+        self._connected = threading.Event()
+        
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'queued': 0,
+            'sent': 0,
+            'batches': 0,
+            'dropped_queue_full': 0,
+            'dropped_send_failed': 0,
+            'dropped_not_connected': 0,
+            'truncated': 0,
+            'send_errors': 0
+        }
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cloudwatch-log-flusher", daemon=True)
+        self._thread.start()
+    
+    def connect(self):
+        """Create the CloudWatch Logs client and the log group/stream (network I/O)"""
+        import boto3
+        
+        try:
+            self.client = boto3.client('logs', **self._session_kwargs)
+            
+            # Ensure log group and stream exist
+            self._ensure_log_group_exists()
+            self._ensure_log_stream_exists()
+        except Exception:
+            # A half-created client must not make close() treat the handler as connected
+            self.client = None
+            self.status = 'failed'
+            raise
         
-        # Ensure log group and stream exist
-        self._ensure_log_group_exists()
-        self._ensure_log_stream_exists()
+        self.status = 'ready'
+        self._connected.set()
     
     def _ensure_log_group_exists(self):
         """Create log group if it doesn't exist"""
+        from botocore.exceptions import ClientError
+        
         try:
             self.client.create_log_group(logGroupName=self.log_group)
             print(f"Created CloudWatch log group: {self.log_group}")
@@ -52,6 +111,8 @@ class CloudWatchHandler(logging.Handler):
     
     def _ensure_log_stream_exists(self):
         """Create log stream if it doesn't exist"""
+        from botocore.exceptions import ClientError
+        
         try:
             self.client.create_log_stream(
                 logGroupName=self.log_group,
@@ -66,6 +127,8 @@ class CloudWatchHandler(logging.Handler):
     
     def _get_sequence_token(self):
         """Get the current sequence token for the log stream"""
+        from botocore.exceptions import ClientError
+        
         try:
             response = self.client.describe_log_streams(
                 logGroupName=self.log_group,
@@ -76,37 +139,170 @@ class CloudWatchHandler(logging.Handler):
         except ClientError as e:
             print(f"Error getting sequence token: {e}")
     
+    def _count(self, name: str, amount: int = 1) -> None:
+        """Increment a handler counter"""
+        with self._stats_lock:
+            self._stats[name] += amount
+    
+    def handle(self, record):
+        # Records logged on the flusher thread itself (e.g. botocore warnings)
+        # would feed back into the queue; they still reach other handlers
+        if threading.current_thread() is self._thread:
+            return False
+        return super().handle(record)
+    
     def emit(self, record):
-        """Send log record to CloudWatch"""
+        """Queue a log record for the background flusher"""
         try:
+            message = self.format(record)
+            if len(message.encode('utf-8')) > MAX_EVENT_BYTES:
+                message = message.encode('utf-8')[:MAX_EVENT_BYTES].decode('utf-8', 'ignore')
+                self._count('truncated')
+            
             log_entry = {
                 'timestamp': int(record.created * 1000),  # CloudWatch expects milliseconds
-                'message': self.format(record)
+                'message': message
             }
             
-            # Prepare the request
+            try:
+                if self.queue_block_seconds > 0:
+                    self._queue.put(log_entry, timeout=self.queue_block_seconds)
+                else:
+                    self._queue.put_nowait(log_entry)
+                self._count('queued')
+            except queue.Full:
+                self._count('dropped_queue_full')
+                
+        except Exception as e:
+            print(f"Unexpected error in CloudWatch logging: {e}")
+    
+    def _run(self):
+        """Background loop: collect events into batches and send them"""
+        while not self._stop.is_set():
+            if not self._connected.is_set():
+                # Keep records queued until connect() has run
+                self._connected.wait(self.flush_interval_seconds)
+                continue
+            batch = self._collect_batch(self.flush_interval_seconds)
+            if batch:
+                self._send(batch)
+    
+    def _collect_batch(self, wait_seconds: float) -> list:
+        """
+        Take queued events up to the batch limits
+        
+        Waits up to wait_seconds for the batch to fill; a flush marker ends
+        the wait early and is acknowledged once the batch is sent.
+        """
+        batch = []
+        batch_bytes = 0
+        deadline = time.monotonic() + wait_seconds
+        
+        while len(batch) < MAX_BATCH_COUNT:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            
+            if isinstance(item, threading.Event):
+                # flush() marker: send what we have now, then wake the caller
+                if batch:
+                    self._send(batch)
+                item.set()
+                batch, batch_bytes = [], 0
+                deadline = time.monotonic()
+                continue
+            
+            size = len(item['message'].encode('utf-8')) + EVENT_OVERHEAD_BYTES
+            if batch_bytes + size > MAX_BATCH_BYTES:
+                self._send(batch)
+                batch, batch_bytes = [], 0
+            
+            batch.append(item)
+            batch_bytes += size
+        
+        return batch
+    
+    def _send(self, batch: list) -> None:
+        """Send one batch, retrying transient errors with backoff"""
+        from botocore.exceptions import ClientError
+        
+        # PutLogEvents requires chronological order within a batch
+        batch.sort(key=lambda event: event['timestamp'])
+        
+        for attempt in range(1, self.max_send_attempts + 1):
             put_kwargs = {
                 'logGroupName': self.log_group,
                 'logStreamName': self.log_stream,
-                'logEvents': [log_entry]
+                'logEvents': batch
             }
-            
             if self.sequence_token:
                 put_kwargs['sequenceToken'] = self.sequence_token
             
-            # Send to CloudWatch
-            response = self.client.put_log_events(**put_kwargs)
-            self.sequence_token = response.get('nextSequenceToken')
+            try:
+                response = self.client.put_log_events(**put_kwargs)
+                self.sequence_token = response.get('nextSequenceToken')
+                self._count('sent', len(batch))
+                self._count('batches')
+                return
+            except ClientError as e:
+                self._count('send_errors')
+                # If sequence token is invalid, get a new one before the next attempt
+                if e.response['Error']['Code'] == 'InvalidSequenceTokenException':
+                    self._get_sequence_token()
+                else:
+                    print(f"CloudWatch logging error: {e}")
+            except Exception as e:
+                self._count('send_errors')
+                print(f"Unexpected error in CloudWatch logging: {e}")
             
-        except ClientError as e:
-            # If sequence token is invalid, get a new one and retry
-            if e.response['Error']['Code'] == 'InvalidSequenceTokenException':
-                self._get_sequence_token()
-                self.emit(record)  # Retry
-            else:
-                print(f"CloudWatch logging error: {e}")
-        except Exception as e:
-            print(f"Unexpected error in CloudWatch logging: {e}")
+            if attempt < self.max_send_attempts:
+                time.sleep(min(2 ** (attempt - 1) * 0.5, 5))
+        
+        self._count('dropped_send_failed', len(batch))
+    
+    def flush(self, timeout: float = 10.0):
+        """Send everything queued so far and wait for it (up to timeout seconds)"""
+        if not self._thread.is_alive() or not self._connected.is_set():
+            return
+        
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+    
+    def close(self):
+        """Flush queued records and stop the background thread"""
+        if self._thread.is_alive():
+            self.flush()
+            self._stop.set()
+            self._connected.set()  # wake a thread still waiting for connect()
+            self._thread.join(timeout=self.flush_interval_seconds + 1)
+        
+        if self.client is None:
+            # Never connected: whatever was queued cannot be delivered
+            dropped = 0
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if not isinstance(item, threading.Event):
+                    dropped += 1
+            self._count('dropped_not_connected', dropped)
+        super().close()
+    
+    def get_stats(self) -> dict:
+        """Get queue depth and delivery/drop counters"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['status'] = self.status
+        stats['queue_size'] = self._queue.qsize()
+        stats['queue_max_size'] = self._queue.maxsize
+        return stats
 
 class JSONFormatter(logging.Formatter):
     """
@@ -133,6 +329,34 @@ class JSONFormatter(logging.Formatter):
         
         return json.dumps(log_data)
 
+# Active CloudWatch handler, if setup_logging configured one
+_cloudwatch_handler: Optional[CloudWatchHandler] = None
+
+# Console level to fall back to if CloudWatch can't be reached (None = console already on)
+_fallback_console_level: Optional[int] = None
+
+def _console_handler(level: int) -> logging.Handler:
+    """Plain-text stdout handler"""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setLevel(level)
+    handler.setFormatter(logging.Formatter(
+        fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    ))
+    return handler
+
+def _fall_back_to_console(handler: CloudWatchHandler, error: Exception) -> None:
+    """Detach a handler that failed to connect, making sure logs still go somewhere"""
+    print(f"✗ Failed to setup CloudWatch logging: {error}")
+    print("  Falling back to console-only logging")
+    
+    root_logger = logging.getLogger()
+    root_logger.removeHandler(handler)
+    handler.close()
+    if _fallback_console_level is not None:
+        # Add console handler as fallback
+        root_logger.addHandler(_console_handler(_fallback_console_level))
+
 def setup_logging(
     app_name: str = "text2sql",
     log_level: str = "INFO",
@@ -140,7 +364,11 @@ def setup_logging(
     region_name: str = 'ap-south-1',
     aws_access_key_id: Optional[str] = None,
     aws_secret_access_key: Optional[str] = None,
-    enable_console: bool = True
+    enable_console: bool = True,
+    flush_interval_seconds: float = 2.0,
+    max_queue_size: int = 10000,
+    queue_block_seconds: float = 0.0,
+    connect: bool = True
 ):
     """
     Setup CloudWatch-based logging configuration
@@ -153,7 +381,13 @@ def setup_logging(
         aws_access_key_id: AWS access key (optional, uses IAM role if not provided)
         aws_secret_access_key: AWS secret key (optional, uses IAM role if not provided)
         enable_console: Whether to also log to console (useful for development)
+        flush_interval_seconds: How often queued records are sent to CloudWatch
+        max_queue_size: Records buffered before new ones wait or are dropped
+        queue_block_seconds: How long a full queue blocks the logging call (0 = drop at once)
+        connect: Create the CloudWatch log group/stream now; with False, records
+            are queued until connect_log_handler() is called (e.g. after startup)
     """
+    global _cloudwatch_handler, _fallback_console_level
     
     # Convert log level string to logging constant
     numeric_level = getattr(logging, log_level.upper(), logging.INFO)
@@ -166,54 +400,59 @@ def setup_logging(
     log_stream = f"{app_name}-{datetime.utcnow().strftime('%Y-%m-%d-%H-%M-%S')}"
     
     # Create formatters
-    console_formatter = logging.Formatter(
-        fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
     json_formatter = JSONFormatter()
     
     # Configure root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.DEBUG)  # Capture all levels
     
-    # Remove existing handlers
+    # Remove existing handlers (stopping a previous CloudWatch flusher)
+    if _cloudwatch_handler is not None:
+        _cloudwatch_handler.close()
+        _cloudwatch_handler = None
     root_logger.handlers.clear()
     
     # Console handler (optional, for development)
     if enable_console:
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(numeric_level)
-        console_handler.setFormatter(console_formatter)
-        root_logger.addHandler(console_handler)
+        root_logger.addHandler(_console_handler(numeric_level))
+    _fallback_console_level = None if enable_console else numeric_level
     
     # CloudWatch handler
+    cloudwatch_handler = None
     try:
         cloudwatch_handler = CloudWatchHandler(
             log_group=log_group,
             log_stream=log_stream,
             region_name=region_name,
             aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key
+            aws_secret_access_key=aws_secret_access_key,
+            flush_interval_seconds=flush_interval_seconds,
+            max_queue_size=max_queue_size,
+            queue_block_seconds=queue_block_seconds
         )
         cloudwatch_handler.setLevel(numeric_level)
         cloudwatch_handler.setFormatter(json_formatter)
         root_logger.addHandler(cloudwatch_handler)
+        _cloudwatch_handler = cloudwatch_handler
         
-        print(f"✓ CloudWatch logging configured")
+        if connect:
+            cloudwatch_handler.connect()
+            print(f"✓ CloudWatch logging configured")
+        else:
+            print(f"✓ CloudWatch logging configured (connecting in background)")
         print(f"  Log Group: {log_group}")
         print(f"  Log Stream: {log_stream}")
         print(f"  Region: {region_name}")
         
     except Exception as e:
-        print(f"✗ Failed to setup CloudWatch logging: {e}")
-        print("  Falling back to console-only logging")
-        if not enable_console:
-            # Add console handler as fallback
-            console_handler = logging.StreamHandler(sys.stdout)
-            console_handler.setLevel(numeric_level)
-            console_handler.setFormatter(console_formatter)
-            root_logger.addHandler(console_handler)
+        _cloudwatch_handler = None
+        if cloudwatch_handler is not None:
+            _fall_back_to_console(cloudwatch_handler, e)
+        else:
+            print(f"✗ Failed to setup CloudWatch logging: {e}")
+            print("  Falling back to console-only logging")
+            if not enable_console:
+                root_logger.addHandler(_console_handler(numeric_level))
     
     # Set third-party library log levels to reduce noise
     logging.getLogger("uvicorn").setLevel(logging.WARNING)
@@ -236,6 +475,52 @@ def setup_logging(
     
     return logger
 
+def connect_log_handler() -> bool:
+    """
+    Connect the CloudWatch handler set up with connect=False
+    
+    Blocking (network I/O); run it off the event loop. On failure the
+    handler is removed, logging falls back to the console and the error
+    is re-raised.
+    
+    Returns:
+        True if CloudWatch logging is live, False if no handler is set up
+    """
+    global _cloudwatch_handler
+    
+    handler = _cloudwatch_handler
+    if handler is None:
+        return False
+    if handler.status == 'ready':
+        return True
+    
+    try:
+        handler.connect()
+    except Exception as e:
+        _cloudwatch_handler = None
+        _fall_back_to_console(handler, e)
+        raise
+    
+    print(f"✓ CloudWatch logging connected")
+    return True
+
+def get_log_handler_stats() -> Optional[dict]:
+    """
+    Get queue and delivery counters of the CloudWatch handler
+    
+    Returns:
+        Counters (queued, sent, batches, dropped_queue_full,
+        dropped_send_failed, ...), or None if CloudWatch logging is not active
+    """
+    if _cloudwatch_handler is None:
+        return None
+    return _cloudwatch_handler.get_stats()
+
+def flush_logs(timeout: float = 10.0) -> None:
+    """Send all queued CloudWatch records now; call on shutdown"""
+    if _cloudwatch_handler is not None:
+        _cloudwatch_handler.flush(timeout)
+
 def get_logger(name: str) -> logging.Logger:
     """
     Get a logger instance with the given name
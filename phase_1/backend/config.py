@@ -11,6 +11,29 @@ class Settings(BaseSettings):
     db_user: str
     db_password: str
     
+    # Connection Pooling (one pool per team database)
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 10
+    db_pool_max_idle_seconds: int = 300  # Idle connections above min size are closed after this
+    db_pool_checkout_timeout: float = 10.0  # Seconds to wait for a free connection
+    db_pool_health_check_idle_seconds: int = 30  # Ping connections idle longer than this on checkout
+    db_stream_itersize: int = 2000  # Rows per fetch when streaming results from a server-side cursor
+    
+    # Result Paging (large results are returned a page at a time via a result handle)
+    result_page_size: int = 500  # Rows per page
+    result_ttl_seconds: int = 300  # Unread results are dropped after this
+    result_session_budget_mb: int = 50  # Spooled result memory per session
+    result_read_ahead_pages: int = 2  # Pages read ahead of the last page requested
+    result_cursor_idle_seconds: float = 60.0  # A paused result's cursor is closed (and the result dropped) after this
+    result_max_open_cursors_per_session: int = 2  # Paused results holding a connection; the oldest drain into memory beyond this
+    result_max_open_cursors_per_database: int = 5  # Same, per team database (keep below DB_POOL_MAX_SIZE)
+    
+    # User Query Limits (enforced on the database connection running the query)
+    query_statement_timeout_seconds: float = 30.0  # Per statement (0 = no limit)
+    query_max_rows: int = 100000  # Rows returned before the result is truncated (0 = no limit)
+    query_max_result_mb: float = 20.0  # Result size (JSON) before it is truncated (0 = no limit)
+    query_team_limits: Dict[str, Dict[str, float]] = {}  # Per-team overrides, e.g. {"sales": {"statement_timeout_seconds": 60, "max_rows": 50000}}
+    
     # Anthropic API
     anthropic_api_key: str
     
@@ -25,17 +48,49 @@ class Settings(BaseSettings):
     cloudwatch_log_group: str = "/aws/text2sql/backend"
     enable_console_logging: bool = True  # Set to False in production
     log_level: str = "INFO"
+    log_flush_interval_seconds: float = 2.0  # Records are sent to CloudWatch in batches this often
+    log_queue_max_size: int = 10000  # Records buffered before new ones wait or are dropped
+    log_queue_block_seconds: float = 0.0  # Max wait for space when the buffer is full (0 = drop)
+    
+    # Schema Caching
+    schema_cache_ttl_seconds: int = 300  # Hard limit before a full re-read
+    schema_check_interval_seconds: int = 5  # Serve without any DB work for this long
+    
+    # Schema Pruning (send only relevant tables to the LLM)
+    enable_schema_pruning: bool = True
+    schema_pruning_top_k: int = 8  # Tables kept before adding FK neighbours
+    schema_pruning_min_tables: int = 15  # Smaller schemas are sent in full
     
     # Query Caching (Optional)
     enable_cache: bool = True
+    cache_backend: str = "dynamodb"  # "dynamodb" (shared) or "sqlite" (local file)
     cache_table_name: str = "text2sql_query_cache"
+    cache_sqlite_path: str = "query_cache.sqlite3"  # Used when cache_backend is "sqlite"
     cache_ttl_days: int = 30
+    cache_l1_max_entries: int = 1000  # In-process LRU in front of the backend
+    cache_negative_ttl_seconds: int = 0  # Remember misses locally for this long (0 = off)
+    cache_hit_flush_interval_seconds: int = 30  # Hit counts are written to the backend in batches
+    cache_semantic_threshold: float = 0.0  # Reuse SQL of paraphrases at this similarity (0 = off, e.g. 0.85)
+    cache_semantic_max_entries: int = 5000  # Questions indexed per database/schema version
+    cache_stats_top_questions: int = 10  # Hot questions kept in the per-database stats
+    
+    # Cache Warm-up (replay popular questions from query_feedback)
+    enable_cache_warmup: bool = False
+    cache_warmup_max_questions: int = 50  # Per database and pass
+    cache_warmup_concurrency: int = 2  # Concurrent LLM calls per pass
+    cache_warmup_lookback_days: int = 30  # Feedback window considered
+    cache_warmup_max_cost_usd: float = 1.0  # Stop generating once a pass spent this much
     
     # LangFuse Observability (Optional)
     enable_langfuse: bool = True
     langfuse_public_key: str = ""
     langfuse_secret_key: str = ""
     langfuse_host: str = "https://cloud.langfuse.com"  # or self-hosted URL
+    langfuse_flush_interval_seconds: float = 5.0  # Events are exported in batches this often
+    langfuse_queue_max_size: int = 1000  # Events buffered before new ones are dropped
+    langfuse_batch_size: int = 100  # Events per export (one client flush each)
+    langfuse_sample_rate: float = 1.0  # Fraction of generations traced
+    langfuse_team_sample_rates: Dict[str, float] = {}  # Per-team overrides, e.g. {"sales": 0.1}
     
     class Config:
         env_file = ".env"
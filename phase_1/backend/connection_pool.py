@@ -0,0 +1,419 @@
+"""
+Bounded PostgreSQL connection pools, one per target database
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+import psycopg2
+from psycopg2 import extensions
+from config import settings
+from cloudwatch_logger import get_logger
+
+logger = get_logger(__name__)
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections to a single database
+
+    Connections are borrowed per request and returned afterwards. The pool
+    never holds more than `max_size` connections, keeps at least `min_size`
+    open, health-checks connections that sat idle before handing them out,
+    and closes connections that stay idle longer than `max_idle_seconds`.
+    """
+
+    def __init__(
+        self,
+        database_name: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_idle_seconds: int = 300,
+        checkout_timeout: float = 10.0,
+        health_check_idle_seconds: int = 30
+    ):
+        self.database_name = database_name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.checkout_timeout = checkout_timeout
+        self.health_check_idle_seconds = health_check_idle_seconds
+
+        # Idle connections as (connection, returned_at); most recently used on the right
+        self._idle = deque()
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+        self._stats = {
+            'checkouts': 0,
+            'connects': 0,
+            'connect_failures': 0,
+            'health_check_failures': 0,
+            'reaped': 0,
+            'discarded': 0,
+            'timeouts': 0,
+            'wait_time_ms_total': 0.0,
+            'wait_time_ms_max': 0.0
+        }
+
+        logger.info(f"Connection pool created", extra={
+            "extra_fields": {
+                "database": database_name,
+                "min_size": min_size,
+                "max_size": max_size,
+                "max_idle_seconds": max_idle_seconds
+            }
+        })
+
+        self._fill_to_min()
+
+    def _open_connection(self):
+        """Open a new physical connection"""
+        start_time = time.time()
+
+        try:
+            connection = psycopg2.connect(
+                host=settings.db_host,
+                port=settings.db_port,
+                database=self.database_name,
+                user=settings.db_user,
+                password=settings.db_password,
+                connect_timeout=10  # 10 second timeout
+            )
+
+            duration = time.time() - start_time
+            with self._condition:
+                self._stats['connects'] += 1
+
+            logger.info(f"Successfully connected to database", extra={
+                "extra_fields": {
+                    "database": self.database_name,
+                    "connection_time_ms": round(duration * 1000, 2)
+                }
+            })
+
+            return connection
+
+        except Exception as e:
+            duration = time.time() - start_time
+            with self._condition:
+                self._stats['connect_failures'] += 1
+            logger.error(f"Database connection failed", extra={
+                "extra_fields": {
+                    "database": self.database_name,
+                    "host": settings.db_host,
+                    "error": str(e),
+                    "error_type": type(e).__name__,
+                    "connection_time_ms": round(duration * 1000, 2)
+                }
+            }, exc_info=True)
+            raise
+
+    def _close_connection(self, connection) -> None:
+        """Close a physical connection, ignoring errors"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _fill_to_min(self) -> None:
+        """Open connections until the pool holds min_size of them"""
+        while True:
+            with self._condition:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+
+            try:
+                connection = self._open_connection()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                return
+
+            with self._condition:
+                self._idle.append((connection, time.time()))
+                self._condition.notify()
+
+    def _is_healthy(self, connection, idle_seconds: float) -> bool:
+        """Check a connection before handing it out"""
+        if connection.closed:
+            return False
+
+        # Only pay for a round trip if the connection sat idle for a while
+        if idle_seconds < self.health_check_idle_seconds:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check", extra={
+                "extra_fields": {
+                    "database": self.database_name,
+                    "idle_seconds": round(idle_seconds, 1),
+                    "error": str(e)
+                }
+            })
+            return False
+
+    def getconn(self, timeout: Optional[float] = None):
+        """
+        Borrow a connection from the pool
+
+        Raises:
+            PoolTimeoutError: if the pool stays exhausted for `timeout` seconds
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start_time = time.time()
+        deadline = start_time + timeout
+
+        while True:
+            connection = None
+            returned_at = None
+            open_new = False
+
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError(f"Connection pool for {self.database_name} is closed")
+                    if self._idle:
+                        connection, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        open_new = True
+                        break
+
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        logger.error(f"Connection pool exhausted", extra={
+                            "extra_fields": self._stats_locked()
+                        })
+                        raise PoolTimeoutError(
+                            f"No connection to {self.database_name} available within {timeout}s"
+                        )
+
+                    self._waiting += 1
+                    try:
+                        self._condition.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if open_new:
+                try:
+                    connection = self._open_connection()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+            elif not self._is_healthy(connection, time.time() - returned_at):
+                with self._condition:
+                    self._stats['health_check_failures'] += 1
+                self._discard(connection)
+                continue
+
+            wait_ms = (time.time() - start_time) * 1000
+            with self._condition:
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_ms_total'] += wait_ms
+                self._stats['wait_time_ms_max'] = max(self._stats['wait_time_ms_max'], wait_ms)
+
+            return connection
+
+    def putconn(self, connection, discard: bool = False) -> None:
+        """Return a borrowed connection to the pool"""
+        if not discard and not connection.closed:
+            try:
+                # Never hand out a connection with an open transaction
+                if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except Exception:
+                discard = True
+
+        if discard or connection.closed:
+            self._discard(connection)
+            return
+
+        with self._condition:
+            if self._closed:
+                self._size -= 1
+                self._close_connection(connection)
+                return
+            self._idle.append((connection, time.time()))
+            self._condition.notify()
+
+    def _discard(self, connection) -> None:
+        """Close a connection and free its slot"""
+        self._close_connection(connection)
+        with self._condition:
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._condition.notify()
+
+        self._fill_to_min()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Borrow a connection for the duration of a with-block; open transactions are rolled back on return"""
+        connection = self.getconn(timeout)
+        try:
+            yield connection
+        finally:
+            # Broken connections are detected (closed / failed rollback) and discarded
+            self.putconn(connection)
+
+    def reap_idle(self) -> int:
+        """Close connections idle for longer than max_idle_seconds, keeping min_size"""
+        now = time.time()
+        reaped = []
+
+        with self._condition:
+            # Oldest idle connections are on the left
+            while (
+                self._idle
+                and self._size > self.min_size
+                and now - self._idle[0][1] > self.max_idle_seconds
+            ):
+                connection, _ = self._idle.popleft()
+                self._size -= 1
+                self._stats['reaped'] += 1
+                reaped.append(connection)
+
+        for connection in reaped:
+            self._close_connection(connection)
+
+        if reaped:
+            logger.info(f"Reaped idle pooled connections", extra={
+                "extra_fields": {
+                    "database": self.database_name,
+                    "reaped": len(reaped)
+                }
+            })
+
+        return len(reaped)
+
+    def _stats_locked(self) -> Dict[str, Any]:
+        """Build the stats dict; caller must hold the condition"""
+        checkouts = self._stats['checkouts']
+        return {
+            'database': self.database_name,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'size': self._size,
+            'idle': len(self._idle),
+            'in_use': self._size - len(self._idle),
+            'waiting': self._waiting,
+            'checkouts': checkouts,
+            'connects': self._stats['connects'],
+            'connect_failures': self._stats['connect_failures'],
+            'health_check_failures': self._stats['health_check_failures'],
+            'reaped': self._stats['reaped'],
+            'discarded': self._stats['discarded'],
+            'timeouts': self._stats['timeouts'],
+            'avg_wait_ms': round(self._stats['wait_time_ms_total'] / checkouts, 2) if checkouts else 0,
+            'max_wait_ms': round(self._stats['wait_time_ms_max'], 2)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool utilisation and lifetime counters"""
+        with self._condition:
+            return self._stats_locked()
+
+    def close(self) -> None:
+        """Close all idle connections; borrowed ones are closed when returned"""
+        with self._condition:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._condition.notify_all()
+
+        for connection in idle:
+            self._close_connection(connection)
+
+        logger.info(f"Connection pool closed", extra={
+            "extra_fields": {
+                "database": self.database_name,
+                "closed_connections": len(idle)
+            }
+        })
+
+# Pool registry (one pool per database, shared by all sessions)
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+_reaper_thread: Optional[threading.Thread] = None
+_reaper_stop = threading.Event()
+
+def _reap_loop() -> None:
+    """Background loop closing idle connections in all pools"""
+    interval = max(1, min(60, settings.db_pool_max_idle_seconds // 2))
+    while not _reaper_stop.wait(interval):
+        for pool in list(_pools.values()):
+            try:
+                pool.reap_idle()
+            except Exception as e:
+                logger.error(f"Error reaping idle connections", extra={
+                    "extra_fields": {
+                        "database": pool.database_name,
+                        "error": str(e)
+                    }
+                }, exc_info=True)
+
+def get_pool(database_name: str) -> ConnectionPool:
+    """Get (or lazily create) the shared pool for a database"""
+    global _reaper_thread
+
+    pool = _pools.get(database_name)
+    if pool is not None:
+        return pool
+
+    # Built outside the lock: filling to min_size connects to the database,
+    # and a slow or unreachable one must not hold up lookups for the others
+    new_pool = ConnectionPool(
+        database_name,
+        min_size=settings.db_pool_min_size,
+        max_size=settings.db_pool_max_size,
+        max_idle_seconds=settings.db_pool_max_idle_seconds,
+        checkout_timeout=settings.db_pool_checkout_timeout,
+        health_check_idle_seconds=settings.db_pool_health_check_idle_seconds
+    )
+
+    with _pools_lock:
+        pool = _pools.setdefault(database_name, new_pool)
+
+        if _reaper_thread is None:
+            _reaper_stop.clear()
+            _reaper_thread = threading.Thread(target=_reap_loop, name="db-pool-reaper", daemon=True)
+            _reaper_thread.start()
+
+    if pool is not new_pool:
+        # Another thread created this database's pool first
+        new_pool.close()
+
+    return pool
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Get stats for every pool, keyed by database name"""
+    return {name: pool.stats() for name, pool in list(_pools.items())}
+
+def close_all_pools() -> None:
+    """Close every pool and stop the idle reaper"""
+    global _reaper_thread
+
+    _reaper_stop.set()
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+        _reaper_thread = None
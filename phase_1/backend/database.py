@@ -1,29 +1,117 @@
 """
 Database connection and query execution utilities with comprehensive logging
 """
+import asyncio
+import threading
+import uuid
 import psycopg2
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Optional
-from config import settings
-from cloudwatch_logger import get_logger, log_with_context
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator
+from config import settings, TEAM_CREDENTIALS
+from cloudwatch_logger import get_logger
+from connection_pool import ConnectionPool, get_pool
 import time
+from contextlib import contextmanager
+from psycopg2.extensions import QueryCanceledError
+from metrics import (
+    DB_QUERY_DURATION, DB_QUERY_ERRORS, DB_ROWS_RETURNED,
+    DB_QUERY_TIMEOUTS, DB_QUERY_CANCELS, DB_RESULTS_TRUNCATED
+)
+from result_encoding import dumps
 
 logger = get_logger(__name__)
 
+class QueryLimits:
+    """Guards for user queries: statement timeout and result row/byte caps (0 = none)"""
+    
+    def __init__(self, statement_timeout_seconds: float = 0, max_rows: int = 0, max_bytes: int = 0):
+        self.statement_timeout_seconds = statement_timeout_seconds
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+    
+    @classmethod
+    def for_team(cls, team: Optional[str]) -> "QueryLimits":
+        """The QUERY_* settings with the team's QUERY_TEAM_LIMITS overrides applied"""
+        overrides = settings.query_team_limits.get(team, {}) if team else {}
+        return cls(
+            statement_timeout_seconds=overrides.get('statement_timeout_seconds', settings.query_statement_timeout_seconds),
+            max_rows=int(overrides.get('max_rows', settings.query_max_rows)),
+            max_bytes=int(overrides.get('max_result_mb', settings.query_max_result_mb) * 1024 * 1024)
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'statement_timeout_seconds': self.statement_timeout_seconds,
+            'max_rows': self.max_rows,
+            'max_bytes': self.max_bytes
+        }
+
+class RunningQuery:
+    """A user query holding a pooled connection, registered so it can be cancelled"""
+    
+    def __init__(self, connection):
+        self.connection = connection
+        self.cancelled = False
+        self.started_at = time.time()
+
+# Errors DECLARE raises for a statement a named cursor can't run (DML,
+# utility commands); execute_query then runs it on a plain cursor
+_DECLARE_REFUSED_CODES = ('0A000', '42601')
+
+def _cap_rows(limits: QueryLimits, rows: List[Dict[str, Any]], row_count: int, byte_count: int) -> tuple:
+    """
+    Cut a batch at the row and byte caps, given the rows and JSON bytes
+    already kept
+
+    Returns:
+        (rows kept, their JSON size, 'max_rows' / 'max_bytes' or None)
+    """
+    reason = None
+    if limits.max_rows and row_count + len(rows) > limits.max_rows:
+        rows = rows[:limits.max_rows - row_count]
+        reason = 'max_rows'
+
+    size = len(dumps(rows)) if rows else 0
+    if limits.max_bytes and byte_count + size > limits.max_bytes:
+        # Keep rows one at a time up to the cap (each row plus its separator)
+        kept = 0
+        size = 2  # []
+        for row in rows:
+            row_size = len(dumps(row)) + (1 if kept else 0)
+            if byte_count + size + row_size > limits.max_bytes:
+                break
+            size += row_size
+            kept += 1
+        return rows[:kept], size if kept else 0, 'max_bytes'
+
+    return rows, size, reason
+
 class DatabaseManager:
     """Manages database connections and query execution with logging"""
     
-    def __init__(self, database_name: str):
+    def __init__(self, database_name: str, limits: Optional[QueryLimits] = None):
         self.database_name = database_name
-        self.connection = None
+        self.pool: Optional[ConnectionPool] = None
+        self.limits = limits or QueryLimits.for_team(None)
+        
+        # User queries in flight, for cancel()
+        self._running: Dict[int, RunningQuery] = {}
+        self._running_lock = threading.Lock()
         
         logger.debug(f"DatabaseManager initialized", extra={
-            "extra_fields": {"database": database_name}
+            "extra_fields": {"database": database_name, **self.limits.to_dict()}
         })
     
     def connect(self) -> None:
-        """Establish database connection"""
-        logger.info(f"Attempting to connect to database", extra={
+        """
+        Attach to the shared connection pool for this database
+        
+        Connections are borrowed from the pool per operation. A connection is
+        checked out once here so that connection problems surface at login.
+        """
+        logger.info(f"Attaching to database connection pool", extra={
             "extra_fields": {
                 "database": self.database_name,
                 "host": settings.db_host,
@@ -35,39 +123,22 @@ class DatabaseManager:
         start_time = time.time()
         
         try:
-            self.connection = psycopg2.connect(
-                host=settings.db_host,
-                port=settings.db_port,
-                database=self.database_name,
-                user=settings.db_user,
-                password=settings.db_password,
-                connect_timeout=10  # 10 second timeout
-            )
+            self.pool = get_pool(self.database_name)
+            with self.pool.connection():
+                pass
             
             duration = time.time() - start_time
             
-            logger.info(f"Successfully connected to database", extra={
+            logger.info(f"Attached to database connection pool", extra={
                 "extra_fields": {
                     "database": self.database_name,
                     "connection_time_ms": round(duration * 1000, 2)
                 }
             })
             
-        except psycopg2.OperationalError as e:
-            duration = time.time() - start_time
-            logger.error(f"Database connection failed: Operational error", extra={
-                "extra_fields": {
-                    "database": self.database_name,
-                    "host": settings.db_host,
-                    "error": str(e),
-                    "connection_time_ms": round(duration * 1000, 2)
-                }
-            }, exc_info=True)
-            raise
-            
         except Exception as e:
             duration = time.time() - start_time
-            logger.error(f"Database connection failed: Unexpected error", extra={
+            logger.error(f"Database connection failed", extra={
                 "extra_fields": {
                     "database": self.database_name,
                     "error": str(e),
@@ -78,25 +149,103 @@ class DatabaseManager:
             raise
     
     def disconnect(self) -> None:
-        """Close database connection"""
-        if self.connection:
-            try:
-                self.connection.close()
-                logger.info(f"Database connection closed", extra={
-                    "extra_fields": {"database": self.database_name}
-                })
-            except Exception as e:
-                logger.error(f"Error closing database connection", extra={
-                    "extra_fields": {
-                        "database": self.database_name,
-                        "error": str(e)
-                    }
-                }, exc_info=True)
+        """Detach from the connection pool (pooled connections stay open for reuse)"""
+        if self.pool:
+            self.pool = None
+            logger.info(f"Detached from database connection pool", extra={
+                "extra_fields": {"database": self.database_name}
+            })
         else:
             logger.debug(f"No active connection to close", extra={
                 "extra_fields": {"database": self.database_name}
             })
     
+    def _start_user_query(self, connection) -> RunningQuery:
+        """
+        Apply the statement timeout to the connection's current transaction
+        and register the query for cancel()
+        
+        set_config(..., true) is SET LOCAL: the timeout ends with the
+        transaction, so it never leaks to the next user of the connection.
+        """
+        if self.limits.statement_timeout_seconds:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config('statement_timeout', %s, true)",
+                    (str(int(self.limits.statement_timeout_seconds * 1000)),)
+                )
+        
+        running = RunningQuery(connection)
+        with self._running_lock:
+            self._running[id(running)] = running
+        return running
+    
+    def _finish_user_query(self, running: Optional[RunningQuery]) -> None:
+        """Unregister a query; call before its connection goes back to the pool"""
+        if running is not None:
+            with self._running_lock:
+                self._running.pop(id(running), None)
+    
+    @contextmanager
+    def _user_query(self, connection):
+        """Run a user query under the limits for the duration of the block"""
+        running = self._start_user_query(connection)
+        try:
+            yield running
+        finally:
+            self._finish_user_query(running)
+    
+    def _failure_reason(self, running: Optional[RunningQuery], error: Exception, operation: str) -> Optional[str]:
+        """'cancelled' or 'timeout' for a cancelled statement (counted in metrics), else None"""
+        if not isinstance(error, QueryCanceledError):
+            return None
+        if running is not None and running.cancelled:
+            return 'cancelled'
+        DB_QUERY_TIMEOUTS.inc(database=self.database_name, operation=operation)
+        return 'timeout'
+    
+    def cancel(self) -> int:
+        """
+        Cancel the user queries this manager has in flight
+        
+        Sends a libpq cancel request (what pg_cancel_backend does) for each
+        running query's backend. That goes over a new socket, not a pooled
+        connection, so it works even when runaway queries hold the whole
+        pool. The query fails with 'reason': 'cancelled'; a stream stops
+        before its next fetch.
+        
+        Returns:
+            Number of queries cancelled
+        """
+        # Held while sending so a query can't finish and hand its connection
+        # to someone else in between
+        with self._running_lock:
+            running_queries = list(self._running.values())
+            for running in running_queries:
+                running.cancelled = True
+                try:
+                    running.connection.cancel()
+                except psycopg2.Error as e:
+                    logger.warning(f"Failed to send query cancel request", extra={
+                        "extra_fields": {
+                            "database": self.database_name,
+                            "error": str(e)
+                        }
+                    })
+        
+        if running_queries:
+            DB_QUERY_CANCELS.inc(len(running_queries), database=self.database_name)
+        
+        logger.info(f"Cancelled running queries", extra={
+            "extra_fields": {
+                "database": self.database_name,
+                "cancelled_count": len(running_queries),
+                "running_for_ms": [round((time.time() - running.started_at) * 1000, 2) for running in running_queries]
+            }
+        })
+        
+        return len(running_queries)
+    
     def get_tables(self) -> List[Dict[str, str]]:
         """Get list of all tables in the database with their comments"""
         logger.debug(f"Fetching table list", extra={
@@ -106,7 +255,7 @@ class DatabaseManager:
         start_time = time.time()
         
         try:
-            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            with self.pool.connection() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute("""
                     SELECT 
                         c.table_name,
@@ -120,6 +269,7 @@ class DatabaseManager:
                 tables = cursor.fetchall()
                 
                 duration = time.time() - start_time
+                DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="get_tables")
                 
                 logger.info(f"Tables fetched successfully", extra={
                     "extra_fields": {
@@ -133,6 +283,8 @@ class DatabaseManager:
                 
         except Exception as e:
             duration = time.time() - start_time
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="get_tables")
+            DB_QUERY_ERRORS.inc(database=self.database_name, operation="get_tables")
             logger.error(f"Error fetching tables", extra={
                 "extra_fields": {
                     "database": self.database_name,
@@ -154,7 +306,7 @@ class DatabaseManager:
         start_time = time.time()
         
         try:
-            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            with self.pool.connection() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute("""
                     SELECT 
                         c.column_name,
@@ -175,6 +327,7 @@ class DatabaseManager:
                 schema = cursor.fetchall()
                 
                 duration = time.time() - start_time
+                DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="get_table_schema")
                 
                 logger.info(f"Table schema fetched successfully", extra={
                     "extra_fields": {
@@ -189,6 +342,8 @@ class DatabaseManager:
                 
         except Exception as e:
             duration = time.time() - start_time
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="get_table_schema")
+            DB_QUERY_ERRORS.inc(database=self.database_name, operation="get_table_schema")
             logger.error(f"Error fetching table schema", extra={
                 "extra_fields": {
                     "database": self.database_name,
@@ -199,8 +354,18 @@ class DatabaseManager:
             }, exc_info=True)
             raise
     
-    def get_all_schemas(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Get schemas for all tables in the database"""
+    def get_all_schemas(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get schemas for all tables in the database
+
+        Reads tables, columns, comments, primary/foreign keys and indexes for the
+        whole public schema straight from pg_catalog in two round trips, so the
+        cost stays flat as the number of tables grows.
+        
+        Returns:
+            Table name -> {'comment', 'columns', 'primary_key', 'foreign_keys',
+            'indexes'}
+        """
         logger.debug(f"Fetching all table schemas", extra={
             "extra_fields": {"database": self.database_name}
         })
@@ -208,22 +373,165 @@ class DatabaseManager:
         start_time = time.time()
         
         try:
-            tables = self.get_tables()
+            with self.pool.connection() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                # Tables, columns and comments. data_type mirrors the
+                # information_schema.columns rendering so schema versions
+                # (and cache keys) stay stable.
+                cursor.execute("""
+                    SELECT
+                        c.relname AS table_name,
+                        obj_description(c.oid, 'pg_class') AS table_comment,
+                        a.attname AS column_name,
+                        CASE
+                            WHEN t.typtype = 'd' THEN
+                                CASE
+                                    WHEN bt.typelem <> 0 AND bt.typlen = -1 THEN 'ARRAY'
+                                    WHEN bn.nspname = 'pg_catalog' THEN format_type(t.typbasetype, NULL)
+                                    ELSE 'USER-DEFINED'
+                                END
+                            WHEN t.typelem <> 0 AND t.typlen = -1 THEN 'ARRAY'
+                            WHEN tn.nspname = 'pg_catalog' THEN format_type(a.atttypid, NULL)
+                            ELSE 'USER-DEFINED'
+                        END AS data_type,
+                        CASE
+                            WHEN a.attnotnull OR (t.typtype = 'd' AND t.typnotnull) THEN 'NO'
+                            ELSE 'YES'
+                        END AS is_nullable,
+                        -- information_schema reports no default for generated columns
+                        CASE
+                            WHEN a.attgenerated = '' THEN pg_get_expr(ad.adbin, ad.adrelid)
+                        END AS column_default,
+                        col_description(c.oid, a.attnum) AS column_comment
+                    FROM pg_catalog.pg_class c
+                    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                    LEFT JOIN pg_catalog.pg_attribute a
+                        ON a.attrelid = c.oid
+                        AND a.attnum > 0
+                        AND NOT a.attisdropped
+                    LEFT JOIN pg_catalog.pg_type t ON t.oid = a.atttypid
+                    LEFT JOIN pg_catalog.pg_namespace tn ON tn.oid = t.typnamespace
+                    LEFT JOIN pg_catalog.pg_type bt ON bt.oid = t.typbasetype
+                    LEFT JOIN pg_catalog.pg_namespace bn ON bn.oid = bt.typnamespace
+                    LEFT JOIN pg_catalog.pg_attrdef ad
+                        ON ad.adrelid = c.oid
+                        AND ad.adnum = a.attnum
+                    WHERE n.nspname = 'public'
+                    AND c.relkind IN ('r', 'p')
+                    ORDER BY c.relname, a.attnum
+                """)
+                column_rows = cursor.fetchall()
+                
+                # Primary keys, foreign keys and indexes
+                cursor.execute("""
+                    SELECT
+                        c.relname AS table_name,
+                        'constraint' AS kind,
+                        con.conname AS name,
+                        con.contype::text AS constraint_type,
+                        ARRAY(
+                            SELECT a.attname::text
+                            FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+                            JOIN pg_catalog.pg_attribute a
+                                ON a.attrelid = con.conrelid
+                                AND a.attnum = k.attnum
+                            ORDER BY k.ord
+                        ) AS columns,
+                        fc.relname::text AS foreign_table,
+                        ARRAY(
+                            SELECT a.attname::text
+                            FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+                            JOIN pg_catalog.pg_attribute a
+                                ON a.attrelid = con.confrelid
+                                AND a.attnum = k.attnum
+                            ORDER BY k.ord
+                        ) AS foreign_columns,
+                        NULL::boolean AS is_unique,
+                        NULL::boolean AS is_primary,
+                        NULL::text AS definition
+                    FROM pg_catalog.pg_constraint con
+                    JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+                    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                    LEFT JOIN pg_catalog.pg_class fc ON fc.oid = con.confrelid
+                    WHERE n.nspname = 'public'
+                    AND con.contype IN ('p', 'f')
+                    UNION ALL
+                    SELECT
+                        c.relname AS table_name,
+                        'index' AS kind,
+                        ic.relname AS name,
+                        NULL::text AS constraint_type,
+                        ARRAY(
+                            SELECT a.attname::text
+                            FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+                            JOIN pg_catalog.pg_attribute a
+                                ON a.attrelid = i.indrelid
+                                AND a.attnum = k.attnum
+                            ORDER BY k.ord
+                        ) AS columns,
+                        NULL::text AS foreign_table,
+                        NULL::text[] AS foreign_columns,
+                        i.indisunique AS is_unique,
+                        i.indisprimary AS is_primary,
+                        pg_get_indexdef(i.indexrelid) AS definition
+                    FROM pg_catalog.pg_index i
+                    JOIN pg_catalog.pg_class c ON c.oid = i.indrelid
+                    JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+                    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = 'public'
+                    ORDER BY table_name, kind, name
+                """)
+                key_rows = cursor.fetchall()
+            
             schemas = {}
             
-            for table in tables:
-                table_name = table['table_name']
-                schemas[table_name] = {
-                    'comment': table.get('table_comment'),
-                    'columns': self.get_table_schema(table_name)
-                }
+            for row in column_rows:
+                table = schemas.setdefault(row['table_name'], {
+                    'comment': row['table_comment'],
+                    'columns': [],
+                    'primary_key': [],
+                    'foreign_keys': [],
+                    'indexes': []
+                })
+                if row['column_name'] is not None:
+                    table['columns'].append({
+                        'column_name': row['column_name'],
+                        'data_type': row['data_type'],
+                        'is_nullable': row['is_nullable'],
+                        'column_default': row['column_default'],
+                        'column_comment': row['column_comment']
+                    })
+            
+            for row in key_rows:
+                table = schemas.get(row['table_name'])
+                if table is None:
+                    continue
+                
+                if row['kind'] == 'index':
+                    table['indexes'].append({
+                        'index_name': row['name'],
+                        'columns': row['columns'],
+                        'is_unique': row['is_unique'],
+                        'is_primary': row['is_primary'],
+                        'definition': row['definition']
+                    })
+                elif row['constraint_type'] == 'p':
+                    table['primary_key'] = row['columns']
+                else:
+                    table['foreign_keys'].append({
+                        'constraint_name': row['name'],
+                        'columns': row['columns'],
+                        'foreign_table': row['foreign_table'],
+                        'foreign_columns': row['foreign_columns']
+                    })
             
             duration = time.time() - start_time
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="get_all_schemas")
             
             logger.info(f"All schemas fetched successfully", extra={
                 "extra_fields": {
                     "database": self.database_name,
                     "table_count": len(schemas),
+                    "column_count": sum(len(t['columns']) for t in schemas.values()),
                     "total_time_ms": round(duration * 1000, 2)
                 }
             })
@@ -232,6 +540,8 @@ class DatabaseManager:
             
         except Exception as e:
             duration = time.time() - start_time
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="get_all_schemas")
+            DB_QUERY_ERRORS.inc(database=self.database_name, operation="get_all_schemas")
             logger.error(f"Error fetching all schemas", extra={
                 "extra_fields": {
                     "database": self.database_name,
@@ -241,12 +551,189 @@ class DatabaseManager:
             }, exc_info=True)
             raise
     
+    def get_schema_fingerprint(self) -> str:
+        """
+        Get a cheap fingerprint of the public schema's catalog entries
+
+        Hashes the row versions (xmin) of the catalog rows that describe tables,
+        columns, comments, constraints and indexes. Any DDL or COMMENT ON touches
+        at least one of them, so the fingerprint changes without having to
+        re-read the full schema.
+        """
+        start_time = time.time()
+        
+        try:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
+                cursor.execute("""
+                    WITH rels AS (
+                        SELECT c.oid, c.xmin
+                        FROM pg_catalog.pg_class c
+                        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                        WHERE n.nspname = 'public'
+                        AND c.relkind IN ('r', 'p')
+                    )
+                    SELECT md5(coalesce(string_agg(part, ',' ORDER BY part), ''))
+                    FROM (
+                        SELECT 'r' || r.oid || ':' || r.xmin AS part
+                        FROM rels r
+                        UNION ALL
+                        SELECT 'a' || a.attrelid || '.' || a.attnum || ':' || a.xmin
+                        FROM pg_catalog.pg_attribute a
+                        JOIN rels r ON r.oid = a.attrelid
+                        WHERE a.attnum > 0
+                        UNION ALL
+                        SELECT 'd' || d.objoid || '.' || d.objsubid || ':' || d.xmin
+                        FROM pg_catalog.pg_description d
+                        JOIN rels r ON r.oid = d.objoid
+                        WHERE d.classoid = 'pg_catalog.pg_class'::regclass
+                        UNION ALL
+                        SELECT 'k' || con.oid || ':' || con.xmin
+                        FROM pg_catalog.pg_constraint con
+                        JOIN rels r ON r.oid = con.conrelid
+                        UNION ALL
+                        SELECT 'i' || i.indexrelid || ':' || i.xmin
+                        FROM pg_catalog.pg_index i
+                        JOIN rels r ON r.oid = i.indrelid
+                    ) parts
+                """)
+                fingerprint = cursor.fetchone()[0]
+            
+            duration = time.time() - start_time
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="get_schema_fingerprint")
+            
+            logger.debug(f"Schema fingerprint fetched", extra={
+                "extra_fields": {
+                    "database": self.database_name,
+                    "fingerprint": fingerprint,
+                    "query_time_ms": round(duration * 1000, 2)
+                }
+            })
+            
+            return fingerprint
+            
+        except Exception as e:
+            duration = time.time() - start_time
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="get_schema_fingerprint")
+            DB_QUERY_ERRORS.inc(database=self.database_name, operation="get_schema_fingerprint")
+            logger.error(f"Error fetching schema fingerprint", extra={
+                "extra_fields": {
+                    "database": self.database_name,
+                    "error": str(e),
+                    "query_time_ms": round(duration * 1000, 2)
+                }
+            }, exc_info=True)
+            raise
+    
+    def get_popular_questions(self, limit: int = 50, lookback_days: int = 30) -> List[Dict[str, Any]]:
+        """
+        Get the most often rated and best rated questions from query_feedback
+
+        Questions are grouped case- and whitespace-insensitively; questions
+        with more thumbs_down than thumbs_up ratings are left out.
+
+        Returns:
+            List of dicts with natural_language_query, times_rated, thumbs_up
+            and thumbs_down, best first
+        """
+        start_time = time.time()
+        
+        try:
+            with self.pool.connection() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT
+                        MIN(natural_language_query) AS natural_language_query,
+                        COUNT(*) AS times_rated,
+                        COUNT(*) FILTER (WHERE rating = 'thumbs_up') AS thumbs_up,
+                        COUNT(*) FILTER (WHERE rating = 'thumbs_down') AS thumbs_down
+                    FROM query_feedback
+                    WHERE created_at >= NOW() - make_interval(days => %s)
+                    GROUP BY LOWER(BTRIM(natural_language_query))
+                    HAVING COUNT(*) FILTER (WHERE rating = 'thumbs_up')
+                        >= COUNT(*) FILTER (WHERE rating = 'thumbs_down')
+                    ORDER BY thumbs_up DESC, times_rated DESC
+                    LIMIT %s
+                """, (lookback_days, limit))
+                questions = [dict(row) for row in cursor.fetchall()]
+            
+            duration = time.time() - start_time
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="get_popular_questions")
+            
+            logger.info(f"Fetched popular questions", extra={
+                "extra_fields": {
+                    "database": self.database_name,
+                    "question_count": len(questions),
+                    "query_time_ms": round(duration * 1000, 2)
+                }
+            })
+            
+            return questions
+            
+        except Exception as e:
+            duration = time.time() - start_time
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="get_popular_questions")
+            DB_QUERY_ERRORS.inc(database=self.database_name, operation="get_popular_questions")
+            logger.error(f"Error fetching popular questions", extra={
+                "extra_fields": {
+                    "database": self.database_name,
+                    "error": str(e),
+                    "query_time_ms": round(duration * 1000, 2)
+                }
+            }, exc_info=True)
+            raise
+    
+    def _fetch_declared(self, connection, query: str) -> Optional[tuple]:
+        """
+        Read a statement through a named cursor, stopping at the row and byte caps
+        
+        Returns:
+            (rows, truncated_reason), or None when DECLARE refuses the
+            statement; the transaction is then rolled back to before the
+            attempt so the caller can run it on a plain cursor
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SAVEPOINT fetch_declared")
+        
+        try:
+            with connection.cursor(name=f"execute_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(query)
+                
+                rows = []
+                byte_count = 0
+                truncated_reason = None
+                max_rows = self.limits.max_rows
+                while not truncated_reason:
+                    # One row past max_rows tells whether the cap cut anything
+                    batch_size = settings.db_stream_itersize
+                    if max_rows:
+                        batch_size = min(batch_size, max_rows - len(rows) + 1)
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    batch, size, truncated_reason = _cap_rows(self.limits, batch, len(rows), byte_count)
+                    rows.extend(batch)
+                    byte_count += size
+                
+                return rows, truncated_reason
+        except psycopg2.Error as e:
+            if getattr(e, 'pgcode', None) not in _DECLARE_REFUSED_CODES:
+                raise
+            with connection.cursor() as cursor:
+                cursor.execute("ROLLBACK TO SAVEPOINT fetch_declared")
+            return None
+    
     def execute_query(self, query: str) -> Dict[str, Any]:
         """
         Execute a SQL query and return results
         
+        Runs under the manager's limits: the statement timeout, and at most
+        max_rows rows / max_bytes of JSON are returned ('truncated' and
+        'truncated_reason' are set when the result was cut). Statements
+        DECLARE accepts are read through a named cursor, so Postgres stops
+        producing rows at the cap.
+        
         Returns:
-            Dict with 'success', 'data' (if successful), or 'error' (if failed)
+            Dict with 'success', 'data' (if successful), or 'error' (if failed,
+            with 'reason' 'timeout' or 'cancelled' when the statement was stopped)
         """
         # Log query (truncate if too long for security)
         query_preview = query[:500] if len(query) > 500 else query
@@ -260,65 +747,94 @@ class DatabaseManager:
         })
         
         start_time = time.time()
+        running = None
         
         try:
-            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(query)
+            with self.pool.connection() as connection, self._user_query(connection) as running:
+                fetched = self._fetch_declared(connection, query)
                 
-                # Check if query returns data (SELECT) or just executes (INSERT, UPDATE, etc.)
-                if cursor.description:
-                    results = cursor.fetchall()
-                    duration = time.time() - start_time
+                with connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                    if fetched is None:
+                        cursor.execute(query)
                     
-                    logger.info(f"Query executed successfully (SELECT)", extra={
-                        "extra_fields": {
-                            "database": self.database_name,
-                            "row_count": len(results),
-                            "execution_time_ms": round(duration * 1000, 2)
+                    # Check if query returns data (SELECT) or just executes (INSERT, UPDATE, etc.)
+                    if fetched is not None or cursor.description:
+                        if fetched is not None:
+                            results, truncated_reason = fetched
+                        else:
+                            # DML ... RETURNING and other statements DECLARE refuses:
+                            # Postgres sends the whole result, the caps only trim it
+                            max_rows = self.limits.max_rows
+                            results = cursor.fetchmany(max_rows + 1) if max_rows else cursor.fetchall()
+                            results, _, truncated_reason = _cap_rows(self.limits, results, 0, 0)
+                        
+                        truncated = truncated_reason is not None
+                        if truncated:
+                            DB_RESULTS_TRUNCATED.inc(database=self.database_name, reason=truncated_reason)
+                        
+                        duration = time.time() - start_time
+                        DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="execute_query")
+                        DB_ROWS_RETURNED.observe(len(results), database=self.database_name)
+                        
+                        logger.info(f"Query executed successfully (SELECT)", extra={
+                            "extra_fields": {
+                                "database": self.database_name,
+                                "row_count": len(results),
+                                "truncated_reason": truncated_reason,
+                                "execution_time_ms": round(duration * 1000, 2)
+                            }
+                        })
+                        
+                        return {
+                            'success': True,
+                            'data': [dict(row) for row in results],
+                            'row_count': len(results),
+                            'truncated': truncated,
+                            'truncated_reason': truncated_reason
                         }
-                    })
-                    
-                    return {
-                        'success': True,
-                        'data': [dict(row) for row in results],
-                        'row_count': len(results)
-                    }
-                else:
-                    self.connection.commit()
-                    duration = time.time() - start_time
-                    
-                    logger.info(f"Query executed successfully (DML)", extra={
-                        "extra_fields": {
-                            "database": self.database_name,
-                            "rows_affected": cursor.rowcount,
-                            "execution_time_ms": round(duration * 1000, 2)
+                    else:
+                        connection.commit()
+                        duration = time.time() - start_time
+                        DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="execute_query")
+                        
+                        logger.info(f"Query executed successfully (DML)", extra={
+                            "extra_fields": {
+                                "database": self.database_name,
+                                "rows_affected": cursor.rowcount,
+                                "execution_time_ms": round(duration * 1000, 2)
+                            }
+                        })
+                        
+                        return {
+                            'success': True,
+                            'message': 'Query executed successfully',
+                            'rows_affected': cursor.rowcount
                         }
-                    })
-                    
-                    return {
-                        'success': True,
-                        'message': 'Query executed successfully',
-                        'rows_affected': cursor.rowcount
-                    }
                     
         except psycopg2.Error as e:
-            self.connection.rollback()
             duration = time.time() - start_time
+            reason = self._failure_reason(running, e, "execute_query")
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="execute_query")
+            DB_QUERY_ERRORS.inc(database=self.database_name, operation="execute_query")
             
             logger.warning(f"Query execution failed: SQL error", extra={
                 "extra_fields": {
                     "database": self.database_name,
                     "error": str(e),
                     "error_code": e.pgcode if hasattr(e, 'pgcode') else None,
+                    "reason": reason,
                     "execution_time_ms": round(duration * 1000, 2),
                     "query_preview": query_preview
                 }
             })
             
-            return {
+            result = {
                 'success': False,
                 'error': str(e)
             }
+            if reason:
+                result['reason'] = reason
+            return result
     
     def execute_insert(self, query: str, params: tuple) -> Dict[str, Any]:
         """
@@ -341,12 +857,13 @@ class DatabaseManager:
         start_time = time.time()
         
         try:
-            with self.connection.cursor() as cursor:
+            with self.pool.connection() as connection, connection.cursor() as cursor:
                 cursor.execute(query, params)
                 result_id = cursor.fetchone()[0] if cursor.description else None
-                self.connection.commit()
+                connection.commit()
                 
                 duration = time.time() - start_time
+                DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="execute_insert")
                 
                 logger.info(f"INSERT query executed successfully", extra={
                     "extra_fields": {
@@ -362,8 +879,9 @@ class DatabaseManager:
                 }
                 
         except psycopg2.Error as e:
-            self.connection.rollback()
             duration = time.time() - start_time
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="execute_insert")
+            DB_QUERY_ERRORS.inc(database=self.database_name, operation="execute_insert")
             
             logger.warning(f"INSERT query failed: SQL error", extra={
                 "extra_fields": {
@@ -380,8 +898,9 @@ class DatabaseManager:
             }
             
         except Exception as e:
-            self.connection.rollback()
             duration = time.time() - start_time
+            DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="execute_insert")
+            DB_QUERY_ERRORS.inc(database=self.database_name, operation="execute_insert")
             
             logger.error(f"INSERT query failed: Unexpected error", extra={
                 "extra_fields": {
@@ -396,3 +915,311 @@ class DatabaseManager:
                 'success': False,
                 'error': str(e)
             }
+
+    def stream_query(self, query: str, batch_size: Optional[int] = None) -> "QueryStream":
+        """
+        Open a row-returning query for batch-by-batch reading (see QueryStream)
+        
+        Args:
+            query: SELECT (or other row-returning) statement
+            batch_size: Rows fetched per round trip (defaults to db_stream_itersize)
+        """
+        return QueryStream(self, query, batch_size or settings.db_stream_itersize)
+
+class QueryStream:
+    """
+    Row-returning query read through a named (server-side) cursor
+    
+    Postgres keeps the result; each next_event() fetches one batch, so
+    memory stays at one batch however large the result is, and the first
+    rows can be sent while later ones are still being produced. Events:
+    
+        {'type': 'columns', 'columns': [...]}    once, before the first rows
+        {'type': 'rows', 'rows': [{...}, ...], 'bytes', 'more'}  per batch
+        {'type': 'end', 'row_count', 'execution_time_ms', 'truncated', 'truncated_reason'}
+        {'type': 'error', 'error', 'error_code', 'reason'}
+    
+    The manager's limits apply: each fetch runs under the statement
+    timeout, and reading stops at max_rows rows or at the last row that
+    fits in max_bytes (JSON size). The cursor is then closed, so
+    Postgres stops producing rows; the end event says why.
+    
+    The pooled connection is held until the end/error event or close().
+    Calls are serialized, so close() may be called from any thread while a
+    fetch is in progress.
+    
+    Each fetch reads one row beyond the batch. A batch's 'more' is then
+    exact: False means the end event follows with no further rows, even
+    when the row count is a multiple of the batch size.
+    """
+    
+    def __init__(self, manager: DatabaseManager, query: str, batch_size: int):
+        self.manager = manager
+        self.database_name = manager.database_name
+        self.query = query
+        self.batch_size = batch_size
+        self.row_count = 0
+        self.bytes = 0
+        self.truncated_reason: Optional[str] = None
+        
+        self._connection = None
+        self._cursor = None
+        self._running: Optional[RunningQuery] = None
+        self._started = False
+        self._finished = False
+        self._pending_rows: Optional[List[Dict[str, Any]]] = None
+        self._carry: List[Dict[str, Any]] = []  # The row read ahead of the last batch
+        self._more = True
+        self._lock = threading.Lock()
+        self._start_time = None
+    
+    def _open(self) -> List[Dict[str, Any]]:
+        """Borrow a connection, declare the cursor and fetch the first batch"""
+        self._start_time = time.time()
+        self._connection = self.manager.pool.getconn()
+        self._running = self.manager._start_user_query(self._connection)
+        
+        # Named cursors live inside a transaction and are closed with it
+        self._cursor = self._connection.cursor(
+            name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor
+        )
+        self._cursor.itersize = self.batch_size
+        self._cursor.execute(self.query)
+        return self._cursor.fetchmany(self.batch_size + 1)
+    
+    def next_event(self) -> Optional[Dict[str, Any]]:
+        """Fetch the next event (blocking), or None once the stream has ended"""
+        with self._lock:
+            if self._finished:
+                return None
+            
+            try:
+                if not self._started:
+                    self._started = True
+                    self._pending_rows = self._open()
+                    return {
+                        'type': 'columns',
+                        'columns': [column.name for column in self._cursor.description or []]
+                    }
+                
+                if self._running.cancelled:
+                    raise QueryCanceledError("canceling statement due to user request")
+                if self.truncated_reason or not self._more:
+                    return self._end()
+                
+                if self._pending_rows is not None:
+                    rows = self._pending_rows
+                else:
+                    rows = self._carry + self._cursor.fetchmany(self.batch_size + 1 - len(self._carry))
+                self._pending_rows = None
+                rows, self._carry = rows[:self.batch_size], rows[self.batch_size:]
+                
+                if rows:
+                    rows, size, reason = _cap_rows(self.manager.limits, rows, self.row_count, self.bytes)
+                    self.truncated_reason = reason
+                if rows:
+                    self.row_count += len(rows)
+                    self.bytes += size
+                    max_rows = self.manager.limits.max_rows
+                    if self._carry and max_rows and self.row_count >= max_rows:
+                        # More rows exist past the cap
+                        self.truncated_reason = 'max_rows'
+                    self._more = bool(self._carry) and not self.truncated_reason
+                    return {'type': 'rows', 'rows': rows, 'bytes': size, 'more': self._more}
+                
+                return self._end()
+            
+            except Exception as e:
+                # SQL errors and pool timeouts end the stream with an error event
+                return self._fail(e)
+    
+    def _end(self) -> Dict[str, Any]:
+        """Release the connection and build the end event; caller holds the lock"""
+        duration = time.time() - self._start_time
+        self._release()
+        DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="stream_query")
+        DB_ROWS_RETURNED.observe(self.row_count, database=self.database_name)
+        if self.truncated_reason:
+            DB_RESULTS_TRUNCATED.inc(database=self.database_name, reason=self.truncated_reason)
+        
+        logger.info(f"Query streamed successfully", extra={
+            "extra_fields": {
+                "database": self.database_name,
+                "row_count": self.row_count,
+                "bytes": self.bytes,
+                "truncated_reason": self.truncated_reason,
+                "batch_size": self.batch_size,
+                "execution_time_ms": round(duration * 1000, 2)
+            }
+        })
+        
+        return {
+            'type': 'end',
+            'row_count': self.row_count,
+            'execution_time_ms': round(duration * 1000, 2),
+            'truncated': self.truncated_reason is not None,
+            'truncated_reason': self.truncated_reason
+        }
+    
+    def _fail(self, error: Exception) -> Dict[str, Any]:
+        """Release the connection and build the error event; caller holds the lock"""
+        duration = time.time() - self._start_time if self._start_time else 0.0
+        reason = self.manager._failure_reason(self._running, error, "stream_query")
+        self._release()
+        DB_QUERY_DURATION.observe(duration, database=self.database_name, operation="stream_query")
+        DB_QUERY_ERRORS.inc(database=self.database_name, operation="stream_query")
+        
+        logger.warning(f"Query streaming failed", extra={
+            "extra_fields": {
+                "database": self.database_name,
+                "error": str(error),
+                "error_type": type(error).__name__,
+                "error_code": getattr(error, 'pgcode', None),
+                "reason": reason,
+                "rows_sent": self.row_count,
+                "execution_time_ms": round(duration * 1000, 2),
+                "query_preview": self.query[:500]
+            }
+        })
+        
+        return {
+            'type': 'error',
+            'error': str(error),
+            'error_code': getattr(error, 'pgcode', None),
+            'reason': reason
+        }
+    
+    def _release(self) -> None:
+        """Close the cursor and return the connection (rolled back) to the pool"""
+        self._finished = True
+        self._pending_rows = None
+        
+        if self._cursor is not None:
+            try:
+                self._cursor.close()
+            except psycopg2.Error:
+                pass  # The rollback in putconn discards the cursor anyway
+            self._cursor = None
+        
+        # Unregister before the connection can be handed to someone else
+        self.manager._finish_user_query(self._running)
+        self._running = None
+        
+        if self._connection is not None:
+            self.manager.pool.putconn(self._connection)
+            self._connection = None
+    
+    def close(self) -> None:
+        """Stop reading early (e.g. the client went away) and free the connection"""
+        with self._lock:
+            if self._finished:
+                return
+            
+            if self._started:
+                logger.info(f"Query stream closed early", extra={
+                    "extra_fields": {
+                        "database": self.database_name,
+                        "rows_sent": self.row_count
+                    }
+                })
+            self._release()
+
+# Dedicated executor for blocking database calls, sized so that every pooled
+# connection of every team database can be busy at once
+_db_executor: Optional[ThreadPoolExecutor] = None
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Get (or lazily create) the executor that runs blocking database calls"""
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(
+            max_workers=settings.db_pool_max_size * len(TEAM_CREDENTIALS),
+            thread_name_prefix="db-worker"
+        )
+    return _db_executor
+
+def shutdown_db_executor() -> None:
+    """Stop the database executor, waiting for in-flight calls"""
+    global _db_executor
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=True)
+        _db_executor = None
+
+class AsyncDatabaseManager:
+    """
+    Awaitable variant of DatabaseManager for the FastAPI endpoints
+
+    Exposes the same methods as DatabaseManager as coroutines. Each call runs
+    on a dedicated worker thread with its own pooled connection, so a slow
+    query never blocks the event loop and one worker can serve many
+    concurrent queries.
+    """
+    
+    def __init__(self, database_name: str, limits: Optional[QueryLimits] = None):
+        self.database_name = database_name
+        self.manager = DatabaseManager(database_name, limits)
+    
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable on the database executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_db_executor(), partial(func, *args, **kwargs))
+    
+    async def connect(self) -> None:
+        """Attach to the shared connection pool for this database"""
+        await self.run(self.manager.connect)
+    
+    async def disconnect(self) -> None:
+        """Detach from the connection pool"""
+        self.manager.disconnect()
+    
+    async def get_tables(self) -> List[Dict[str, str]]:
+        """Get list of all tables in the database with their comments"""
+        return await self.run(self.manager.get_tables)
+    
+    async def get_table_schema(self, table_name: str) -> List[Dict[str, Any]]:
+        """Get schema information for a specific table"""
+        return await self.run(self.manager.get_table_schema, table_name)
+    
+    async def get_all_schemas(self) -> Dict[str, Dict[str, Any]]:
+        """Get schemas for all tables in the database"""
+        return await self.run(self.manager.get_all_schemas)
+    
+    async def get_schema_fingerprint(self) -> str:
+        """Get a cheap fingerprint of the public schema's catalog entries"""
+        return await self.run(self.manager.get_schema_fingerprint)
+    
+    async def get_popular_questions(self, limit: int = 50, lookback_days: int = 30) -> List[Dict[str, Any]]:
+        """Get the most often rated and best rated questions from query_feedback"""
+        return await self.run(self.manager.get_popular_questions, limit, lookback_days)
+    
+    async def execute_query(self, query: str) -> Dict[str, Any]:
+        """Execute a SQL query and return results"""
+        return await self.run(self.manager.execute_query, query)
+    
+    async def stream_query(self, query: str, batch_size: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Execute a row-returning query through a server-side cursor, yielding
+        QueryStream events as batches arrive
+        
+        Closing the iterator early (e.g. on client disconnect) closes the
+        cursor and returns the connection to the pool.
+        """
+        stream = self.manager.stream_query(query, batch_size)
+        try:
+            while True:
+                event = await self.run(stream.next_event)
+                if event is None:
+                    return
+                yield event
+        finally:
+            await asyncio.shield(self.run(stream.close))
+    
+    async def execute_insert(self, query: str, params: tuple) -> Dict[str, Any]:
+        """Execute an INSERT query with parameters and return the inserted ID"""
+        return await self.run(self.manager.execute_insert, query, params)
+    
+    async def cancel(self) -> int:
+        """Cancel this manager's in-flight user queries"""
+        # Not on the database executor: its workers may all be busy with the
+        # very queries being cancelled
+        return await asyncio.to_thread(self.manager.cancel)
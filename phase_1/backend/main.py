@@ -1,21 +1,40 @@
 """
 FastAPI application - Main entry point with comprehensive logging
 """
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
+from contextlib import aclosing
+import asyncio
+import json
 import time
 import uuid
 
 from config import settings, TEAM_CREDENTIALS
-from database import DatabaseManager
-from sql_generator import SQLGenerator
-from cloudwatch_logger import setup_logging, get_logger, log_with_context
+from database import AsyncDatabaseManager, QueryLimits, shutdown_db_executor
+from connection_pool import get_pool_stats, close_all_pools
+from sql_generator import (
+    SQLGenerator, close_anthropic_client, init_anthropic_client, init_langfuse,
+    get_telemetry_stats, close_telemetry
+)
+from cloudwatch_logger import (
+    setup_logging, get_logger, log_with_context, get_log_handler_stats, flush_logs, connect_log_handler
+)
 from query_cache import QueryCache
+from cache_backends import create_cache_backend
+from schema_cache import SchemaCache
+from singleflight import SingleFlight
+from cache_warmer import CacheWarmer
+from result_store import ResultStore, is_row_query, CURSOR_UNSUPPORTED_CODES
+from result_encoding import (
+    FORMAT_COLUMNS, FORMAT_ARROW, COLUMNS_MEDIA_TYPE, ARROW_MEDIA_TYPE, FormatNotAvailable,
+    negotiate_format, encode_columns, encode_arrow, result_headers, dumps, ResultJSONResponse
+)
+from metrics import REGISTRY, HTTP_REQUESTS, HTTP_REQUEST_DURATION
 
-# Setup CloudWatch logging
+# Setup CloudWatch logging (the log group/stream are created after startup)
 setup_logging(
     app_name="text2sql-backend",
     log_level=settings.log_level,
@@ -23,24 +42,51 @@ setup_logging(
     region_name=settings.aws_region,
     aws_access_key_id=settings.aws_access_key_id if settings.aws_access_key_id else None,
     aws_secret_access_key=settings.aws_secret_access_key if settings.aws_secret_access_key else None,
-    enable_console=settings.enable_console_logging
+    enable_console=settings.enable_console_logging,
+    flush_interval_seconds=settings.log_flush_interval_seconds,
+    max_queue_size=settings.log_queue_max_size,
+    queue_block_seconds=settings.log_queue_block_seconds,
+    connect=False
 )
 logger = get_logger(__name__)
 
+# Initialize schema cache (shared by all sessions of a database)
+schema_cache = SchemaCache(
+    ttl_seconds=settings.schema_cache_ttl_seconds,
+    check_interval_seconds=settings.schema_check_interval_seconds
+)
+
+# Shared SQL generator (reuses one Anthropic client across requests)
+sql_generator = SQLGenerator()
+
+# Coalesces identical concurrent generation requests (keyed like the query cache)
+generation_flights = SingleFlight()
+
 # Initialize query cache
 query_cache = None
 if settings.enable_cache:
     try:
-        query_cache = QueryCache(
+        cache_backend = create_cache_backend(
+            backend=settings.cache_backend,
             table_name=settings.cache_table_name,
             region_name=settings.aws_region,
-            ttl_days=settings.cache_ttl_days,
             aws_access_key_id=settings.aws_access_key_id if settings.aws_access_key_id else None,
-            aws_secret_access_key=settings.aws_secret_access_key if settings.aws_secret_access_key else None
+            aws_secret_access_key=settings.aws_secret_access_key if settings.aws_secret_access_key else None,
+            sqlite_path=settings.cache_sqlite_path
+        )
+        query_cache = QueryCache(
+            cache_backend,
+            ttl_days=settings.cache_ttl_days,
+            l1_max_entries=settings.cache_l1_max_entries,
+            negative_ttl_seconds=settings.cache_negative_ttl_seconds,
+            hit_flush_interval_seconds=settings.cache_hit_flush_interval_seconds,
+            semantic_threshold=settings.cache_semantic_threshold,
+            semantic_max_entries=settings.cache_semantic_max_entries,
+            stats_top_n=settings.cache_stats_top_questions
         )
         logger.info("Query cache enabled", extra={
             "extra_fields": {
-                "cache_table": settings.cache_table_name,
+                "cache_backend": settings.cache_backend,
                 "ttl_days": settings.cache_ttl_days
             }
         })
@@ -52,6 +98,125 @@ if settings.enable_cache:
 else:
     logger.info("Query cache disabled")
 
+# Replays popular questions into the cache after startup and schema changes
+cache_warmer = None
+if query_cache and settings.enable_cache_warmup:
+    cache_warmer = CacheWarmer(
+        query_cache,
+        schema_cache,
+        sql_generator,
+        generation_flights,
+        max_questions=settings.cache_warmup_max_questions,
+        concurrency=settings.cache_warmup_concurrency,
+        lookback_days=settings.cache_warmup_lookback_days,
+        max_cost_usd=settings.cache_warmup_max_cost_usd
+    )
+    schema_cache.add_listener(cache_warmer.schedule)
+
+# Scrape-time metrics read from state owned by other components
+REGISTRY.callback(
+    "text2sql_db_pool_connections", "Connection pool connections by state", ("database", "state"),
+    lambda: {
+        (name, state): stats[state]
+        for name, stats in get_pool_stats().items()
+        for state in ('idle', 'in_use', 'waiting')
+    }
+)
+REGISTRY.callback(
+    "text2sql_db_pool_timeouts_total", "Connection pool checkout timeouts", ("database",),
+    lambda: {(name,): stats['timeouts'] for name, stats in get_pool_stats().items()},
+    type_name="counter"
+)
+if query_cache:
+    REGISTRY.callback(
+        "text2sql_query_cache_hit_ratio", "Query cache hit ratio per tier since startup", ("tier",),
+        lambda: {
+            (tier,): stats['hit_ratio']
+            for tier, stats in query_cache.get_tier_stats().items() if isinstance(stats, dict)
+        }
+    )
+REGISTRY.callback(
+    "text2sql_log_records_dropped_total", "CloudWatch log records dropped by reason", ("reason",),
+    lambda: {
+        (reason,): stats[f"dropped_{reason}"]
+        for stats in [get_log_handler_stats()] if stats
+        for reason in ('queue_full', 'send_failed')
+    },
+    type_name="counter"
+)
+REGISTRY.callback(
+    "text2sql_langfuse_events_total", "LangFuse events by outcome", ("outcome",),
+    lambda: {
+        (outcome,): stats[outcome]
+        for stats in [get_telemetry_stats()] if stats
+        for outcome in ('exported', 'dropped_queue_full', 'export_errors')
+    },
+    type_name="counter"
+)
+REGISTRY.callback(
+    "text2sql_result_spooled_bytes", "Memory held by paged query results", (),
+    lambda: {(): result_store.get_stats()['spooled_bytes']}
+)
+REGISTRY.callback(
+    "text2sql_log_queue_size", "CloudWatch log records waiting to be sent", (),
+    lambda: {(): stats['queue_size'] for stats in [get_log_handler_stats()] if stats}
+)
+
+# Large results are returned a page at a time (first page + result handle)
+result_store = ResultStore(
+    page_size=settings.result_page_size,
+    ttl_seconds=settings.result_ttl_seconds,
+    session_budget_bytes=settings.result_session_budget_mb * 1024 * 1024,
+    read_ahead_pages=settings.result_read_ahead_pages,
+    cursor_idle_seconds=settings.result_cursor_idle_seconds,
+    max_cursors_per_session=settings.result_max_open_cursors_per_session,
+    max_cursors_per_database=settings.result_max_open_cursors_per_database
+)
+
+# Remote integrations, connected in the background once the server is up
+# (status: pending -> ready / failed, or disabled); reported by /api/ready
+integration_status: Dict[str, Dict[str, Any]] = {
+    "cloudwatch": {"status": "pending"},
+    "anthropic": {"status": "pending"},
+    "langfuse": {"status": "pending" if settings.enable_langfuse else "disabled"},
+    "query_cache": {"status": "pending" if query_cache else "disabled"}
+}
+integration_task: Optional[asyncio.Task] = None
+
+async def init_integration(name: str, init) -> None:
+    """Run a blocking integration initializer in a worker thread and record the outcome"""
+    start_time = time.time()
+    try:
+        live = await asyncio.to_thread(init)
+        status = {"status": "ready" if live is not False else "failed"}
+    except Exception as e:
+        status = {"status": "failed", "error": str(e)}
+    
+    duration = time.time() - start_time
+    integration_status[name] = {**status, "init_time_ms": round(duration * 1000, 2)}
+    
+    logger.info(f"Integration {name}: {status['status']}", extra={
+        "extra_fields": {
+            "integration": name,
+            **status,
+            "init_time_ms": round(duration * 1000, 2)
+        }
+    })
+
+async def init_integrations() -> None:
+    """Connect CloudWatch, Anthropic, LangFuse and the cache backend concurrently"""
+    initializers = {
+        "cloudwatch": connect_log_handler,
+        "anthropic": init_anthropic_client,
+        "langfuse": init_langfuse,
+        "query_cache": query_cache.backend.connect if query_cache else None
+    }
+    await asyncio.gather(*[
+        init_integration(name, init)
+        for name, init in initializers.items()
+        if integration_status[name]["status"] == "pending"
+    ])
+
 # Log application startup
 logger.info("Starting Text2SQL Backend Application", extra={
     "extra_fields": {
@@ -109,6 +274,13 @@ class FeedbackRequest(BaseModel):
     rating: str  # 'thumbs_up' or 'thumbs_down'
     feedback_comment: Optional[str] = None
 
+def _record_http_metrics(request: Request, status_code: int, duration: float) -> None:
+    """Count a request under its route template so path parameters don't explode label cardinality"""
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", None) or "unmatched"
+    HTTP_REQUESTS.inc(method=request.method, route=route_path, status=str(status_code))
+    HTTP_REQUEST_DURATION.observe(duration, method=request.method, route=route_path)
+
 # Middleware for request logging
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -131,6 +303,7 @@ async def log_requests(request: Request, call_next):
         
         # Calculate duration
         duration = time.time() - start_time
+        _record_http_metrics(request, response.status_code, duration)
         
         # Log response
         log_with_context(
@@ -146,6 +319,7 @@ async def log_requests(request: Request, call_next):
         
     except Exception as e:
         duration = time.time() - start_time
+        _record_http_metrics(request, 500, duration)
         logger.error(f"Request failed: {request.method} {request.url.path}", extra={
             "extra_fields": {
                 "request_id": request_id,
@@ -165,6 +339,90 @@ async def root():
     logger.debug("Health check requested")
     return {"status": "healthy", "service": "Text2SQL API"}
 
+@app.get("/api/ready")
+async def ready():
+    """
+    Readiness check: 200 once every integration has finished initializing
+    
+    Failed integrations don't block readiness (the app runs without them)
+    but are reported, with their error.
+    """
+    is_ready = all(
+        integration["status"] != "pending" for integration in integration_status.values()
+    )
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, "integrations": integration_status}
+    )
+
+@app.get("/api/pool/stats")
+async def pool_stats():
+    """
+    Get connection pool utilisation and counters for each database
+    """
+    return {"success": True, "pools": get_pool_stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint (request, LLM, cache, database and pool metrics)
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/logging/stats")
+async def logging_stats():
+    """
+    Get CloudWatch log shipping counters (queued, sent, dropped)
+    """
+    stats = get_log_handler_stats()
+    if stats is None:
+        return {"success": False, "message": "CloudWatch logging not active"}
+    
+    return {"success": True, "cloudwatch": stats}
+
+@app.get("/api/telemetry/stats")
+async def telemetry_stats():
+    """
+    Get LangFuse exporter counters (sampling, queue, exports) and the time
+    recording an event added to requests
+    """
+    stats = get_telemetry_stats()
+    if stats is None:
+        return {"success": False, "message": "LangFuse observability not active"}
+    
+    return {"success": True, "langfuse": stats}
+
+@app.get("/api/cache/stats")
+async def cache_stats(session_id: Optional[str] = None):
+    """
+    Get query cache hit/miss counters per tier
+    
+    With a session_id, also returns the aggregate counters (entries, hits,
+    hits per schema version, top questions) for the session's database.
+    """
+    if not query_cache:
+        return {"success": False, "message": "Query cache disabled"}
+    
+    response = {"success": True, "tiers": query_cache.get_tier_stats()}
+    
+    if session_id is not None:
+        if session_id not in active_sessions:
+            raise HTTPException(status_code=401, detail="Invalid or expired session")
+        # Aggregate counters are a backend read (DynamoDB/SQLite)
+        response["database"] = await asyncio.to_thread(query_cache.get_stats, active_sessions[session_id]["database"])
+    
+    return response
+
+@app.get("/api/cache/warmup")
+async def cache_warmup_status():
+    """
+    Get progress and spend of the cache warm-up passes
+    """
+    if not cache_warmer:
+        return {"success": False, "message": "Cache warm-up disabled"}
+    
+    return {"success": True, "warmup": cache_warmer.get_progress()}
+
 @app.post("/api/login", response_model=LoginResponse)
 async def login(request: LoginRequest):
     """
@@ -205,8 +463,8 @@ async def login(request: LoginRequest):
     
     # Initialize database connection
     try:
-        db_manager = DatabaseManager(database_name)
-        db_manager.connect()
+        db_manager = AsyncDatabaseManager(database_name, QueryLimits.for_team(username))
+        await db_manager.connect()
         
         # Store session
         active_sessions[session_id] = {
@@ -245,7 +503,7 @@ async def login(request: LoginRequest):
 @app.post("/api/logout")
 async def logout(session_id: str):
     """
-    End user session and close database connection
+    End user session and release its database pool attachment
     """
     log_with_context(
         logger, "info", "Logout request",
@@ -258,7 +516,8 @@ async def logout(session_id: str):
         
         try:
             db_manager = session_info["db_manager"]
-            db_manager.disconnect()
+            await db_manager.cancel()
+            await db_manager.disconnect()
         except Exception as e:
             logger.error(f"Error disconnecting database during logout", extra={
                 "extra_fields": {
@@ -268,6 +527,7 @@ async def logout(session_id: str):
                 }
             }, exc_info=True)
         
+        result_store.release_session(session_id)
         del active_sessions[session_id]
         
         logger.info(f"Logout successful", extra={
@@ -305,7 +565,7 @@ async def get_tables(session_id: str):
         session_info = active_sessions[session_id]
         db_manager = session_info["db_manager"]
         
-        tables = db_manager.get_tables()
+        tables = await db_manager.get_tables()
         
         logger.info(f"Tables retrieved successfully", extra={
             "extra_fields": {
@@ -326,7 +586,7 @@ async def get_tables(session_id: str):
         }, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/schema")
+@app.get("/api/schema", response_class=ResultJSONResponse)
 async def get_schema(session_id: str, table_name: Optional[str] = None):
     """
     Get schema for a specific table or all tables
@@ -348,7 +608,7 @@ async def get_schema(session_id: str, table_name: Optional[str] = None):
         db_manager = session_info["db_manager"]
         
         if table_name:
-            schema = db_manager.get_table_schema(table_name)
+            schema = await db_manager.get_table_schema(table_name)
             logger.info(f"Table schema retrieved", extra={
                 "extra_fields": {
                     "session_id": session_id,
@@ -356,9 +616,9 @@ async def get_schema(session_id: str, table_name: Optional[str] = None):
                     "column_count": len(schema)
                 }
             })
-            return {"success": True, "table": table_name, "schema": schema}
+            return ResultJSONResponse({"success": True, "table": table_name, "schema": schema})
         else:
-            schemas = db_manager.get_all_schemas()
+            schemas = await schema_cache.aget(db_manager)
             logger.info(f"All schemas retrieved", extra={
                 "extra_fields": {
                     "session_id": session_id,
@@ -366,7 +626,7 @@ async def get_schema(session_id: str, table_name: Optional[str] = None):
                     "table_count": len(schemas)
                 }
             })
-            return {"success": True, "schemas": schemas}
+            return ResultJSONResponse({"success": True, "schemas": schemas})
     except Exception as e:
         logger.error(f"Error fetching schema", extra={
             "extra_fields": {
@@ -407,13 +667,15 @@ async def generate_query(request: QueryRequest):
             }
         })
         
-        # Get database schema
-        schemas = db_manager.get_all_schemas()
+        # Get database schema (served from the shared schema cache)
+        schemas = await schema_cache.aget(db_manager)
         
         # Check cache first
         cached_sql = None
         if query_cache:
-            cached_sql = query_cache.get(
+            # Off the event loop: an L1 miss goes to the L2 backend (DynamoDB/SQLite)
+            cached_sql = await asyncio.to_thread(
+                query_cache.get,
                 natural_language_query=request.natural_language_query,
                 database_name=session["database"],
                 schemas=schemas
@@ -445,35 +707,45 @@ async def generate_query(request: QueryRequest):
             }
         })
         
-        # Generate SQL using Claude
-        sql_gen = SQLGenerator()
-        
-        result = sql_gen.generate_sql(
-            natural_language_query=request.natural_language_query,
-            database_schema=schemas,
-            database_name=session["database"],
-            user_id=session["team"],
-            session_id=request.session_id
-        )
-        
-        duration = time.time() - start_time
-        
-        if result.get("success"):
+        async def generate_and_cache() -> Dict[str, Any]:
+            # Generate SQL using Claude
+            result = await sql_generator.generate_sql(
+                natural_language_query=request.natural_language_query,
+                database_schema=schemas,
+                database_name=session["database"],
+                user_id=session["team"],
+                session_id=request.session_id
+            )
+            
             # Store in cache
-            if query_cache and result.get("sql_query"):
-                query_cache.put(
+            if result.get("success") and query_cache and result.get("sql_query"):
+                await asyncio.to_thread(
+                    query_cache.put,
                     natural_language_query=request.natural_language_query,
                     database_name=session["database"],
                     schemas=schemas,
                     generated_sql=result["sql_query"]
                 )
             
+            return result
+        
+        # Identical concurrent requests share a single LLM call
+        flight_key = QueryCache.build_cache_key(
+            request.natural_language_query, session["database"], schemas
+        )
+        result, shared = await generation_flights.do(flight_key, generate_and_cache)
+        result = dict(result)
+        
+        duration = time.time() - start_time
+        
+        if result.get("success"):
             logger.info(f"SQL query generated successfully", extra={
                 "extra_fields": {
                     "session_id": request.session_id,
                     "team": session["team"],
                     "query_length": len(result.get("sql_query", "")),
                     "cached": False,
+                    "coalesced": shared,
                     "generation_time_ms": round(duration * 1000, 2)
                 }
             })
@@ -489,7 +761,7 @@ async def generate_query(request: QueryRequest):
                 }
             })
         
-        return result
+        return _client_result(result)
     except Exception as e:
         duration = time.time() - start_time
         logger.error(f"Error generating query", extra={
@@ -501,11 +773,203 @@ async def generate_query(request: QueryRequest):
         }, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/execute-query")
-async def execute_query(request: ExecuteRequest):
+def _client_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """A generation result without the internal fields (token usage and cost stay in metrics and logs)"""
+    return {key: value for key, value in result.items() if key != "usage"}
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _ndjson_line(data: Dict[str, Any]) -> bytes:
+    """Format one newline-delimited JSON record"""
+    return dumps(data) + b"\n"
+
+def _negotiate_result_format(http_request: Request, result_format: Optional[str]) -> str:
+    """Result format from ?format= or the Accept header (400 unknown, 406 unavailable)"""
+    try:
+        return negotiate_format(result_format, http_request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FormatNotAvailable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+def _result_response(payload: Dict[str, Any], result_format: str):
+    """Encode a result with rows in the negotiated format (anything else stays JSON)"""
+    if not payload.get("success") or "data" not in payload:
+        return ResultJSONResponse(payload)
+    if result_format == FORMAT_COLUMNS:
+        return Response(encode_columns(payload), media_type=COLUMNS_MEDIA_TYPE)
+    if result_format == FORMAT_ARROW:
+        return Response(
+            encode_arrow(payload["data"], payload.get("columns")),
+            media_type=ARROW_MEDIA_TYPE,
+            headers=result_headers(payload)
+        )
+    return ResultJSONResponse(payload)
+
+@app.post("/api/generate-query/stream")
+async def generate_query_stream(request: QueryRequest):
+    """
+    Generate SQL query from natural language, streaming tokens over Server-Sent Events
+    
+    Emits 'delta' events with raw text chunks as Claude produces them, then a
+    single 'result' event with the same payload as /api/generate-query.
+    """
+    log_with_context(
+        logger, "info", "Generate query stream request",
+        session_id=request.session_id,
+        query_length=len(request.natural_language_query)
+    )
+    
+    if request.session_id not in active_sessions:
+        logger.warning("Query generation failed: Invalid session", extra={
+            "extra_fields": {"session_id": request.session_id}
+        })
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    
+    start_time = time.time()
+    
+    try:
+        session = active_sessions[request.session_id]
+        db_manager = session["db_manager"]
+        
+        # Get database schema (served from the shared schema cache)
+        schemas = await schema_cache.aget(db_manager)
+        
+        # Check cache first
+        cached_sql = None
+        if query_cache:
+            # Off the event loop: an L1 miss goes to the L2 backend (DynamoDB/SQLite)
+            cached_sql = await asyncio.to_thread(
+                query_cache.get,
+                natural_language_query=request.natural_language_query,
+                database_name=session["database"],
+                schemas=schemas
+            )
+        
+        flight_key = QueryCache.build_cache_key(
+            request.natural_language_query, session["database"], schemas
+        )
+    except Exception as e:
+        logger.error(f"Error preparing query stream", extra={
+            "extra_fields": {
+                "session_id": request.session_id,
+                "error": str(e)
+            }
+        }, exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def event_stream():
+        if cached_sql:
+            logger.info(f"SQL query returned from cache", extra={
+                "extra_fields": {
+                    "session_id": request.session_id,
+                    "team": session["team"],
+                    "cached": True,
+                    "generation_time_ms": round((time.time() - start_time) * 1000, 2)
+                }
+            })
+            yield _sse_event("result", {"success": True, "sql_query": cached_sql, "cached": True})
+            return
+        
+        # An identical generation is already running: wait for its result
+        flight = generation_flights.in_flight(flight_key)
+        if flight is not None:
+            try:
+                result = dict(await generation_flights.join(flight_key, flight))
+                result["cached"] = False
+                yield _sse_event("result", _client_result(result))
+                return
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                # The leading request went away; generate ourselves
+        
+        generation_flights.begin(flight_key)
+        completed = False
+        try:
+            async for event in sql_generator.generate_sql_stream(
+                natural_language_query=request.natural_language_query,
+                database_schema=schemas,
+                database_name=session["database"],
+                user_id=session["team"],
+                session_id=request.session_id
+            ):
+                if event["type"] == "delta":
+                    yield _sse_event("delta", {"text": event["text"]})
+                    continue
+                
+                result = {key: value for key, value in event.items() if key != "type"}
+            
+            duration = time.time() - start_time
+            
+            if result.get("success"):
+                # Store in cache once the completion has finished
+                if query_cache and result.get("sql_query"):
+                    await asyncio.to_thread(
+                        query_cache.put,
+                        natural_language_query=request.natural_language_query,
+                        database_name=session["database"],
+                        schemas=schemas,
+                        generated_sql=result["sql_query"]
+                    )
+                
+                logger.info(f"SQL query streamed successfully", extra={
+                    "extra_fields": {
+                        "session_id": request.session_id,
+                        "team": session["team"],
+                        "query_length": len(result.get("sql_query", "")),
+                        "cached": False,
+                        "generation_time_ms": round(duration * 1000, 2)
+                    }
+                })
+                result["cached"] = False
+            else:
+                logger.error(f"SQL generation failed", extra={
+                    "extra_fields": {
+                        "session_id": request.session_id,
+                        "error": result.get("error"),
+                        "generation_time_ms": round(duration * 1000, 2)
+                    }
+                })
+            
+            generation_flights.end(flight_key, result=dict(result))
+            completed = True
+        finally:
+            if not completed:
+                # Client disconnected mid-stream; waiting requests take over
+                generation_flights.end(flight_key, error=asyncio.CancelledError())
+        
+        yield _sse_event("result", _client_result(result))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/execute-query", response_class=ResultJSONResponse)
+async def execute_query(
+    request: ExecuteRequest,
+    http_request: Request,
+    result_format: Optional[str] = Query(None, alias="format")
+):
     """
     Execute SQL query and return results
+    
+    Row-returning queries are paged: the response holds the first
+    RESULT_PAGE_SIZE rows, and if there may be more, 'has_more',
+    'result_handle' and 'next_cursor' for /api/results/{handle}.
+    
+    Rows are JSON objects by default. ?format=columns (or Accept:
+    application/vnd.text2sql.columns+json) returns column names once and
+    one array per column; ?format=arrow (or Accept:
+    application/vnd.apache.arrow.stream) returns an Arrow IPC stream with
+    the paging fields in X-* headers, and 406 if pyarrow isn't installed.
     """
+    response_format = _negotiate_result_format(http_request, result_format)
+    
     log_with_context(
         logger, "info", "Execute query request",
         session_id=request.session_id,
@@ -533,7 +997,13 @@ async def execute_query(request: ExecuteRequest):
             }
         })
         
-        result = db_manager.execute_query(request.sql_query)
+        if is_row_query(request.sql_query):
+            result = await result_store.execute(request.session_id, db_manager, request.sql_query)
+            if not result["success"] and result.get("error_code") in CURSOR_UNSUPPORTED_CODES:
+                # DECLARE refused a statement is_row_query let through
+                result = await db_manager.execute_query(request.sql_query)
+        else:
+            result = await db_manager.execute_query(request.sql_query)
         
         duration = time.time() - start_time
         
@@ -543,6 +1013,7 @@ async def execute_query(request: ExecuteRequest):
                     "session_id": request.session_id,
                     "team": session_info["team"],
                     "row_count": result.get("row_count", result.get("rows_affected", 0)),
+                    "has_more": result.get("has_more", False),
                     "execution_time_ms": round(duration * 1000, 2)
                 }
             })
@@ -552,11 +1023,12 @@ async def execute_query(request: ExecuteRequest):
                     "session_id": request.session_id,
                     "team": session_info["team"],
                     "error": result.get("error"),
+                    "reason": result.get("reason"),
                     "execution_time_ms": round(duration * 1000, 2)
                 }
             })
         
-        return result
+        return _result_response(result, response_format)
     except Exception as e:
         duration = time.time() - start_time
         logger.error(f"Error executing query", extra={
@@ -568,6 +1040,145 @@ async def execute_query(request: ExecuteRequest):
         }, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/results/{handle}", response_class=ResultJSONResponse)
+async def get_result_page(
+    handle: str,
+    session_id: str,
+    cursor: str,
+    http_request: Request,
+    result_format: Optional[str] = Query(None, alias="format")
+):
+    """
+    Get the next page of a paged query result
+    
+    `cursor` is the 'next_cursor' of the previous page. Pages that are
+    still being read from the database are waited for. Same formats as
+    /api/execute-query.
+    """
+    response_format = _negotiate_result_format(http_request, result_format)
+    
+    if session_id not in active_sessions:
+        logger.warning("Result page request failed: Invalid session", extra={
+            "extra_fields": {"session_id": session_id}
+        })
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    
+    start_time = time.time()
+    
+    try:
+        page = await result_store.get_page(session_id, handle, cursor)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Result not found or expired; run the query again")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    logger.info(f"Result page served", extra={
+        "extra_fields": {
+            "session_id": session_id,
+            "result_handle": handle,
+            "cursor": cursor,
+            "row_count": page.get("row_count", 0),
+            "has_more": page.get("has_more", False),
+            "duration_ms": round((time.time() - start_time) * 1000, 2)
+        }
+    })
+    
+    return _result_response(page, response_format)
+
+@app.post("/api/execute-query/stream")
+async def execute_query_stream(request: ExecuteRequest):
+    """
+    Execute a row-returning SQL query, streaming the result as NDJSON
+    
+    Rows are read from a server-side cursor in batches of DB_STREAM_ITERSIZE
+    and written as they arrive, so memory stays at one batch and the first
+    rows are sent while Postgres is still producing the rest. Lines:
+    
+        {"type": "columns", "columns": [...]}
+        {"type": "rows", "rows": [{...}, ...]}   (repeated)
+        {"type": "end", "row_count": N, "execution_time_ms": ...}
+    
+    or an {"type": "error", "error": ...} line if the query fails.
+    """
+    log_with_context(
+        logger, "info", "Execute query stream request",
+        session_id=request.session_id,
+        sql_query_length=len(request.sql_query)
+    )
+    
+    if request.session_id not in active_sessions:
+        logger.warning("Query execution failed: Invalid session", extra={
+            "extra_fields": {"session_id": request.session_id}
+        })
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    
+    session_info = active_sessions[request.session_id]
+    db_manager = session_info["db_manager"]
+    start_time = time.time()
+    
+    async def ndjson_stream():
+        first_rows_time = None
+        async with aclosing(db_manager.stream_query(request.sql_query)) as events:
+            async for event in events:
+                if event["type"] == "rows" and first_rows_time is None:
+                    first_rows_time = time.time()
+                
+                yield _ndjson_line(event)
+                
+                if event["type"] == "end":
+                    logger.info(f"Query streamed successfully", extra={
+                        "extra_fields": {
+                            "session_id": request.session_id,
+                            "team": session_info["team"],
+                            "row_count": event["row_count"],
+                            "time_to_first_rows_ms": round((first_rows_time - start_time) * 1000, 2) if first_rows_time else None,
+                            "execution_time_ms": round((time.time() - start_time) * 1000, 2)
+                        }
+                    })
+                elif event["type"] == "error":
+                    logger.warning(f"Query execution failed", extra={
+                        "extra_fields": {
+                            "session_id": request.session_id,
+                            "team": session_info["team"],
+                            "error": event["error"],
+                            "execution_time_ms": round((time.time() - start_time) * 1000, 2)
+                        }
+                    })
+    
+    return StreamingResponse(
+        ndjson_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/cancel")
+async def cancel_query(session_id: str):
+    """
+    Cancel the session's in-flight queries
+    
+    The running statement fails with 'reason': 'cancelled' in its
+    /api/execute-query response (or NDJSON error event); a result still
+    being paged in stops at the pages already read.
+    """
+    if session_id not in active_sessions:
+        logger.warning("Cancel request failed: Invalid session", extra={
+            "extra_fields": {"session_id": session_id}
+        })
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    
+    session_info = active_sessions[session_id]
+    cancelled = await session_info["db_manager"].cancel()
+    
+    logger.info(f"Cancel request", extra={
+        "extra_fields": {
+            "session_id": session_id,
+            "team": session_info["team"],
+            "cancelled_count": cancelled
+        }
+    })
+    
+    return {"success": True, "cancelled": cancelled}
+
 @app.post("/api/feedback")
 async def submit_feedback(request: FeedbackRequest):
     """
@@ -602,7 +1213,7 @@ async def submit_feedback(request: FeedbackRequest):
             RETURNING feedback_id
         """
         
-        result = db_manager.execute_insert(
+        result = await db_manager.execute_insert(
             feedback_sql,
             (
                 request.session_id,
@@ -655,6 +1266,14 @@ async def startup_event():
             "port": settings.app_port
         }
     })
+    
+    # Connect remote services in the background; requests are served meanwhile
+    global integration_task
+    integration_task = asyncio.create_task(init_integrations())
+    
+    # Warm the query cache in the background; requests are served meanwhile
+    if cache_warmer:
+        cache_warmer.start({team["database"] for team in TEAM_CREDENTIALS.values()})
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -665,11 +1284,11 @@ async def shutdown_event():
         }
     })
     
-    # Close all active database connections
+    # Detach all sessions from their database pools
     for session_id, session_info in active_sessions.items():
         try:
-            session_info["db_manager"].disconnect()
-            logger.info(f"Closed database connection for session", extra={
+            await session_info["db_manager"].disconnect()
+            logger.info(f"Detached database pool for session", extra={
                 "extra_fields": {
                     "session_id": session_id,
                     "team": session_info.get("team")
@@ -683,7 +1302,35 @@ async def shutdown_event():
                 }
             }, exc_info=True)
     
+    # Stop waiting on integrations that are still connecting
+    if integration_task and not integration_task.done():
+        integration_task.cancel()
+    
+    # Stop warming before the cache is closed
+    if cache_warmer:
+        await cache_warmer.close()
+    
+    # Write out pending cache hit counts
+    if query_cache:
+        query_cache.close()
+    
+    # Stop reading paged results (returns their cursors' connections)
+    await result_store.close()
+    
+    # Close the shared Anthropic client
+    await close_anthropic_client()
+    
+    # Export the LangFuse events still queued
+    await asyncio.to_thread(close_telemetry)
+    
+    # Close pooled database connections
+    shutdown_db_executor()
+    close_all_pools()
+    
     logger.info("Application shutdown complete")
+    
+    # Ship the log records still queued for CloudWatch
+    flush_logs()
 
 if __name__ == "__main__":
     import uvicorn
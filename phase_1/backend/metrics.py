@@ -0,0 +1,266 @@
+"""
+In-process metrics registry with Prometheus text exposition
+"""
+import bisect
+import math
+import threading
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds: sub-millisecond cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+def _format_value(value: float) -> str:
+    """Render a sample value the way Prometheus expects"""
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    """Escape a label value"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Render {name="value",...} (empty string when there are no labels)"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    """Base for labelled metrics; one value slot per label combination"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """Label values in labelnames order"""
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        """Exposition lines for this metric"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Add to the counter for a label combination"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels_text(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        """Set the gauge for a label combination"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        """Subtract from the gauge for a label combination"""
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    """Bucketed distribution (cumulative buckets, sum and count at render)"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """Record one observation"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = entry
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+
+        lines = []
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _labels_text(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class CallbackMetric(_Metric):
+    """
+    Metric whose samples are read from other components at scrape time
+
+    `collect` returns {label values tuple: value}; used for state that
+    already lives elsewhere (pool sizes, log queue counters, hit ratios).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Dict[Tuple[str, ...], float]],
+        type_name: str = "gauge"
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+        self.type_name = type_name
+
+    def _samples(self) -> List[str]:
+        try:
+            values = self.collect() or {}
+        except Exception:
+            # A failing source must not break the whole scrape
+            return []
+        return [
+            f"{self.name}{_labels_text(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+class Registry:
+    """Set of metrics rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric (replacing one with the same name) and return it"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Dict[Tuple[str, ...], float]],
+        type_name: str = "gauge"
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help_text, labelnames, collect, type_name))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+# HTTP
+HTTP_REQUESTS = REGISTRY.counter(
+    "text2sql_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "text2sql_http_request_duration_seconds", "HTTP request latency by route (time to response headers)",
+    ("method", "route")
+)
+
+# LLM
+LLM_REQUESTS = REGISTRY.counter(
+    "text2sql_llm_requests_total", "Claude SQL generation calls", ("database", "outcome")
+)
+LLM_REQUEST_DURATION = REGISTRY.histogram(
+    "text2sql_llm_request_duration_seconds", "Claude API latency per generation", ("database",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "text2sql_llm_tokens_total", "Claude tokens by kind (input, output, cache_read, cache_creation)",
+    ("database", "kind")
+)
+LLM_COST = REGISTRY.counter(
+    "text2sql_llm_cost_usd_total", "Estimated Claude spend in USD", ("database",)
+)
+
+# Query cache
+CACHE_LOOKUPS = REGISTRY.counter(
+    "text2sql_query_cache_lookups_total", "Query cache lookups by tier and outcome", ("tier", "outcome")
+)
+
+# Database
+DB_QUERY_DURATION = REGISTRY.histogram(
+    "text2sql_db_query_duration_seconds", "PostgreSQL call latency by operation", ("database", "operation")
+)
+DB_ROWS_RETURNED = REGISTRY.histogram(
+    "text2sql_db_rows_returned", "Rows returned per executed query", ("database",),
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+)
+DB_QUERY_ERRORS = REGISTRY.counter(
+    "text2sql_db_query_errors_total", "Failed PostgreSQL calls by operation", ("database", "operation")
+)
+DB_QUERY_TIMEOUTS = REGISTRY.counter(
+    "text2sql_db_query_timeouts_total", "User queries stopped by the statement timeout", ("database", "operation")
+)
+DB_QUERY_CANCELS = REGISTRY.counter(
+    "text2sql_db_query_cancels_total", "User queries cancelled through /api/cancel", ("database",)
+)
+DB_RESULTS_TRUNCATED = REGISTRY.counter(
+    "text2sql_db_results_truncated_total", "Results cut off at the row or byte cap", ("database", "reason")
+)
@@ -1,150 +1,274 @@
 """
-Query caching with DynamoDB
+Query caching with a pluggable shared store (DynamoDB or SQLite)
 """
 import hashlib
+import threading
 import time
-from typing import Dict, Any, Optional
-import boto3
-from botocore.exceptions import ClientError
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from cache_backends import CacheBackend
+from semantic_cache import SemanticIndex
 from cloudwatch_logger import get_logger
+from metrics import CACHE_LOOKUPS
 
 logger = get_logger(__name__)
 
+# Marker stored in the local tier for keys known to be missing from the backend
+_NEGATIVE = object()
+
+# id(schemas) -> (schemas, schema_version); see QueryCache._get_schema_version
+_schema_versions: Dict[int, Tuple[Dict[str, Any], str]] = {}
+_schema_versions_lock = threading.Lock()
+
+class LocalLRUCache:
+    """Bounded, thread-safe in-process LRU cache with per-entry expiry"""
+    
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get a value, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def delete(self, key: str) -> None:
+        """Remove a value if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class HitCounter:
+    """
+    Aggregates cache hits in memory and flushes coalesced increments
+    
+    Recording a hit is a dict update; a background thread hands the
+    accumulated counts to `flush_func` every `flush_interval_seconds`
+    (and once more on close), so the hit path never waits on a write.
+    """
+    
+    def __init__(self, flush_func, flush_interval_seconds: int = 30):
+        self.flush_func = flush_func
+        self.flush_interval_seconds = flush_interval_seconds
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def record(
+        self,
+        cache_key: str,
+        database_name: str,
+        schema_version: str,
+        natural_language_query: str
+    ) -> None:
+        """Count one hit for a cache key"""
+        with self._lock:
+            pending = self._pending.get(cache_key)
+            if pending is None:
+                self._pending[cache_key] = {
+                    'database_name': database_name,
+                    'schema_version': schema_version,
+                    'natural_language_query': natural_language_query,
+                    'count': 1,
+                    'last_accessed_at': int(time.time())
+                }
+            else:
+                pending['count'] += 1
+                pending['last_accessed_at'] = int(time.time())
+            
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cache-hit-flusher", daemon=True)
+                self._thread.start()
+    
+    def _run(self) -> None:
+        """Flush periodically until closed"""
+        while not self._stop.wait(self.flush_interval_seconds):
+            self.flush()
+    
+    def flush(self) -> int:
+        """Hand all pending increments to flush_func; returns the number of keys flushed"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        
+        if not pending:
+            return 0
+        
+        start_time = time.time()
+        try:
+            self.flush_func(pending)
+        except Exception as e:
+            logger.error(f"Cache hit flush failed", extra={
+                "extra_fields": {
+                    "key_count": len(pending),
+                    "error": str(e)
+                }
+            }, exc_info=True)
+            return 0
+        
+        logger.info(f"Cache hit counts flushed", extra={
+            "extra_fields": {
+                "key_count": len(pending),
+                "hit_count": sum(item['count'] for item in pending.values()),
+                "flush_time_ms": round((time.time() - start_time) * 1000, 2)
+            }
+        })
+        return len(pending)
+    
+    def close(self) -> None:
+        """Stop the background thread and flush what is left"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval_seconds)
+        self.flush()
+
 class QueryCache:
-    """DynamoDB-based query cache for SQL generation"""
+    """
+    Two-tier query cache for SQL generation
+    
+    L1 is a bounded in-process LRU answering hot questions without any
+    network I/O; L2 is the shared backend store (see cache_backends).
+    Misses can optionally be remembered in L1 for `negative_ttl_seconds`
+    to spare repeated L2 lookups. With `semantic_threshold` > 0, questions
+    that miss both tiers are matched against this process's cached
+    questions for the same database and schema version, so paraphrases
+    reuse the SQL of a near-duplicate.
+    """
     
     def __init__(
         self,
-        table_name: str = "text2sql_query_cache",
-        region_name: str = "ap-south-1",
+        backend: CacheBackend,
         ttl_days: int = 30,
-        aws_access_key_id: Optional[str] = None,
-        aws_secret_access_key: Optional[str] = None
+        l1_max_entries: int = 1000,
+        negative_ttl_seconds: int = 0,
+        hit_flush_interval_seconds: int = 30,
+        semantic_threshold: float = 0.0,
+        semantic_max_entries: int = 5000,
+        stats_top_n: int = 10
     ):
-        self.table_name = table_name
+        self.backend = backend
         self.ttl_days = ttl_days
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.stats_top_n = stats_top_n
+        
+        # L1: in-process LRU, entries expire with the backend TTL
+        self.local = LocalLRUCache(max_entries=l1_max_entries)
+        self._stats_lock = threading.Lock()
+        self._tier_stats = {
+            'l1': {'hits': 0, 'misses': 0, 'negative_hits': 0},
+            'l2': {'hits': 0, 'misses': 0, 'errors': 0},
+            'semantic': {'hits': 0, 'misses': 0}
+        }
         
-        # Initialize DynamoDB client
-        session_kwargs = {'region_name': region_name}
-        if aws_access_key_id and aws_secret_access_key:
-            session_kwargs['aws_access_key_id'] = aws_access_key_id
-            session_kwargs['aws_secret_access_key'] = aws_secret_access_key
+        # Optional similarity tier for paraphrased questions (0 = off)
+        self.semantic = None
+        if semantic_threshold > 0:
+            self.semantic = SemanticIndex(threshold=semantic_threshold, max_entries=semantic_max_entries)
         
-        self.dynamodb = boto3.resource('dynamodb', **session_kwargs)
-        self.table = None
+        # hit_count / last_accessed_at are written in batches off the request path
+        self.hit_counter = HitCounter(self._flush_hits, flush_interval_seconds=hit_flush_interval_seconds)
         
         logger.info(f"QueryCache initialized", extra={
             "extra_fields": {
-                "table_name": table_name,
-                "region": region_name,
-                "ttl_days": ttl_days
+                "backend": backend.name,
+                "ttl_days": ttl_days,
+                "l1_max_entries": l1_max_entries,
+                "negative_ttl_seconds": negative_ttl_seconds,
+                "hit_flush_interval_seconds": hit_flush_interval_seconds,
+                "semantic_threshold": semantic_threshold
             }
         })
     
-    def _ensure_table_exists(self):
-        """Ensure DynamoDB table exists, create if it doesn't"""
-        if self.table is not None:
-            return
+    def _count(self, tier: str, outcome: str) -> None:
+        """Increment a per-tier hit/miss counter"""
+        with self._stats_lock:
+            self._tier_stats[tier][outcome] += 1
+        CACHE_LOOKUPS.inc(tier=tier, outcome=outcome)
+    
+    def get_tier_stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss counters for each cache tier since startup
         
-        try:
-            self.table = self.dynamodb.Table(self.table_name)
-            # Try to load table to verify it exists
-            self.table.load()
-            logger.info(f"Connected to existing cache table", extra={
-                "extra_fields": {"table_name": self.table_name}
-            })
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'ResourceNotFoundException':
-                logger.info(f"Cache table not found, creating...", extra={
-                    "extra_fields": {"table_name": self.table_name}
-                })
-                self._create_table()
-            else:
-                raise
+        Returns:
+            Dictionary with per-tier counters and hit ratios
+        """
+        with self._stats_lock:
+            l1 = dict(self._tier_stats['l1'])
+            l2 = dict(self._tier_stats['l2'])
+            semantic = dict(self._tier_stats['semantic'])
+        
+        l1_lookups = l1['hits'] + l1['misses'] + l1['negative_hits']
+        l2_lookups = l2['hits'] + l2['misses']
+        semantic_lookups = semantic['hits'] + semantic['misses']
+        
+        return {
+            'l1': {
+                **l1,
+                'entries': len(self.local),
+                'max_entries': self.local.max_entries,
+                'hit_ratio': round(l1['hits'] / l1_lookups, 4) if l1_lookups else 0
+            },
+            'l2': {
+                **l2,
+                'hit_ratio': round(l2['hits'] / l2_lookups, 4) if l2_lookups else 0
+            },
+            'semantic': {
+                **semantic,
+                'enabled': self.semantic is not None,
+                'threshold': self.semantic.threshold if self.semantic is not None else None,
+                'entries': len(self.semantic) if self.semantic is not None else 0,
+                'hit_ratio': round(semantic['hits'] / semantic_lookups, 4) if semantic_lookups else 0
+            },
+            'overall_hit_ratio': round(
+                (l1['hits'] + l2['hits'] + semantic['hits']) / l1_lookups, 4
+            ) if l1_lookups else 0
+        }
     
-    def _create_table(self):
-        """Create DynamoDB table with proper schema"""
-        try:
-            table = self.dynamodb.create_table(
-                TableName=self.table_name,
-                KeySchema=[
-                    {
-                        'AttributeName': 'cache_key',
-                        'KeyType': 'HASH'  # Partition key
-                    }
-                ],
-                AttributeDefinitions=[
-                    {
-                        'AttributeName': 'cache_key',
-                        'AttributeType': 'S'
-                    },
-                    {
-                        'AttributeName': 'database_name',
-                        'AttributeType': 'S'
-                    },
-                    {
-                        'AttributeName': 'created_at',
-                        'AttributeType': 'N'
-                    }
-                ],
-                GlobalSecondaryIndexes=[
-                    {
-                        'IndexName': 'database-index',
-                        'KeySchema': [
-                            {
-                                'AttributeName': 'database_name',
-                                'KeyType': 'HASH'
-                            },
-                            {
-                                'AttributeName': 'created_at',
-                                'KeyType': 'RANGE'
-                            }
-                        ],
-                        'Projection': {
-                            'ProjectionType': 'ALL'
-                        }
-                    }
-                ],
-                BillingMode='PAY_PER_REQUEST',  # On-demand pricing
-                Tags=[
-                    {
-                        'Key': 'Application',
-                        'Value': 'Text2SQL'
-                    },
-                    {
-                        'Key': 'Purpose',
-                        'Value': 'Query Cache'
-                    }
-                ]
-            )
-            
-            # Wait for table to be created
-            table.meta.client.get_waiter('table_exists').wait(TableName=self.table_name)
-            
-            # Enable TTL
-            table.meta.client.update_time_to_live(
-                TableName=self.table_name,
-                TimeToLiveSpecification={
-                    'Enabled': True,
-                    'AttributeName': 'ttl'
-                }
-            )
-            
-            self.table = table
-            logger.info(f"Cache table created successfully", extra={
-                "extra_fields": {"table_name": self.table_name}
-            })
-            
-        except Exception as e:
-            logger.error(f"Failed to create cache table", extra={
-                "extra_fields": {
-                    "table_name": self.table_name,
-                    "error": str(e)
-                }
-            }, exc_info=True)
-            raise
+    @staticmethod
+    def _get_schema_version(schemas: Dict[str, Any]) -> str:
+        """
+        Get the schema version for a schema dict, memoized by identity
+
+        SchemaCache hands every request the same (never mutated) dict until
+        the schema changes, so the full hash runs once per schema load
+        instead of on every get/put.
+        """
+        memo = _schema_versions.get(id(schemas))
+        if memo is not None and memo[0] is schemas:
+            return memo[1]
+        
+        schema_version = QueryCache._compute_schema_version(schemas)
+        with _schema_versions_lock:
+            # Schemas only change on refresh, so a handful of entries is plenty
+            if len(_schema_versions) >= 16:
+                _schema_versions.clear()
+            # Keep a reference so id() stays unique while memoized
+            _schema_versions[id(schemas)] = (schemas, schema_version)
+        return schema_version
     
-    def _get_schema_version(self, schemas: Dict[str, Any]) -> str:
+    @staticmethod
+    def _compute_schema_version(schemas: Dict[str, Any]) -> str:
         """
         Generate schema version from database structure
         Returns 16-character hash
@@ -169,8 +293,8 @@ class QueryCache:
         # Generate hash
         return hashlib.md5(fingerprint.encode()).hexdigest()[:16]
     
+    @staticmethod
     def _get_cache_key(
-        self,
         natural_language_query: str,
         database_name: str,
         schema_version: str
@@ -185,6 +309,21 @@ class QueryCache:
         # Generate hash
         return hashlib.sha256(key_string.encode()).hexdigest()
     
+    @staticmethod
+    def build_cache_key(
+        natural_language_query: str,
+        database_name: str,
+        schemas: Dict[str, Any]
+    ) -> str:
+        """
+        Get the cache key a question would be stored under
+
+        Usable without a QueryCache instance, e.g. to coalesce identical
+        in-flight generations even when caching is disabled.
+        """
+        schema_version = QueryCache._get_schema_version(schemas)
+        return QueryCache._get_cache_key(natural_language_query, database_name, schema_version)
+    
     def get(
         self,
         natural_language_query: str,
@@ -197,45 +336,76 @@ class QueryCache:
         Returns:
             Generated SQL if cache hit, None if cache miss
         """
-        self._ensure_table_exists()
-        
         # Calculate schema version and cache key
         schema_version = self._get_schema_version(schemas)
         cache_key = self._get_cache_key(natural_language_query, database_name, schema_version)
         
         start_time = time.time()
         
+        # L1: in-process
+        local_value = self.local.get(cache_key)
+        if local_value is _NEGATIVE:
+            self._count('l1', 'negative_hits')
+            logger.debug(f"Cache MISS (negative L1 entry)", extra={
+                "extra_fields": {
+                    "cache_key": cache_key[:16],
+                    "database_name": database_name
+                }
+            })
+            return self._get_similar(natural_language_query, database_name, schema_version)
+        
+        if local_value is not None:
+            self._count('l1', 'hits')
+            self.hit_counter.record(cache_key, database_name, schema_version, natural_language_query)
+            logger.info(f"Cache HIT", extra={
+                "extra_fields": {
+                    "cache_key": cache_key[:16],
+                    "database_name": database_name,
+                    "tier": "l1",
+                    "lookup_time_ms": round((time.time() - start_time) * 1000, 3)
+                }
+            })
+            return local_value
+        
+        self._count('l1', 'misses')
+        
+        # L2: shared backend
         try:
-            response = self.table.get_item(
-                Key={'cache_key': cache_key}
-            )
+            item = self.backend.get_item(cache_key)
             
             duration = time.time() - start_time
             
-            if 'Item' in response:
-                item = response['Item']
+            if item is not None:
+                self._count('l2', 'hits')
+                self.hit_counter.record(cache_key, database_name, schema_version, item['natural_language_query'])
                 
-                # Update hit count and last accessed time
-                self.table.update_item(
-                    Key={'cache_key': cache_key},
-                    UpdateExpression='SET hit_count = hit_count + :inc, last_accessed_at = :now',
-                    ExpressionAttributeValues={
-                        ':inc': 1,
-                        ':now': int(time.time())
-                    }
-                )
+                # Promote to L1 until the item's backend TTL
+                expires_in = int(item.get('ttl', 0)) - time.time()
+                if expires_in > 0:
+                    self.local.set(cache_key, item['generated_sql'], expires_in)
+                    if self.semantic is not None:
+                        self.semantic.add(
+                            item['natural_language_query'], database_name, schema_version,
+                            cache_key, item['generated_sql'], expires_in
+                        )
                 
                 logger.info(f"Cache HIT", extra={
                     "extra_fields": {
                         "cache_key": cache_key[:16],
                         "database_name": database_name,
                         "hit_count": int(item.get('hit_count', 0)) + 1,
+                        "tier": "l2",
+                        "backend": self.backend.name,
                         "lookup_time_ms": round(duration * 1000, 2)
                     }
                 })
                 
                 return item['generated_sql']
             else:
+                self._count('l2', 'misses')
+                if self.negative_ttl_seconds > 0:
+                    self.local.set(cache_key, _NEGATIVE, self.negative_ttl_seconds)
+                
                 logger.info(f"Cache MISS", extra={
                     "extra_fields": {
                         "cache_key": cache_key[:16],
@@ -243,10 +413,10 @@ class QueryCache:
                         "lookup_time_ms": round(duration * 1000, 2)
                     }
                 })
-                return None
                 
         except Exception as e:
             duration = time.time() - start_time
+            self._count('l2', 'errors')
             logger.error(f"Cache lookup error", extra={
                 "extra_fields": {
                     "cache_key": cache_key[:16],
@@ -255,7 +425,90 @@ class QueryCache:
                     "lookup_time_ms": round(duration * 1000, 2)
                 }
             }, exc_info=True)
+        
+        return self._get_similar(natural_language_query, database_name, schema_version)
+    
+    def contains(
+        self,
+        natural_language_query: str,
+        database_name: str,
+        schemas: Dict[str, Any]
+    ) -> bool:
+        """
+        Whether a question has an exact entry in L1 or L2
+        
+        Unlike get(), no hit is counted and no similar question is matched;
+        used by the cache warmer to skip questions that are already cached.
+        """
+        schema_version = self._get_schema_version(schemas)
+        cache_key = self._get_cache_key(natural_language_query, database_name, schema_version)
+        
+        local_value = self.local.get(cache_key)
+        if local_value is not None and local_value is not _NEGATIVE:
+            return True
+        
+        return self.backend.get_item(cache_key) is not None
+    
+    def _get_similar(
+        self,
+        natural_language_query: str,
+        database_name: str,
+        schema_version: str
+    ) -> Optional[str]:
+        """Semantic tier: SQL of the most similar cached question, if close enough"""
+        if self.semantic is None:
             return None
+        
+        match = self.semantic.lookup(natural_language_query, database_name, schema_version)
+        if match is None:
+            self._count('semantic', 'misses')
+            return None
+        
+        self._count('semantic', 'hits')
+        self.hit_counter.record(match['cache_key'], database_name, schema_version, match['question'])
+        
+        logger.info(f"Cache HIT", extra={
+            "extra_fields": {
+                "cache_key": match['cache_key'][:16],
+                "database_name": database_name,
+                "tier": "semantic",
+                "similarity": match['similarity'],
+                "matched_question": match['question']
+            }
+        })
+        
+        return match['generated_sql']
+    
+    def _flush_hits(self, pending: Dict[str, Dict[str, Any]]) -> None:
+        """Apply coalesced hit increments to the backend and roll them into per-database stats"""
+        totals = self.backend.increment_hits(pending)
+        
+        by_database: Dict[str, Dict[str, Any]] = {}
+        for cache_key, hit_count in totals.items():
+            hits = pending[cache_key]
+            stats = by_database.setdefault(hits['database_name'], {'hits_by_version': {}, 'hot_questions': []})
+            stats['hits_by_version'][hits['schema_version']] = (
+                stats['hits_by_version'].get(hits['schema_version'], 0) + hits['count']
+            )
+            stats['hot_questions'].append({
+                'cache_key': cache_key,
+                'natural_language_query': hits['natural_language_query'],
+                'hit_count': hit_count
+            })
+        
+        for database_name, stats in by_database.items():
+            self.backend.update_stats(
+                database_name,
+                entries_by_version={},
+                hits_by_version=stats['hits_by_version'],
+                hot_questions=stats['hot_questions'],
+                top_n=self.stats_top_n
+            )
+    
+    def close(self) -> None:
+        """Flush pending hit counts and release the backend; call on shutdown"""
+        self.hit_counter.close()
+        self.backend.close()
     
     def put(
         self,
@@ -270,8 +523,6 @@ class QueryCache:
         Returns:
             True if successful, False otherwise
         """
-        self._ensure_table_exists()
-        
         # Calculate schema version and cache key
         schema_version = self._get_schema_version(schemas)
         cache_key = self._get_cache_key(natural_language_query, database_name, schema_version)
@@ -282,8 +533,16 @@ class QueryCache:
             # Calculate TTL (current time + ttl_days in seconds)
             ttl = int(time.time()) + (self.ttl_days * 24 * 60 * 60)
             
-            self.table.put_item(
-                Item={
+            # L1 first (also replaces any negative entry), then the backend
+            self.local.set(cache_key, generated_sql, ttl - time.time())
+            if self.semantic is not None:
+                self.semantic.add(
+                    natural_language_query, database_name, schema_version,
+                    cache_key, generated_sql, ttl - time.time()
+                )
+            
+            created = self.backend.put_item(
+                {
                     'cache_key': cache_key,
                     'natural_language_query': natural_language_query,
                     'database_name': database_name,
@@ -295,6 +554,14 @@ class QueryCache:
                     'ttl': ttl
                 }
             )
+            if created:
+                self.backend.update_stats(
+                    database_name,
+                    entries_by_version={schema_version: 1},
+                    hits_by_version={},
+                    hot_questions=[],
+                    top_n=self.stats_top_n
+                )
             
             duration = time.time() - start_time
             
@@ -303,6 +570,7 @@ class QueryCache:
                     "cache_key": cache_key[:16],
                     "database_name": database_name,
                     "schema_version": schema_version,
+                    "backend": self.backend.name,
                     "ttl_days": self.ttl_days,
                     "store_time_ms": round(duration * 1000, 2)
                 }
@@ -326,30 +594,34 @@ class QueryCache:
         """
         Get cache statistics for a database
         
+        Reads the pre-aggregated counters maintained on put and hit flush
+        (a single lookup), so the cost does not grow with the cache. Entries
+        removed by TTL expiry are not subtracted; hits still pending in the
+        in-process counter are not included until the next flush.
+        
         Returns:
             Dictionary with cache stats
         """
-        self._ensure_table_exists()
-        
         try:
-            response = self.table.query(
-                IndexName='database-index',
-                KeyConditionExpression='database_name = :db',
-                ExpressionAttributeValues={
-                    ':db': database_name
-                }
-            )
+            record = self.backend.get_stats_record(database_name)
             
-            items = response.get('Items', [])
-            
-            total_queries = len(items)
-            total_hits = sum(int(item.get('hit_count', 0)) for item in items)
+            total_queries = sum(record['entries_by_version'].values())
+            total_hits = sum(record['hits_by_version'].values())
             
             return {
                 'database_name': database_name,
                 'total_cached_queries': total_queries,
                 'total_cache_hits': total_hits,
-                'average_hits_per_query': round(total_hits / total_queries, 2) if total_queries > 0 else 0
+                'average_hits_per_query': round(total_hits / total_queries, 2) if total_queries > 0 else 0,
+                'entries_by_schema_version': record['entries_by_version'],
+                'hits_by_schema_version': record['hits_by_version'],
+                'top_questions': [
+                    {
+                        'natural_language_query': question['natural_language_query'],
+                        'hit_count': question['hit_count']
+                    }
+                    for question in record['hot_questions'][:self.stats_top_n]
+                ]
             }
             
         except Exception as e:
@@ -0,0 +1,145 @@
+"""
+Response encodings for query results: row objects, columnar JSON and Arrow IPC
+"""
+import datetime
+import io
+import json
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+import orjson
+from fastapi.responses import JSONResponse
+
+FORMAT_ROWS = "rows"
+FORMAT_COLUMNS = "columns"
+FORMAT_ARROW = "arrow"
+
+COLUMNS_MEDIA_TYPE = "application/vnd.text2sql.columns+json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+_ACCEPT_FORMATS = {
+    COLUMNS_MEDIA_TYPE: FORMAT_COLUMNS,
+    ARROW_MEDIA_TYPE: FORMAT_ARROW
+}
+
+class FormatNotAvailable(Exception):
+    """The requested format needs an optional package that isn't installed"""
+
+def json_default(value: Any) -> Any:
+    """Encode the non-JSON types psycopg2 returns the way FastAPI's encoder does"""
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).decode('utf-8', 'replace')
+    return str(value)
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize to compact JSON bytes with orjson
+
+    datetime, date, time and UUID are encoded natively; Decimal, timedelta
+    and bytes/memoryview go through json_default. Integers beyond 64 bits
+    (huge NUMERIC values) fall back to the standard json module.
+    """
+    try:
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        return json.dumps(content, default=json_default, separators=(',', ':')).encode('utf-8')
+
+class ResultJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson
+
+    Return it from an endpoint instead of a dict: a plain dict is first run
+    through FastAPI's jsonable_encoder, which is the slow part on large results.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def negotiate_format(format_param: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick the result format from ?format= (takes precedence) or the Accept header
+
+    Raises:
+        ValueError: unknown ?format= value
+        FormatNotAvailable: Arrow requested but pyarrow is not installed
+    """
+    if format_param:
+        result_format = format_param.lower()
+        if result_format not in (FORMAT_ROWS, FORMAT_COLUMNS, FORMAT_ARROW):
+            raise ValueError(f"Unknown result format: {format_param} (use rows, columns or arrow)")
+    else:
+        result_format = FORMAT_ROWS
+        for media_range in (accept or "").split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            if media_type in _ACCEPT_FORMATS:
+                result_format = _ACCEPT_FORMATS[media_type]
+                break
+
+    if result_format == FORMAT_ARROW:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise FormatNotAvailable("Arrow output needs pyarrow on the server (pip install pyarrow)")
+
+    return result_format
+
+def to_columns(rows: List[Dict[str, Any]], columns: List[str]) -> List[List[Any]]:
+    """Transpose row dicts into one value list per column"""
+    return [[row[column] for row in rows] for column in columns]
+
+def encode_columns(payload: Dict[str, Any]) -> bytes:
+    """
+    Columnar JSON: the payload with 'data' replaced by one array per column
+
+    {"columns": ["a", "b"], "data": [[a1, a2, ...], [b1, b2, ...]], ...}
+    """
+    columns = payload.get('columns') or (list(payload['data'][0].keys()) if payload['data'] else [])
+    body = {**payload, 'columns': columns, 'data': to_columns(payload['data'], columns)}
+    return dumps(body)
+
+def encode_arrow(rows: List[Dict[str, Any]], columns: List[str]) -> bytes:
+    """
+    Arrow IPC stream with one record batch
+
+    Types are inferred from the values: NUMERIC becomes decimal128 and
+    timestamps become Arrow timestamps, with no conversion to float or text.
+    Columns Arrow can't type (e.g. json values of mixed shapes) are sent as
+    strings.
+    """
+    import pyarrow as pa
+
+    def to_array(values: List[Any]):
+        try:
+            return pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+    columns = columns or (list(rows[0].keys()) if rows else [])
+    table = pa.table({
+        column: to_array(values)
+        for column, values in zip(columns, to_columns(rows, columns))
+    })
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def result_headers(payload: Dict[str, Any]) -> Dict[str, str]:
+    """Paging fields of a result payload as headers (for bodies that can't carry them)"""
+    headers = {
+        'X-Row-Count': str(payload.get('row_count', 0)),
+        'X-Has-More': 'true' if payload.get('has_more') else 'false'
+    }
+    if payload.get('result_handle'):
+        headers['X-Result-Handle'] = payload['result_handle']
+    if payload.get('next_cursor'):
+        headers['X-Next-Cursor'] = payload['next_cursor']
+    if payload.get('truncated'):
+        headers['X-Truncated'] = 'true'
+    return headers
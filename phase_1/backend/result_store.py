@@ -0,0 +1,422 @@
+"""
+Spooled query results served page by page through result handles
+"""
+import asyncio
+import re
+import time
+import uuid
+from contextlib import aclosing
+from typing import Dict, Any, List, Optional
+from database import AsyncDatabaseManager
+from cloudwatch_logger import get_logger
+
+logger = get_logger(__name__)
+
+# Statements that can run through a server-side cursor (DECLARE ... CURSOR FOR)
+_ROW_QUERY_PATTERN = re.compile(
+    r"^\s*(?:--[^\n]*\n\s*|/\*.*?\*/\s*)*(?:\(|select\b|with\b|values\b|table\b)",
+    re.IGNORECASE | re.DOTALL
+)
+
+# ...unless they write: WITH ... INSERT/UPDATE/DELETE and SELECT ... INTO are
+# rejected by DECLARE. A keyword inside a string literal only costs paging
+# (the plain execute path still applies the row cap)
+_WRITE_PATTERN = re.compile(r"\b(?:insert|update|delete|merge|into)\b", re.IGNORECASE)
+
+# Error DECLARE raises for anything the check above lets through but a cursor
+# can't run; the caller falls back to a plain execute. Syntax errors are not
+# retried: the plain execute would fail the same way
+CURSOR_UNSUPPORTED_CODES = ('0A000',)
+
+def is_row_query(query: str) -> bool:
+    """Whether a statement returns rows without writing and can be paged"""
+    return bool(_ROW_QUERY_PATTERN.match(query)) and not _WRITE_PATTERN.search(query)
+
+class ResultSet:
+    """One spooled result: pages filled in the background as rows arrive"""
+
+    def __init__(self, session_id: str, database_name: str, columns: List[str]):
+        self.handle = uuid.uuid4().hex
+        self.session_id = session_id
+        self.database_name = database_name
+        self.columns = columns
+        self.pages: List[List[Dict[str, Any]]] = []
+        self.bytes = 0
+        self.row_count = 0
+        self.done = False
+        self.truncated = False
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.last_accessed_at = self.created_at
+        self.requested_page = 0  # Highest page index asked for so far
+        self.more = True  # Whether rows follow the last page read
+        self.draining = False  # Read to the end without pausing, then release the cursor
+        self.condition = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+    def add_page(self, rows: List[Dict[str, Any]], size: int) -> None:
+        self.pages.append(rows)
+        self.bytes += size
+        self.row_count += len(rows)
+
+class ResultStore:
+    """
+    Pages large query results instead of returning them in one response
+
+    execute() returns the first page at once. If there may be more rows,
+    it also returns a result handle, and a background task reads the
+    server-side cursor one page per fetch. It stays at most
+    `read_ahead_pages` pages ahead of the last page requested, then pauses
+    until get_page() asks for more. The next page is then usually ready
+    when it is asked for, and a result nobody pages through costs only a
+    few pages of memory. The cursor's connection goes back to the pool once
+    the result is read to the end.
+
+    Trade-off: a paused result holds its pooled connection (idle in its
+    transaction). To keep paused results from exhausting the pool:
+    - At most `max_cursors_per_session` and `max_cursors_per_database`
+      results hold a cursor at once. Beyond that the oldest ones drain:
+      they read the rest into memory, within the session budget, and give
+      the connection back.
+    - If the reader doesn't come back within `cursor_idle_seconds`, the
+      cursor is closed and the result dropped. A later read of it is a 404
+      and the query must be run again.
+
+    Limits:
+    - A result not read for `ttl_seconds` is dropped.
+    - A session's spooled results share `session_budget_bytes` (JSON-encoded
+      size). Its least recently read results are evicted first. A single
+      result that alone exceeds the budget is truncated (flagged in the
+      response).
+    - The query's own limits (statement timeout, row and byte caps) are
+      applied by the stream; see QueryStream.
+    """
+
+    def __init__(
+        self,
+        page_size: int = 500,
+        ttl_seconds: int = 300,
+        session_budget_bytes: int = 50 * 1024 * 1024,
+        read_ahead_pages: int = 2,
+        cursor_idle_seconds: float = 60.0,
+        max_cursors_per_session: int = 2,
+        max_cursors_per_database: int = 5
+    ):
+        self.page_size = page_size
+        self.ttl_seconds = ttl_seconds
+        self.session_budget_bytes = session_budget_bytes
+        self.read_ahead_pages = read_ahead_pages
+        self.cursor_idle_seconds = cursor_idle_seconds
+        self.max_cursors_per_session = max_cursors_per_session
+        self.max_cursors_per_database = max_cursors_per_database
+        self._results: Dict[str, ResultSet] = {}
+        self._stats = {
+            'created': 0,
+            'expired': 0,
+            'evicted': 0,
+            'truncated': 0,
+            'cursor_idle_closed': 0,
+            'drained': 0
+        }
+
+        logger.info(f"ResultStore initialized", extra={
+            "extra_fields": {
+                "page_size": page_size,
+                "ttl_seconds": ttl_seconds,
+                "session_budget_bytes": session_budget_bytes,
+                "read_ahead_pages": read_ahead_pages,
+                "cursor_idle_seconds": cursor_idle_seconds,
+                "max_cursors_per_session": max_cursors_per_session,
+                "max_cursors_per_database": max_cursors_per_database
+            }
+        })
+
+    async def execute(self, session_id: str, db_manager: AsyncDatabaseManager, query: str) -> Dict[str, Any]:
+        """
+        Run a row-returning query and return its first page
+
+        Returns:
+            The /api/execute-query payload: 'data' (first page), 'columns',
+            'row_count' (rows in this page) and 'has_more'; with more rows
+            possibly pending also 'result_handle' and 'next_cursor'. On
+            failure 'success' False with 'error', 'error_code' and (for a
+            timeout or cancel) 'reason'. 'truncated' is set when the query's
+            row or byte cap cut the result short.
+        """
+        self._purge_expired()
+
+        events = db_manager.stream_query(query, self.page_size)
+        spooling = False
+        try:
+            columns = []
+            rows = []
+            truncated = False
+            async for event in events:
+                if event['type'] == 'error':
+                    return self._error_response(event)
+                if event['type'] == 'columns':
+                    columns = event['columns']
+                    continue
+                if event['type'] == 'rows':
+                    rows = event['rows']
+                    size = event['bytes']
+                    spooling = event['more']
+                if event['type'] == 'end':
+                    truncated = event['truncated']
+                break
+
+            if not spooling:
+                # Everything fit in the first page; read the end event to release the cursor
+                async for event in events:
+                    if event['type'] == 'error':
+                        return self._error_response(event)
+                    if event['type'] == 'end':
+                        truncated = event['truncated']
+
+                return {
+                    'success': True,
+                    'data': rows,
+                    'columns': columns,
+                    'row_count': len(rows),
+                    'has_more': False,
+                    'truncated': truncated
+                }
+
+            result = ResultSet(session_id, db_manager.database_name, columns)
+            result.add_page(rows, size)
+            self._results[result.handle] = result
+            self._stats['created'] += 1
+            result.task = asyncio.create_task(self._spool(result, events))
+            await self._limit_open_cursors(result)
+
+            logger.info(f"Result set spooling started", extra={
+                "extra_fields": {
+                    "session_id": session_id,
+                    "database": db_manager.database_name,
+                    "result_handle": result.handle,
+                    "page_size": self.page_size
+                }
+            })
+
+            return {
+                'success': True,
+                'data': rows,
+                'columns': columns,
+                'row_count': len(rows),
+                'has_more': True,
+                'result_handle': result.handle,
+                'next_cursor': '1',
+                'truncated': False
+            }
+        finally:
+            if not spooling:
+                await events.aclose()
+
+    async def _spool(self, result: ResultSet, events) -> None:
+        """Read the remaining batches into the result's pages, staying a few pages ahead of the reader"""
+        start_time = time.time()
+        idle_closed = False
+        async with aclosing(events):
+            try:
+                async for event in events:
+                    if event['type'] == 'rows':
+                        if not self._reserve(result, event['bytes']):
+                            result.truncated = True
+                            self._stats['truncated'] += 1
+                            break
+                        result.add_page(event['rows'], event['bytes'])
+                        result.more = event['more']
+                    elif event['type'] == 'end' and event['truncated']:
+                        # Stopped at the query's row or byte cap
+                        result.truncated = True
+                        self._stats['truncated'] += 1
+                    elif event['type'] == 'error':
+                        result.error = event['error']
+
+                    async with result.condition:
+                        result.condition.notify_all()
+
+                        if event['type'] == 'rows' and event['more'] and not self._wanted(result):
+                            try:
+                                await asyncio.wait_for(
+                                    result.condition.wait_for(lambda: self._wanted(result)),
+                                    self.cursor_idle_seconds
+                                )
+                            except asyncio.TimeoutError:
+                                # Nobody is paging through it; free the connection
+                                idle_closed = True
+                                break
+            finally:
+                result.done = True
+                async with result.condition:
+                    result.condition.notify_all()
+
+        if idle_closed:
+            self._results.pop(result.handle, None)
+            self._stats['cursor_idle_closed'] += 1
+
+        duration = time.time() - start_time
+        logger.info(f"Result set spooling finished", extra={
+            "extra_fields": {
+                "session_id": result.session_id,
+                "database": result.database_name,
+                "result_handle": result.handle,
+                "row_count": result.row_count,
+                "page_count": len(result.pages),
+                "spooled_bytes": result.bytes,
+                "truncated": result.truncated,
+                "cursor_idle_closed": idle_closed,
+                "error": result.error,
+                "spool_time_ms": round(duration * 1000, 2)
+            }
+        })
+
+    async def get_page(self, session_id: str, handle: str, cursor: str) -> Dict[str, Any]:
+        """
+        Get the page a cursor token points at, waiting for it if still being read
+
+        Raises:
+            KeyError: unknown or expired handle, or another session's handle
+            ValueError: malformed cursor token
+        """
+        self._purge_expired()
+
+        result = self._results.get(handle)
+        if result is None or result.session_id != session_id:
+            raise KeyError(handle)
+
+        if not cursor.isdigit():
+            raise ValueError(f"Invalid cursor: {cursor}")
+        index = int(cursor)
+
+        result.last_accessed_at = time.time()
+        async with result.condition:
+            # Let the spooler read on up to read_ahead_pages past this page
+            if index > result.requested_page:
+                result.requested_page = index
+                result.condition.notify_all()
+            await result.condition.wait_for(lambda: self._page_ready(result, index))
+
+        if index >= len(result.pages) and result.error:
+            return {'success': False, 'error': result.error}
+
+        rows = result.pages[index] if index < len(result.pages) else []
+        has_more = index + 1 < len(result.pages) or (result.more and not result.done)
+        return {
+            'success': True,
+            'data': rows,
+            'columns': result.columns,
+            'row_count': len(rows),
+            'has_more': has_more,
+            'result_handle': handle,
+            'next_cursor': str(index + 1) if has_more else None,
+            'truncated': result.truncated and not has_more
+        }
+
+    def _wanted(self, result: ResultSet) -> bool:
+        """Whether the spooler should fetch another page of this result"""
+        return result.draining or len(result.pages) <= result.requested_page + self.read_ahead_pages
+
+    def _page_ready(self, result: ResultSet, index: int) -> bool:
+        """Whether page `index` can be answered with final has_more/truncated flags"""
+        if result.done:
+            return True
+        if index >= len(result.pages):
+            return False
+        # For the last page, wait for the end event (right behind it) so the
+        # response says whether the result was truncated
+        return index + 1 < len(result.pages) or result.more
+
+    async def _limit_open_cursors(self, result: ResultSet) -> None:
+        """Drain the oldest results holding a cursor when the session or database has too many"""
+        for attribute, limit in (
+            ('session_id', self.max_cursors_per_session),
+            ('database_name', self.max_cursors_per_database)
+        ):
+            if not limit:
+                continue
+
+            holding = sorted(
+                (
+                    other for other in self._results.values()
+                    if getattr(other, attribute) == getattr(result, attribute)
+                    and not other.done and not other.draining
+                ),
+                key=lambda other: other.created_at
+            )
+            for other in holding[:max(0, len(holding) - limit)]:
+                other.draining = True
+                self._stats['drained'] += 1
+                async with other.condition:
+                    other.condition.notify_all()
+
+                logger.info(f"Result set draining to free its connection", extra={
+                    "extra_fields": {
+                        "session_id": other.session_id,
+                        "database": other.database_name,
+                        "result_handle": other.handle,
+                        "limit": attribute,
+                        "open_cursor_limit": limit
+                    }
+                })
+
+    def _error_response(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """/api/execute-query payload for a stream error event"""
+        response = {'success': False, 'error': event['error'], 'error_code': event['error_code']}
+        if event.get('reason'):
+            response['reason'] = event['reason']
+        return response
+
+    def _reserve(self, result: ResultSet, size: int) -> bool:
+        """Make room in the session's budget for `size` more bytes of this result"""
+        session_results = [
+            other for other in self._results.values()
+            if other.session_id == result.session_id and other is not result
+        ]
+        used = result.bytes + sum(other.bytes for other in session_results)
+
+        # Least recently read results of the same session go first
+        for other in sorted(session_results, key=lambda other: other.last_accessed_at):
+            if used + size <= self.session_budget_bytes:
+                break
+            used -= other.bytes
+            self._drop(other)
+            self._stats['evicted'] += 1
+
+        return used + size <= self.session_budget_bytes
+
+    def _purge_expired(self) -> None:
+        """Drop results nobody has read for ttl_seconds"""
+        cutoff = time.time() - self.ttl_seconds
+        for result in [result for result in self._results.values() if result.last_accessed_at < cutoff]:
+            self._drop(result)
+            self._stats['expired'] += 1
+
+    def _drop(self, result: ResultSet) -> None:
+        """Forget a result, stopping its spool (which closes the cursor)"""
+        self._results.pop(result.handle, None)
+        if result.task is not None and not result.task.done():
+            result.task.cancel()
+
+    def release_session(self, session_id: str) -> None:
+        """Drop every result of a session (on logout)"""
+        for result in [result for result in self._results.values() if result.session_id == session_id]:
+            self._drop(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get result and spooled byte counts plus lifetime counters"""
+        results = list(self._results.values())
+        return {
+            'results': len(results),
+            'spooling': sum(1 for result in results if not result.done),
+            'spooled_bytes': sum(result.bytes for result in results),
+            'sessions': len({result.session_id for result in results}),
+            **self._stats
+        }
+
+    async def close(self) -> None:
+        """Stop all spools; call on shutdown before the pools are closed"""
+        tasks = [result.task for result in self._results.values() if result.task is not None]
+        for result in list(self._results.values()):
+            self._drop(result)
+        await asyncio.gather(*tasks, return_exceptions=True)
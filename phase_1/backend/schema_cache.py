@@ -0,0 +1,155 @@
+"""
+Process-wide database schema cache with catalog fingerprint change detection
+"""
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, List
+from cloudwatch_logger import get_logger
+
+logger = get_logger(__name__)
+
+class SchemaCache:
+    """
+    Shared per-database cache of get_all_schemas() results
+
+    A cached schema is served without touching Postgres for
+    `check_interval_seconds`. After that, a single cheap fingerprint query
+    decides whether the schema changed; a full reload only happens when the
+    fingerprint differs or the entry is older than `ttl_seconds`.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, check_interval_seconds: int = 5):
+        self.ttl_seconds = ttl_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._listeners: List[Callable[[str], None]] = []
+
+        logger.info(f"SchemaCache initialized", extra={
+            "extra_fields": {
+                "ttl_seconds": ttl_seconds,
+                "check_interval_seconds": check_interval_seconds
+            }
+        })
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """
+        Call callback(database_name) whenever a reload finds a changed schema
+
+        Callbacks run on the thread that did the reload (usually a database
+        executor thread) and must not block.
+        """
+        self._listeners.append(callback)
+
+    def _get_lock(self, database_name: str) -> threading.Lock:
+        """Get the refresh lock for a database"""
+        with self._locks_guard:
+            if database_name not in self._locks:
+                self._locks[database_name] = threading.Lock()
+            return self._locks[database_name]
+
+    def _is_fresh(self, entry: Optional[Dict[str, Any]], now: float) -> bool:
+        """Whether an entry can be served without any Postgres work"""
+        return (
+            entry is not None
+            and now - entry['checked_at'] < self.check_interval_seconds
+            and now - entry['loaded_at'] < self.ttl_seconds
+        )
+
+    def get(self, db_manager) -> Dict[str, Any]:
+        """
+        Get all table schemas for the manager's database
+
+        Args:
+            db_manager: DatabaseManager connected to the database
+
+        Returns:
+            Schema dict in the get_all_schemas() format. The same object is
+            shared by all callers until the schema changes, so it must not be
+            mutated.
+        """
+        database_name = db_manager.database_name
+
+        entry = self._entries.get(database_name)
+        if self._is_fresh(entry, time.time()):
+            return entry['schemas']
+
+        with self._get_lock(database_name):
+            # Another request may have refreshed the entry while we waited
+            now = time.time()
+            entry = self._entries.get(database_name)
+            if self._is_fresh(entry, now):
+                return entry['schemas']
+
+            start_time = time.time()
+            fingerprint = db_manager.get_schema_fingerprint()
+
+            if entry is not None and now - entry['loaded_at'] < self.ttl_seconds and entry['fingerprint'] == fingerprint:
+                entry['checked_at'] = now
+                logger.debug(f"Schema unchanged", extra={
+                    "extra_fields": {
+                        "database": database_name,
+                        "check_time_ms": round((time.time() - start_time) * 1000, 2)
+                    }
+                })
+                return entry['schemas']
+
+            schemas = db_manager.get_all_schemas()
+            now = time.time()
+
+            self._entries[database_name] = {
+                'schemas': schemas,
+                'fingerprint': fingerprint,
+                'loaded_at': now,
+                'checked_at': now
+            }
+
+            logger.info(f"Schema cache refreshed", extra={
+                "extra_fields": {
+                    "database": database_name,
+                    "reason": "initial_load" if entry is None else (
+                        "schema_changed" if entry['fingerprint'] != fingerprint else "ttl_expired"
+                    ),
+                    "table_count": len(schemas),
+                    "refresh_time_ms": round((now - start_time) * 1000, 2)
+                }
+            })
+
+            if entry is not None and entry['fingerprint'] != fingerprint:
+                for callback in self._listeners:
+                    try:
+                        callback(database_name)
+                    except Exception as e:
+                        logger.error(f"Schema change listener failed", extra={
+                            "extra_fields": {
+                                "database": database_name,
+                                "error": str(e)
+                            }
+                        }, exc_info=True)
+
+            return schemas
+
+    async def aget(self, db_manager) -> Dict[str, Any]:
+        """
+        Awaitable get() for an AsyncDatabaseManager
+
+        Fresh entries are returned directly; fingerprint checks and reloads run
+        on the database executor.
+        """
+        entry = self._entries.get(db_manager.database_name)
+        if self._is_fresh(entry, time.time()):
+            return entry['schemas']
+
+        return await db_manager.run(self.get, db_manager.manager)
+
+    def invalidate(self, database_name: Optional[str] = None) -> None:
+        """Drop the cached schema for one database, or for all databases"""
+        if database_name is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(database_name, None)
+
+        logger.info(f"Schema cache invalidated", extra={
+            "extra_fields": {"database": database_name or "all"}
+        })
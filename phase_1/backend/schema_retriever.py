@@ -0,0 +1,214 @@
+"""
+Offline relevant-table retrieval for prompt construction (BM25 over schema metadata)
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, Any, List, Optional, Set
+from cloudwatch_logger import get_logger
+
+logger = get_logger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_IDENTIFIER_PATTERN = re.compile(r"[a-z_][a-z0-9_]*")
+
+# Words that carry no signal for table selection
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'each', 'for', 'from',
+    'get', 'give', 'has', 'have', 'how', 'i', 'id', 'in', 'is', 'it', 'list',
+    'many', 'me', 'much', 'of', 'on', 'or', 'show', 'than', 'that', 'the',
+    'their', 'this', 'to', 'top', 'was', 'were', 'what', 'when', 'where',
+    'which', 'who', 'with'
+}
+
+# Table-name tokens count this many times more than column/comment tokens
+_TABLE_NAME_WEIGHT = 3
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords/numbers and crude-stem plurals"""
+    if not text:
+        return []
+
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in _STOPWORDS or token.isdigit():
+            continue
+        if len(token) > 3 and token.endswith('ies'):
+            token = token[:-3] + 'y'
+        elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class SchemaRetriever:
+    """
+    Ranks tables against a natural-language question and prunes the schema
+
+    Each table is a BM25 document built from its name, its COMMENT ON
+    description, its column names and column comments. The top-k tables
+    plus their one-hop foreign-key neighbours are kept; small schemas
+    (at most `min_tables` tables) are passed through untouched.
+    """
+
+    def __init__(self, top_k: int = 8, min_tables: int = 15, k1: float = 1.5, b: float = 0.75):
+        self.top_k = top_k
+        self.min_tables = min_tables
+        self.k1 = k1
+        self.b = b
+
+        # Indexes keyed by id() of the (shared, immutable) schema dict
+        self._indexes: Dict[int, Dict[str, Any]] = {}
+
+        logger.info(f"SchemaRetriever initialized", extra={
+            "extra_fields": {
+                "top_k": top_k,
+                "min_tables": min_tables
+            }
+        })
+
+    def _build_index(self, schemas: Dict[str, Any]) -> Dict[str, Any]:
+        """Build BM25 term statistics for every table"""
+        term_freqs = {}
+        doc_freq = Counter()
+
+        for table_name, table_info in schemas.items():
+            tokens = tokenize(table_name.replace('_', ' ')) * _TABLE_NAME_WEIGHT
+            tokens += tokenize(table_info.get('comment'))
+            for column in table_info.get('columns', []):
+                tokens += tokenize(column['column_name'].replace('_', ' '))
+                tokens += tokenize(column.get('column_comment'))
+
+            counts = Counter(tokens)
+            term_freqs[table_name] = counts
+            doc_freq.update(counts.keys())
+
+        lengths = {name: sum(counts.values()) for name, counts in term_freqs.items()}
+        doc_count = len(term_freqs)
+
+        return {
+            'schemas': schemas,  # keep a reference so id() stays unique
+            'term_freqs': term_freqs,
+            'lengths': lengths,
+            'avg_length': (sum(lengths.values()) / doc_count) if doc_count else 0,
+            'idf': {
+                term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                for term, df in doc_freq.items()
+            }
+        }
+
+    def _get_index(self, schemas: Dict[str, Any]) -> Dict[str, Any]:
+        """Get the index for a schema dict, building it on first use"""
+        index = self._indexes.get(id(schemas))
+        if index is None or index['schemas'] is not schemas:
+            index = self._build_index(schemas)
+            # Schemas only change on refresh, so a handful of entries is plenty
+            if len(self._indexes) >= 16:
+                self._indexes.clear()
+            self._indexes[id(schemas)] = index
+        return index
+
+    def rank_tables(self, question: str, schemas: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Score every table against the question, best first"""
+        index = self._get_index(schemas)
+        query_terms = set(tokenize(question))
+        avg_length = index['avg_length'] or 1
+
+        ranked = []
+        for table_name, counts in index['term_freqs'].items():
+            length_norm = self.k1 * (1 - self.b + self.b * index['lengths'][table_name] / avg_length)
+            score = 0.0
+            for term in query_terms:
+                tf = counts.get(term)
+                if tf:
+                    score += index['idf'][term] * tf * (self.k1 + 1) / (tf + length_norm)
+            ranked.append({'table_name': table_name, 'score': round(score, 4)})
+
+        ranked.sort(key=lambda item: item['score'], reverse=True)
+        return ranked
+
+    def _fk_neighbours(self, tables: Set[str], schemas: Dict[str, Any]) -> Set[str]:
+        """Tables one foreign-key hop away from the given tables (either direction)"""
+        neighbours = set()
+        for table_name, table_info in schemas.items():
+            for fk in table_info.get('foreign_keys', []):
+                if table_name in tables:
+                    neighbours.add(fk['foreign_table'])
+                if fk['foreign_table'] in tables:
+                    neighbours.add(table_name)
+        return {name for name in neighbours if name in schemas} - tables
+
+    def select(self, question: str, schemas: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Prune the schema down to the tables relevant for a question
+
+        Returns:
+            Dict with 'schemas' (pruned schema dict, original table order),
+            'selected_tables', 'pruned' and 'pruning_ratio'
+        """
+        total_tables = len(schemas)
+
+        if total_tables <= self.min_tables:
+            return {
+                'schemas': schemas,
+                'selected_tables': list(schemas.keys()),
+                'pruned': False,
+                'pruning_ratio': 0.0
+            }
+
+        ranked = self.rank_tables(question, schemas)
+        top = {item['table_name'] for item in ranked[:self.top_k] if item['score'] > 0}
+
+        if not top:
+            # Nothing matched; sending the full schema is safer than guessing
+            logger.info(f"Schema pruning skipped: no table matched the question", extra={
+                "extra_fields": {"table_count": total_tables}
+            })
+            return {
+                'schemas': schemas,
+                'selected_tables': list(schemas.keys()),
+                'pruned': False,
+                'pruning_ratio': 0.0
+            }
+
+        neighbours = self._fk_neighbours(top, schemas)
+        selected = top | neighbours
+        pruned_schemas = {name: info for name, info in schemas.items() if name in selected}
+        pruning_ratio = round(1 - len(pruned_schemas) / total_tables, 4)
+
+        logger.info(f"Schema pruned for prompt", extra={
+            "extra_fields": {
+                "table_count": total_tables,
+                "selected_count": len(pruned_schemas),
+                "fk_neighbour_count": len(neighbours),
+                "pruning_ratio": pruning_ratio,
+                "top_tables": [item for item in ranked[:self.top_k] if item['score'] > 0]
+            }
+        })
+
+        return {
+            'schemas': pruned_schemas,
+            'selected_tables': list(pruned_schemas.keys()),
+            'pruned': True,
+            'pruning_ratio': pruning_ratio
+        }
+
+def referenced_tables(sql_query: str, schemas: Dict[str, Any]) -> Set[str]:
+    """Names of schema tables that appear as identifiers in a SQL query"""
+    identifiers = set(_IDENTIFIER_PATTERN.findall(sql_query.lower()))
+    return {name for name in schemas if name.lower() in identifiers}
+
+def measure_recall(sql_query: str, schemas: Dict[str, Any], selected_tables: List[str]) -> Dict[str, Any]:
+    """
+    Estimate pruning recall from the generated SQL
+
+    Recall is the share of tables referenced by the SQL (matched against the
+    full schema) that were included in the pruned prompt.
+    """
+    referenced = referenced_tables(sql_query, schemas)
+    missing = sorted(referenced - set(selected_tables))
+
+    return {
+        'referenced_tables': sorted(referenced),
+        'missing_tables': missing,
+        'recall': round(1 - len(missing) / len(referenced), 4) if referenced else 1.0
+    }
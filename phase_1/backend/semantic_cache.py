@@ -0,0 +1,250 @@
+"""
+Similarity lookup for paraphrased questions (lexical TF-IDF sketches, no external model)
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Any, Optional, Set, Tuple
+from cloudwatch_logger import get_logger
+
+logger = get_logger(__name__)
+
+_WORD_PATTERN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+_QUOTED_PATTERN = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+
+# Filler words; unlike schema retrieval, intent words (top, count, per, ...) are kept
+_STOPWORDS = {
+    'a', 'all', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'by', 'can', 'could',
+    'display', 'do', 'does', 'find', 'for', 'from', 'get', 'give', 'i', 'in', 'is',
+    'it', 'me', 'my', 'of', 'on', 'our', 'please', 'return', 'see', 'show', 'tell',
+    'that', 'the', 'their', 'there', 'these', 'this', 'those', 'to', 'us', 'was',
+    'we', 'were', 'what', 'which', 'with', 'would', 'you'
+}
+
+# Words mapped onto one canonical term so common rewordings share a sketch
+_SYNONYMS = {
+    'highest': 'top', 'most': 'top', 'largest': 'top', 'biggest': 'top', 'best': 'top', 'greatest': 'top',
+    'lowest': 'bottom', 'least': 'bottom', 'smallest': 'bottom', 'worst': 'bottom', 'fewest': 'bottom',
+    'number': 'count', 'total': 'sum', 'avg': 'average', 'mean': 'average',
+    'client': 'customer', 'purchase': 'order', 'earning': 'revenue', 'income': 'revenue', 'sale': 'revenue',
+    'employee': 'staff', 'worker': 'staff'
+}
+
+# Multi-word phrases rewritten before tokenizing
+_PHRASES = [
+    (re.compile(r"\bhow many\b"), "count"),
+    (re.compile(r"\bnumber of\b"), "count"),
+    (re.compile(r"\bhow much\b"), "sum")
+]
+
+# Terms whose presence changes the answer outright; they must match exactly
+_NEGATIONS = {'not', 'no', 'without', 'never', 'except', 'excluding', 'exclude', 'non', 'none'}
+
+def _normalize(token: str) -> str:
+    """Crude-stem plurals and map synonyms"""
+    if not token[0].isdigit():
+        if len(token) > 3 and token.endswith('ies'):
+            token = token[:-3] + 'y'
+        elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+    return _SYNONYMS.get(token, token)
+
+def sketch(question: str) -> Tuple[Counter, Tuple]:
+    """
+    Build the lexical sketch of a question
+
+    Returns:
+        (terms, guard) - term counts used for similarity, and the literals
+        (numbers, quoted strings, negations) that must be identical for two
+        questions to share SQL
+    """
+    lowered = question.lower()
+    for pattern, replacement in _PHRASES:
+        lowered = pattern.sub(replacement, lowered)
+    quoted = tuple(sorted(a or b for a, b in _QUOTED_PATTERN.findall(lowered)))
+
+    terms = Counter()
+    numbers = []
+    negations = set()
+    for token in _WORD_PATTERN.findall(lowered):
+        if token in _STOPWORDS:
+            continue
+        if token[0].isdigit():
+            numbers.append(token)
+        elif token in _NEGATIONS:
+            negations.add(token)
+        terms[_normalize(token)] += 1
+
+    return terms, (tuple(sorted(numbers)), quoted, tuple(sorted(negations)))
+
+class SemanticIndex:
+    """
+    Nearest-neighbour index of cached questions, per (database, schema version)
+
+    Each cached question is stored as a TF-IDF weighted term sketch with an
+    inverted index over its terms. A lookup scores every cached question
+    sharing at least one term by cosine similarity and returns the best one
+    at or above `threshold`, provided its guard literals match.
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 5000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        # (database_name, schema_version) -> {'entries': OrderedDict, 'postings': {term: set}}
+        self._indexes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        logger.info(f"SemanticIndex initialized", extra={
+            "extra_fields": {
+                "threshold": threshold,
+                "max_entries": max_entries
+            }
+        })
+
+    def _get_index(self, database_name: str, schema_version: str) -> Dict[str, Any]:
+        """Get the index for a database/schema version; caller must hold the lock"""
+        key = (database_name, schema_version)
+        index = self._indexes.get(key)
+        if index is None:
+            # Entries for an older schema version can never match again
+            for stale in [k for k in self._indexes if k[0] == database_name]:
+                del self._indexes[stale]
+            index = {'entries': OrderedDict(), 'postings': {}}
+            self._indexes[key] = index
+        return index
+
+    def _remove(self, index: Dict[str, Any], cache_key: str) -> None:
+        """Remove an entry and its postings; caller must hold the lock"""
+        entry = index['entries'].pop(cache_key, None)
+        if entry is None:
+            return
+        for term in entry['terms']:
+            postings = index['postings'].get(term)
+            if postings is not None:
+                postings.discard(cache_key)
+                if not postings:
+                    del index['postings'][term]
+
+    def add(
+        self,
+        question: str,
+        database_name: str,
+        schema_version: str,
+        cache_key: str,
+        generated_sql: str,
+        ttl_seconds: float
+    ) -> None:
+        """Index a cached question"""
+        terms, guard = sketch(question)
+        if not terms:
+            return
+
+        with self._lock:
+            index = self._get_index(database_name, schema_version)
+            self._remove(index, cache_key)
+
+            index['entries'][cache_key] = {
+                'question': question,
+                'terms': terms,
+                'guard': guard,
+                'generated_sql': generated_sql,
+                'expires_at': time.time() + ttl_seconds
+            }
+            for term in terms:
+                index['postings'].setdefault(term, set()).add(cache_key)
+
+            while len(index['entries']) > self.max_entries:
+                oldest = next(iter(index['entries']))
+                self._remove(index, oldest)
+
+    def _weights(self, terms: Counter, postings: Dict[str, Set[str]], doc_count: int) -> Dict[str, float]:
+        """TF-IDF weights of a sketch against an index"""
+        return {
+            term: count * math.log(1 + (doc_count + 1) / (len(postings.get(term, ())) + 1))
+            for term, count in terms.items()
+        }
+
+    def lookup(self, question: str, database_name: str, schema_version: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the most similar cached question
+
+        Returns:
+            Dict with 'cache_key', 'question', 'generated_sql' and 'similarity'
+            if the best candidate reaches the threshold, else None. The best
+            score is logged either way.
+        """
+        start_time = time.time()
+        terms, guard = sketch(question)
+        if not terms:
+            return None
+
+        best = None
+        best_key = None
+        best_score = 0.0
+        candidate_count = 0
+
+        with self._lock:
+            index = self._indexes.get((database_name, schema_version))
+            if index is None:
+                return None
+
+            entries = index['entries']
+            postings = index['postings']
+            doc_count = len(entries)
+
+            candidates = set()
+            for term in terms:
+                candidates |= postings.get(term, set())
+            candidate_count = len(candidates)
+
+            query_weights = self._weights(terms, postings, doc_count)
+            query_norm = math.sqrt(sum(w * w for w in query_weights.values()))
+            now = time.time()
+
+            expired = []
+            for cache_key in candidates:
+                entry = entries[cache_key]
+                if entry['expires_at'] <= now:
+                    expired.append(cache_key)
+                    continue
+
+                entry_weights = self._weights(entry['terms'], postings, doc_count)
+                entry_norm = math.sqrt(sum(w * w for w in entry_weights.values()))
+                dot = sum(weight * entry_weights.get(term, 0.0) for term, weight in query_weights.items())
+                score = dot / (query_norm * entry_norm) if query_norm and entry_norm else 0.0
+
+                # Never reuse SQL across different numbers, literals or negations
+                if score > best_score and entry['guard'] == guard:
+                    best, best_key, best_score = entry, cache_key, score
+
+            for cache_key in expired:
+                self._remove(index, cache_key)
+
+        matched = best is not None and best_score >= self.threshold
+
+        logger.info(f"Semantic cache {'HIT' if matched else 'MISS'}", extra={
+            "extra_fields": {
+                "database_name": database_name,
+                "similarity": round(best_score, 4),
+                "threshold": self.threshold,
+                "candidate_count": candidate_count,
+                "matched_question": best['question'] if best is not None else None,
+                "lookup_time_ms": round((time.time() - start_time) * 1000, 3)
+            }
+        })
+
+        if not matched:
+            return None
+
+        return {
+            'cache_key': best_key,
+            'question': best['question'],
+            'generated_sql': best['generated_sql'],
+            'similarity': round(best_score, 4)
+        }
+
+    def __len__(self) -> int:
+        return sum(len(index['entries']) for index in self._indexes.values())
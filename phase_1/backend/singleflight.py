@@ -0,0 +1,86 @@
+"""
+In-flight request coalescing ("singleflight") for expensive async calls
+"""
+import asyncio
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+from cloudwatch_logger import get_logger
+
+logger = get_logger(__name__)
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls that share a key
+
+    The first caller for a key (the leader) does the work; callers arriving
+    while it is in flight await the leader's result instead of repeating the
+    call. Nothing is remembered once the call finishes - that is the query
+    cache's job.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+
+    def in_flight(self, key: str) -> Optional[asyncio.Future]:
+        """Get the future of the call currently in flight for a key, if any"""
+        return self._flights.get(key)
+
+    def begin(self, key: str) -> asyncio.Future:
+        """Register the caller as leader for a key; it must call end() when done"""
+        future = asyncio.get_running_loop().create_future()
+        # Mark errors as retrieved even when nobody joined the flight
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._flights[key] = future
+        return future
+
+    def end(self, key: str, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Publish the leader's result (or error) to every waiting caller"""
+        future = self._flights.pop(key, None)
+        if future is None or future.done():
+            return
+
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def join(self, key: str, future: asyncio.Future) -> Any:
+        """Wait for another caller's in-flight result"""
+        logger.info(f"Joined in-flight request", extra={
+            "extra_fields": {"flight_key": key[:16]}
+        })
+        # Shield so a disconnecting follower doesn't cancel the leader's call
+        return await asyncio.shield(future)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run func once per key across concurrent callers
+
+        Returns:
+            (result, shared) - shared is True if the result came from another
+            caller's in-flight call
+        """
+        future = self.in_flight(key)
+        if future is not None:
+            try:
+                return await self.join(key, future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader went away before finishing; take over
+                if self.in_flight(key) is not None:
+                    return await self.do(key, func)
+
+        self.begin(key)
+        try:
+            result = await func()
+        except BaseException as e:
+            self.end(key, error=e)
+            raise
+
+        self.end(key, result=result)
+        return result, False
+
+    def __len__(self) -> int:
+        return len(self._flights)
@@ -1,60 +1,133 @@
 """
 Claude API integration for SQL query generation with LangFuse observability
+
+The anthropic and langfuse packages are imported on first use (or by
+init_anthropic_client()/init_langfuse() at startup), not at import time.
 """
-from anthropic import Anthropic
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, Optional, Tuple, AsyncIterator
 from config import settings
 from cloudwatch_logger import get_logger
+from schema_retriever import SchemaRetriever, measure_recall
+from metrics import LLM_REQUESTS, LLM_REQUEST_DURATION, LLM_TOKENS, LLM_COST
+from telemetry import TelemetryExporter
 import time
 
 logger = get_logger(__name__)
 
-# Try to import LangFuse
-try:
-    from langfuse import Langfuse
-    from langfuse.types import TraceContext
-    LANGFUSE_AVAILABLE = True
-except ImportError:
-    LANGFUSE_AVAILABLE = False
-    Langfuse = None
-    TraceContext = None
+# LangFuse client and its background exporter, set by init_langfuse() (None = observability off)
+langfuse_client = None
+telemetry_exporter: Optional[TelemetryExporter] = None
+TraceContext = None
 
-# Initialize LangFuse client
-langfuse_client: Optional[Langfuse] = None
-if LANGFUSE_AVAILABLE and settings.enable_langfuse and settings.langfuse_public_key and settings.langfuse_secret_key:
+def init_langfuse() -> bool:
+    """
+    Import and create the LangFuse client if it is enabled and configured
+    
+    Blocking (imports langfuse, which is slow); run it off the event loop.
+    Until it has run, generations are simply not traced.
+    
+    Returns:
+        True if LangFuse observability is live
+    """
+    global langfuse_client, telemetry_exporter, TraceContext
+    
+    if not settings.enable_langfuse:
+        logger.info("LangFuse observability disabled (ENABLE_LANGFUSE=false)")
+        return False
+    if not (settings.langfuse_public_key and settings.langfuse_secret_key):
+        logger.info("LangFuse observability disabled (missing credentials)")
+        return False
+    
     try:
-        langfuse_client = Langfuse(
+        from langfuse import Langfuse
+        from langfuse.types import TraceContext as LangfuseTraceContext
+    except ImportError:
+        logger.info("LangFuse module not available - install with: pip install langfuse")
+        return False
+    
+    try:
+        client = Langfuse(
             public_key=settings.langfuse_public_key,
             secret_key=settings.langfuse_secret_key,
             host=settings.langfuse_host
         )
-        logger.info("✅ LangFuse observability enabled", extra={
-            "extra_fields": {"host": settings.langfuse_host}
-        })
     except Exception as e:
         logger.warning(f"Failed to initialize LangFuse, continuing without observability", extra={
             "extra_fields": {"error": str(e)}
         })
-        langfuse_client = None
-else:
-    if not LANGFUSE_AVAILABLE:
-        logger.info("LangFuse module not available - install with: pip install langfuse")
-    elif not settings.enable_langfuse:
-        logger.info("LangFuse observability disabled (ENABLE_LANGFUSE=false)")
-    else:
-        logger.info("LangFuse observability disabled (missing credentials)")
+        return False
+    
+    TraceContext = LangfuseTraceContext
+    telemetry_exporter = TelemetryExporter(
+        client,
+        flush_interval_seconds=settings.langfuse_flush_interval_seconds,
+        max_queue_size=settings.langfuse_queue_max_size,
+        batch_size=settings.langfuse_batch_size,
+        sample_rate=settings.langfuse_sample_rate,
+        team_sample_rates=settings.langfuse_team_sample_rates
+    )
+    langfuse_client = client
+    logger.info("✅ LangFuse observability enabled", extra={
+        "extra_fields": {"host": settings.langfuse_host}
+    })
+    return True
+
+def get_telemetry_stats() -> Optional[Dict[str, Any]]:
+    """Get the LangFuse exporter counters, or None if LangFuse is not active"""
+    return telemetry_exporter.get_stats() if telemetry_exporter else None
+
+def close_telemetry() -> None:
+    """Export queued LangFuse events and stop the exporter; call on shutdown"""
+    if telemetry_exporter is not None:
+        telemetry_exporter.close()
+
+# Shared Anthropic client (one HTTP connection pool with keep-alive for all requests)
+_anthropic_client = None
+_anthropic_client_lock = threading.Lock()
+
+def get_anthropic_client():
+    """Get (or lazily create) the process-wide async Anthropic client"""
+    global _anthropic_client
+    if _anthropic_client is None:
+        with _anthropic_client_lock:
+            if _anthropic_client is None:
+                from anthropic import AsyncAnthropic
+                _anthropic_client = AsyncAnthropic(api_key=settings.anthropic_api_key)
+                logger.info("Anthropic client initialized")
+    return _anthropic_client
+
+def init_anthropic_client() -> bool:
+    """Create the Anthropic client ahead of the first request (blocking import)"""
+    get_anthropic_client()
+    return True
+
+async def close_anthropic_client() -> None:
+    """Close the shared Anthropic client and its connections"""
+    global _anthropic_client
+    if _anthropic_client is not None:
+        await _anthropic_client.close()
+        _anthropic_client = None
 
 class SQLGenerator:
     """Generates SQL queries from natural language using Claude"""
     
     def __init__(self):
-        self.client = Anthropic(api_key=settings.anthropic_api_key)
         self.model = "claude-sonnet-4-5-20250929"
+        self.retriever = SchemaRetriever(
+            top_k=settings.schema_pruning_top_k,
+            min_tables=settings.schema_pruning_min_tables
+        ) if settings.enable_schema_pruning else None
         logger.info("SQLGenerator initialized successfully", extra={
             "extra_fields": {"model": self.model}
         })
     
-    def generate_sql(
+    @property
+    def client(self):
+        """Shared Anthropic client (created on first use)"""
+        return get_anthropic_client()
+    
+    async def generate_sql(
         self, 
         natural_language_query: str, 
         database_schema: Dict[str, Any],
@@ -65,11 +138,91 @@ class SQLGenerator:
         """Generate SQL query from natural language"""
         
         start_time = time.time()
-        trace_id = langfuse_client.create_trace_id() if langfuse_client else None
+        trace_context = self._start_generation(natural_language_query, database_name, user_id, session_id)
+        
+        try:
+            request_kwargs, pruning = self._build_request(natural_language_query, database_schema, database_name)
+            
+            # Call Claude API
+            api_start_time = time.time()
+            message = await self.client.messages.create(**request_kwargs)
+            api_duration = time.time() - api_start_time
+            
+            return self._finish_generation(
+                message, natural_language_query, database_schema, database_name, user_id,
+                pruning, trace_context, start_time, api_duration
+            )
+            
+        except Exception as e:
+            return self._fail_generation(e, natural_language_query, database_name, user_id, trace_context, start_time)
+    
+    async def generate_sql_stream(
+        self,
+        natural_language_query: str,
+        database_schema: Dict[str, Any],
+        database_name: str,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate SQL query from natural language, streaming tokens as they arrive
+        
+        Yields:
+            {'type': 'delta', 'text': ...} for each text chunk, then a single
+            {'type': 'result', ...} carrying the same dict generate_sql returns
+            (with the SQL cleaned by _clean_sql_query)
+        """
+        start_time = time.time()
+        trace_context = self._start_generation(natural_language_query, database_name, user_id, session_id)
+        
+        try:
+            request_kwargs, pruning = self._build_request(natural_language_query, database_schema, database_name)
+            
+            # Stream from Claude API
+            api_start_time = time.time()
+            first_token_time = None
+            
+            async with self.client.messages.stream(**request_kwargs) as stream:
+                async for text in stream.text_stream:
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                        logger.debug("First SQL token received", extra={
+                            "extra_fields": {
+                                "database": database_name,
+                                "time_to_first_token_ms": round((first_token_time - api_start_time) * 1000, 2)
+                            }
+                        })
+                    yield {'type': 'delta', 'text': text}
+                
+                message = await stream.get_final_message()
+            
+            api_duration = time.time() - api_start_time
+            
+            result = self._finish_generation(
+                message, natural_language_query, database_schema, database_name, user_id,
+                pruning, trace_context, start_time, api_duration
+            )
+            
+        except Exception as e:
+            result = self._fail_generation(e, natural_language_query, database_name, user_id, trace_context, start_time)
+        
+        yield {'type': 'result', **result}
+    
+    def _start_generation(
+        self,
+        natural_language_query: str,
+        database_name: str,
+        user_id: Optional[str],
+        session_id: Optional[str]
+    ) -> Optional[Any]:
+        """Create the LangFuse trace context (if sampled) and log the start of a generation"""
+        trace_id = None
+        if langfuse_client and telemetry_exporter and telemetry_exporter.should_sample(user_id):
+            trace_id = langfuse_client.create_trace_id()
         
         # Create trace context
         trace_context = None
-        if langfuse_client and trace_id:
+        if trace_id:
             trace_context = TraceContext(
                 trace_id=trace_id,
                 user_id=user_id,
@@ -89,19 +242,190 @@ class SQLGenerator:
             }
         })
         
-        try:
-            # Format schema
-            schema_text = self._format_schema(database_schema)
-            
-            # Create prompt
-            prompt = f"""You are an expert SQL query generator for PostgreSQL databases. Your task is to convert natural language questions into accurate SQL queries.
-
-DATABASE: {database_name}
-
-AVAILABLE TABLES AND SCHEMAS:
-{schema_text}
-
-USER QUESTION: {natural_language_query}
+        return trace_context
+    
+    def _build_request(
+        self,
+        natural_language_query: str,
+        database_schema: Dict[str, Any],
+        database_name: str
+    ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Build the Messages API arguments and the schema pruning result"""
+        # Keep only the tables relevant to the question (plus FK neighbours)
+        pruning = None
+        prompt_schema = database_schema
+        if self.retriever:
+            pruning = self.retriever.select(natural_language_query, database_schema)
+            prompt_schema = pruning['schemas']
+        
+        # Format schema
+        schema_text = self._format_schema(prompt_schema)
+        
+        # Instructions, then the schema. A full schema is stable per database,
+        # so instructions + schema are cached as one prefix (a breakpoint on
+        # the instructions alone would be below the minimum cacheable size).
+        # A pruned schema depends on the question, so prompt caching is off
+        # when pruning applies rather than writing a new entry on every call.
+        schema_block = {
+            "type": "text",
+            "text": self._build_schema_prompt(database_name, schema_text)
+        }
+        if not (pruning and pruning['pruned']):
+            schema_block["cache_control"] = {"type": "ephemeral"}
+        
+        request_kwargs = {
+            "model": self.model,
+            "max_tokens": 1024,
+            "system": [
+                {
+                    "type": "text",
+                    "text": self._build_system_prompt()
+                },
+                schema_block
+            ],
+            "messages": [{"role": "user", "content": f"USER QUESTION: {natural_language_query}\n\nSQL QUERY:"}]
+        }
+        
+        return request_kwargs, pruning
+    
+    def _finish_generation(
+        self,
+        message,
+        natural_language_query: str,
+        database_schema: Dict[str, Any],
+        database_name: str,
+        user_id: Optional[str],
+        pruning: Optional[Dict[str, Any]],
+        trace_context: Optional[Any],
+        start_time: float,
+        api_duration: float
+    ) -> Dict[str, Any]:
+        """Extract the SQL from a completed response and record usage"""
+        # Extract SQL
+        sql_query = message.content[0].text.strip()
+        sql_query = self._clean_sql_query(sql_query)
+        
+        total_duration = time.time() - start_time
+        usage = self._get_usage(message)
+        trace_id = trace_context.get('trace_id') if trace_context else None
+        
+        LLM_REQUESTS.inc(database=database_name, outcome="success")
+        LLM_REQUEST_DURATION.observe(api_duration, database=database_name)
+        LLM_TOKENS.inc(usage['input_tokens'], database=database_name, kind="input")
+        LLM_TOKENS.inc(usage['output_tokens'], database=database_name, kind="output")
+        LLM_TOKENS.inc(usage['cache_read_input_tokens'], database=database_name, kind="cache_read")
+        LLM_TOKENS.inc(usage['cache_creation_input_tokens'], database=database_name, kind="cache_creation")
+        LLM_COST.inc(usage['cost_usd'], database=database_name)
+        
+        recall = None
+        if pruning and pruning['pruned']:
+            recall = measure_recall(sql_query, database_schema, pruning['selected_tables'])
+            logger.info("Schema pruning recall", extra={
+                "extra_fields": {
+                    "database": database_name,
+                    "pruning_ratio": pruning['pruning_ratio'],
+                    "selected_count": len(pruning['selected_tables']),
+                    "table_count": len(database_schema),
+                    "recall": recall['recall'],
+                    "referenced_tables": recall['referenced_tables'],
+                    "missing_tables": recall['missing_tables']
+                }
+            })
+        
+        # Queue the LangFuse event; the exporter sends it off the request path
+        if telemetry_exporter and trace_context:
+            telemetry_exporter.record(
+                trace_context=trace_context,
+                name="text2sql_generation",
+                input=natural_language_query,
+                output=sql_query,
+                metadata={
+                    "database": database_name,
+                    "team": user_id,
+                    "model": self.model,
+                    "input_tokens": usage['input_tokens'],
+                    "output_tokens": usage['output_tokens'],
+                    "cache_creation_input_tokens": usage['cache_creation_input_tokens'],
+                    "cache_read_input_tokens": usage['cache_read_input_tokens'],
+                    "total_tokens": usage['total_tokens'],
+                    "cost_usd": usage['cost_usd'],
+                    "api_latency_ms": round(api_duration * 1000, 2),
+                    "total_latency_ms": round(total_duration * 1000, 2),
+                    "query_length": len(sql_query),
+                    "schema_pruned": bool(pruning and pruning['pruned']),
+                    "pruning_ratio": pruning['pruning_ratio'] if pruning else 0.0,
+                    "pruning_recall": recall['recall'] if recall else None,
+                    "success": True
+                },
+                level="DEFAULT"
+            )
+        
+        logger.info("SQL generation successful", extra={
+            "extra_fields": {
+                "database": database_name,
+                "cache_read_input_tokens": usage['cache_read_input_tokens'],
+                "cache_creation_input_tokens": usage['cache_creation_input_tokens'],
+                "api_latency_ms": round(api_duration * 1000, 2),
+                "total_time_ms": round(total_duration * 1000, 2),
+                "trace_id": trace_id
+            }
+        })
+        
+        return {
+            'success': True,
+            'sql_query': sql_query,
+            'usage': usage
+        }
+    
+    def _fail_generation(
+        self,
+        error: Exception,
+        natural_language_query: str,
+        database_name: str,
+        user_id: Optional[str],
+        trace_context: Optional[Any],
+        start_time: float
+    ) -> Dict[str, Any]:
+        """Record a failed generation and build the error result"""
+        total_duration = time.time() - start_time
+        trace_id = trace_context.get('trace_id') if trace_context else None
+        LLM_REQUESTS.inc(database=database_name, outcome="error")
+        
+        # Queue the LangFuse error event
+        if telemetry_exporter and trace_context:
+            telemetry_exporter.record(
+                trace_context=trace_context,
+                name="text2sql_generation_error",
+                input=natural_language_query,
+                metadata={
+                    "database": database_name,
+                    "team": user_id,
+                    "model": self.model,
+                    "error": str(error),
+                    "error_type": type(error).__name__,
+                    "total_latency_ms": round(total_duration * 1000, 2),
+                    "success": False
+                },
+                level="ERROR",
+                status_message=str(error)
+            )
+        
+        logger.error("SQL generation failed", extra={
+            "extra_fields": {
+                "database": database_name,
+                "error": str(error),
+                "trace_id": trace_id
+            }
+        }, exc_info=error)
+        
+        return {
+            'success': False,
+            'error': str(error)
+        }
+    
+    def _build_system_prompt(self) -> str:
+        """Build the instructions, the part of the system prompt shared by every call"""
+        return """You are an expert SQL query generator for PostgreSQL databases. Your task is to convert natural language questions into accurate SQL queries using the database and schemas given below.
 
 INSTRUCTIONS:
 1. Generate a PostgreSQL-compatible SQL query that answers the user's question
@@ -112,112 +436,44 @@ INSTRUCTIONS:
 6. Include LIMIT clauses when appropriate
 7. Return ONLY the SQL query without any markdown formatting or explanations
 
-IMPORTANT: Return ONLY the raw SQL query
+IMPORTANT: Return ONLY the raw SQL query"""
+    
+    def _build_schema_prompt(self, database_name: str, schema_text: str) -> str:
+        """Build the system prompt block describing the database (full or pruned schema)"""
+        return f"""DATABASE: {database_name}
 
-SQL QUERY:"""
-            
-            # Call Claude API
-            api_start_time = time.time()
-            
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=1024,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            api_duration = time.time() - api_start_time
-            
-            # Extract SQL
-            sql_query = message.content[0].text.strip()
-            sql_query = self._clean_sql_query(sql_query)
-            
-            total_duration = time.time() - start_time
-            
-            # Log to LangFuse using create_event with trace_context
-            if langfuse_client and trace_context:
-                try:
-                    input_tokens = message.usage.input_tokens if hasattr(message, 'usage') else 0
-                    output_tokens = message.usage.output_tokens if hasattr(message, 'usage') else 0
-                    
-                    # Calculate cost (Claude Sonnet 4.5: $3 per M input, $15 per M output)
-                    cost = (input_tokens * 3 / 1_000_000) + (output_tokens * 15 / 1_000_000)
-                    
-                    langfuse_client.create_event(
-                        trace_context=trace_context,
-                        name="text2sql_generation",
-                        input=natural_language_query,
-                        output=sql_query,
-                        metadata={
-                            "database": database_name,
-                            "team": user_id,
-                            "model": self.model,
-                            "input_tokens": input_tokens,
-                            "output_tokens": output_tokens,
-                            "total_tokens": input_tokens + output_tokens,
-                            "cost_usd": round(cost, 6),
-                            "api_latency_ms": round(api_duration * 1000, 2),
-                            "total_latency_ms": round(total_duration * 1000, 2),
-                            "query_length": len(sql_query),
-                            "success": True
-                        },
-                        level="DEFAULT"
-                    )
-                    langfuse_client.flush()
-                    logger.debug("✅ Logged to LangFuse successfully")
-                except Exception as e:
-                    logger.debug(f"Failed to log to LangFuse: {e}")
-            
-            logger.info("SQL generation successful", extra={
-                "extra_fields": {
-                    "database": database_name,
-                    "total_time_ms": round(total_duration * 1000, 2),
-                    "trace_id": trace_id
-                }
-            })
-            
-            return {
-                'success': True,
-                'sql_query': sql_query
-            }
-            
-        except Exception as e:
-            total_duration = time.time() - start_time
-            
-            # Log error to LangFuse
-            if langfuse_client and trace_context:
-                try:
-                    langfuse_client.create_event(
-                        trace_context=trace_context,
-                        name="text2sql_generation_error",
-                        input=natural_language_query,
-                        metadata={
-                            "database": database_name,
-                            "team": user_id,
-                            "model": self.model,
-                            "error": str(e),
-                            "error_type": type(e).__name__,
-                            "total_latency_ms": round(total_duration * 1000, 2),
-                            "success": False
-                        },
-                        level="ERROR",
-                        status_message=str(e)
-                    )
-                    langfuse_client.flush()
-                except Exception as trace_error:
-                    logger.debug(f"Failed to log error to LangFuse: {trace_error}")
-            
-            logger.error("SQL generation failed", extra={
-                "extra_fields": {
-                    "database": database_name,
-                    "error": str(e),
-                    "trace_id": trace_id
-                }
-            }, exc_info=True)
-            
-            return {
-                'success': False,
-                'error': str(e)
-            }
+AVAILABLE TABLES AND SCHEMAS:
+{schema_text}"""
+    
+    def _get_usage(self, message) -> Dict[str, Any]:
+        """
+        Extract token usage and cost from a Claude response
+        
+        input_tokens excludes prompt-cache reads and writes, which are billed
+        separately (Claude Sonnet 4.5: $3 per M input, $3.75 per M cache write,
+        $0.30 per M cache read, $15 per M output).
+        """
+        usage = getattr(message, 'usage', None)
+        input_tokens = getattr(usage, 'input_tokens', 0) or 0
+        output_tokens = getattr(usage, 'output_tokens', 0) or 0
+        cache_creation_input_tokens = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        cache_read_input_tokens = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        
+        cost = (
+            input_tokens * 3
+            + cache_creation_input_tokens * 3.75
+            + cache_read_input_tokens * 0.30
+            + output_tokens * 15
+        ) / 1_000_000
+        
+        return {
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cache_creation_input_tokens': cache_creation_input_tokens,
+            'cache_read_input_tokens': cache_read_input_tokens,
+            'total_tokens': input_tokens + cache_creation_input_tokens + cache_read_input_tokens + output_tokens,
+            'cost_usd': round(cost, 6)
+        }
     
     def _format_schema(self, database_schema: Dict[str, Any]) -> str:
         """Format database schema into readable text"""
@@ -0,0 +1,200 @@
+"""
+Background exporter for LangFuse observability events
+"""
+import queue
+import random
+import threading
+import time
+from typing import Dict, Any, Optional
+from cloudwatch_logger import get_logger
+
+logger = get_logger(__name__)
+
+class TelemetryExporter:
+    """
+    Sends LangFuse events from a background thread
+
+    record() only samples the event and puts it on a bounded queue, so a
+    generation never waits on LangFuse. The exporter thread hands queued
+    events to the client in batches of up to `batch_size` and flushes the
+    client once per batch, every `flush_interval_seconds` (sooner when a
+    batch fills up) and on close. When the queue is full the event is
+    dropped and counted.
+
+    Sampling is per team: `team_sample_rates` overrides `sample_rate` for
+    the teams it lists. The decision is made once per generation (see
+    should_sample) so a sampled trace keeps all its events.
+    """
+
+    def __init__(
+        self,
+        client,
+        flush_interval_seconds: float = 5.0,
+        max_queue_size: int = 1000,
+        batch_size: int = 100,
+        sample_rate: float = 1.0,
+        team_sample_rates: Optional[Dict[str, float]] = None
+    ):
+        self.client = client
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self.sample_rate = sample_rate
+        self.team_sample_rates = dict(team_sample_rates or {})
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'sampled': 0,
+            'sampled_out': 0,
+            'queued': 0,
+            'exported': 0,
+            'batches': 0,
+            'dropped_queue_full': 0,
+            'export_errors': 0,
+            'record_time_ms_total': 0.0,
+            'record_time_ms_max': 0.0,
+            'flush_time_ms_total': 0.0
+        }
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="langfuse-exporter", daemon=True)
+        self._thread.start()
+
+        logger.info(f"TelemetryExporter initialized", extra={
+            "extra_fields": {
+                "flush_interval_seconds": flush_interval_seconds,
+                "max_queue_size": max_queue_size,
+                "batch_size": batch_size,
+                "sample_rate": sample_rate,
+                "team_sample_rates": self.team_sample_rates
+            }
+        })
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        """Increment an exporter counter"""
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def should_sample(self, team: Optional[str]) -> bool:
+        """Decide whether a generation by this team is traced"""
+        rate = self.team_sample_rates.get(team, self.sample_rate) if team else self.sample_rate
+        sampled = rate >= 1.0 or random.random() < rate
+        self._count('sampled' if sampled else 'sampled_out')
+        return sampled
+
+    def record(self, **event) -> None:
+        """Queue a create_event() call for the exporter thread (never blocks)"""
+        start_time = time.perf_counter()
+        try:
+            self._queue.put_nowait(event)
+            self._count('queued')
+        except queue.Full:
+            self._count('dropped_queue_full')
+
+        duration_ms = (time.perf_counter() - start_time) * 1000
+        with self._stats_lock:
+            self._stats['record_time_ms_total'] += duration_ms
+            self._stats['record_time_ms_max'] = max(self._stats['record_time_ms_max'], duration_ms)
+
+    def _run(self):
+        """Background loop: export batches until stopped, then drain the queue"""
+        while not self._stop.is_set():
+            self._export(self._collect_batch(self.flush_interval_seconds))
+
+        while not self._queue.empty():
+            self._export(self._collect_batch(0))
+
+    def _collect_batch(self, wait_seconds: float) -> list:
+        """Take up to batch_size queued events, waiting up to wait_seconds for them"""
+        batch = []
+        deadline = time.monotonic() + wait_seconds
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if isinstance(item, threading.Event):
+                # flush() marker: export what we have now, then wake the caller
+                self._export(batch)
+                item.set()
+                batch = []
+                deadline = time.monotonic()
+                continue
+
+            batch.append(item)
+
+        return batch
+
+    def _export(self, batch: list) -> None:
+        """Hand a batch to the LangFuse client and flush it once"""
+        if not batch:
+            return
+
+        start_time = time.time()
+        exported = 0
+        for event in batch:
+            try:
+                self.client.create_event(**event)
+                exported += 1
+            except Exception as e:
+                self._count('export_errors')
+                logger.debug(f"Failed to log to LangFuse: {e}")
+
+        try:
+            self.client.flush()
+        except Exception as e:
+            self._count('export_errors')
+            logger.debug(f"Failed to flush LangFuse: {e}")
+
+        duration = time.time() - start_time
+        self._count('exported', exported)
+        self._count('batches')
+        self._count('flush_time_ms_total', duration * 1000)
+
+        logger.debug(f"Exported LangFuse events", extra={
+            "extra_fields": {
+                "event_count": exported,
+                "duration_ms": round(duration * 1000, 2)
+            }
+        })
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """Export everything queued so far and wait for it (up to timeout seconds)"""
+        if not self._thread.is_alive():
+            return
+
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Export queued events and stop the exporter thread"""
+        if self._thread.is_alive():
+            self._stop.set()
+            self._thread.join(timeout=timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, export counters and the time record() added to requests"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        recorded = stats['queued'] + stats['dropped_queue_full']
+        return {
+            'sampled': stats['sampled'],
+            'sampled_out': stats['sampled_out'],
+            'queued': stats['queued'],
+            'exported': stats['exported'],
+            'batches': stats['batches'],
+            'dropped_queue_full': stats['dropped_queue_full'],
+            'export_errors': stats['export_errors'],
+            'queue_size': self._queue.qsize(),
+            'queue_max_size': self._queue.maxsize,
+            'avg_record_time_ms': round(stats['record_time_ms_total'] / recorded, 4) if recorded else 0,
+            'max_record_time_ms': round(stats['record_time_ms_max'], 4),
+            'avg_batch_export_ms': round(stats['flush_time_ms_total'] / stats['batches'], 2) if stats['batches'] else 0
+        }
@@ -0,0 +1,19 @@
+"""
+Test setup: required settings get dummy values and optional integrations are
+off, so modules import without a database, AWS or API keys
+"""
+import os
+import sys
+
+for name, value in {
+    "DB_HOST": "localhost",
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+    "ANTHROPIC_API_KEY": "test",
+    "ENABLE_CACHE": "false",
+    "ENABLE_LANGFUSE": "false",
+    "ENABLE_CONSOLE_LOGGING": "false"
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,58 @@
+"""
+Prompt caching layout of the Messages API request built by SQLGenerator
+"""
+from config import settings
+from sql_generator import SQLGenerator
+
+def build_schema(table_names):
+    """Minimal schema in the get_all_schemas() format"""
+    return {
+        name: {
+            'comment': None,
+            'columns': [
+                {
+                    'column_name': 'id',
+                    'data_type': 'integer',
+                    'is_nullable': 'NO',
+                    'column_default': None,
+                    'column_comment': None
+                }
+            ],
+            'primary_key': ['id'],
+            'foreign_keys': [],
+            'indexes': []
+        }
+        for name in table_names
+    }
+
+def cached_blocks(request_kwargs):
+    return ['cache_control' in block for block in request_kwargs['system']]
+
+def test_unpruned_schema_is_cached_with_the_instructions():
+    generator = SQLGenerator()
+    schema = build_schema(['orders', 'customers', 'products'])
+
+    request_kwargs, pruning = generator._build_request("total orders per customer", schema, "sales_db")
+
+    assert not (pruning and pruning['pruned'])
+    # Single breakpoint at the end of the schema: instructions + schema is the cached prefix
+    assert cached_blocks(request_kwargs) == [False, True]
+    assert 'Table: products' in request_kwargs['system'][1]['text']
+
+def test_pruned_schema_is_not_cached():
+    generator = SQLGenerator()
+    assert generator.retriever is not None, "schema pruning must be enabled for this test"
+    filler = [f"audit_log_{i:02d}" for i in range(settings.schema_pruning_min_tables + 5)]
+    schema = build_schema(['orders', 'customers'] + filler)
+
+    request_kwargs, pruning = generator._build_request("total orders per customer", schema, "sales_db")
+
+    assert pruning['pruned']
+    assert cached_blocks(request_kwargs) == [False, False]
+    assert 'Table: audit_log_00' not in request_kwargs['system'][1]['text']
+
+def test_instructions_alone_are_never_a_breakpoint():
+    generator = SQLGenerator()
+    for tables in (['orders'], ['orders', 'customers'] + [f"audit_log_{i:02d}" for i in range(40)]):
+        request_kwargs, _ = generator._build_request("orders", build_schema(tables), "sales_db")
+        assert 'cache_control' not in request_kwargs['system'][0]
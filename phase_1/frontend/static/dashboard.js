@@ -14,6 +14,7 @@ let currentQuery = {  // Track current query for feedback
     naturalLanguage: null,
     generatedSql: null
 };
+let currentResult = null;  // Paged result being displayed: handle, next cursor, columns, rows shown
 
 // Initialize dashboard
 function init() {
@@ -47,10 +48,14 @@ function setupEventListeners() {
     
     // Execute query
     document.getElementById('executeBtn').addEventListener('click', executeQuery);
+    document.getElementById('cancelQueryBtn').addEventListener('click', cancelQuery);
     
     // Clear
     document.getElementById('clearBtn').addEventListener('click', clearQuery);
     
+    // Next page of a large result
+    document.getElementById('loadMoreBtn').addEventListener('click', loadMoreResults);
+    
     // Feedback buttons
     document.getElementById('thumbsUpBtn').addEventListener('click', () => submitFeedback('thumbs_up'));
     document.getElementById('thumbsDownBtn').addEventListener('click', () => submitFeedback('thumbs_down'));
@@ -181,19 +186,13 @@ async function generateQuery() {
     clearResults();
     
     try {
-        const response = await fetch(`${API_BASE_URL}/generate-query`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                session_id: sessionId,
-                natural_language_query: naturalLanguageInput
-            })
+        // Stream the SQL in as it is generated; the final event carries the cleaned query
+        const data = await streamGenerateQuery(naturalLanguageInput, (text) => {
+            loadingDiv.style.display = 'none';
+            sqlQueryInput.value += text;
+            sqlQueryInput.scrollTop = sqlQueryInput.scrollHeight;
         });
         
-        const data = await response.json();
-        
         if (data.success) {
             sqlQueryInput.value = data.sql_query;
             executeBtn.disabled = false;
@@ -229,9 +228,67 @@ async function generateQuery() {
     }
 }
 
+async function streamGenerateQuery(naturalLanguageQuery, onDelta) {
+    const response = await fetch(`${API_BASE_URL}/generate-query/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream'
+        },
+        body: JSON.stringify({
+            session_id: sessionId,
+            natural_language_query: naturalLanguageQuery
+        })
+    });
+    
+    if (!response.ok) {
+        const error = await response.json().catch(() => ({}));
+        return { success: false, error: error.detail || `HTTP ${response.status}` };
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        // SSE messages are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const message = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let dataLines = [];
+            message.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trim());
+                }
+            });
+            
+            const payload = JSON.parse(dataLines.join('\n'));
+            if (event === 'delta') {
+                onDelta(payload.text);
+            } else if (event === 'result') {
+                result = payload;
+            }
+        }
+    }
+    
+    return result || { success: false, error: 'Stream ended without a result' };
+}
+
 async function executeQuery() {
     const sqlQueryInput = document.getElementById('sqlQueryInput').value.trim();
     const executeBtn = document.getElementById('executeBtn');
+    const cancelQueryBtn = document.getElementById('cancelQueryBtn');
     const loadingDiv = document.getElementById('loadingResults');
     const errorDiv = document.getElementById('errorMessage');
     const resultsInfoDiv = document.getElementById('resultsInfo');
@@ -245,9 +302,13 @@ async function executeQuery() {
     // Show loading
     loadingDiv.style.display = 'block';
     executeBtn.disabled = true;
+    cancelQueryBtn.disabled = false;
+    cancelQueryBtn.style.display = 'inline-block';
     errorDiv.style.display = 'none';
     resultsInfoDiv.style.display = 'none';
     resultsContainer.innerHTML = '';
+    document.getElementById('loadMoreBtn').style.display = 'none';
+    currentResult = null;
     
     try {
         const response = await fetch(`${API_BASE_URL}/execute-query`, {
@@ -265,14 +326,25 @@ async function executeQuery() {
         
         if (data.success) {
             if (data.data) {
-                // Show results table
-                displayResults(data.data);
-                resultsInfoDiv.textContent = `Query returned ${data.row_count} row(s)`;
-                resultsInfoDiv.style.display = 'block';
+                // Show results table (first page of a large result)
+                currentResult = {
+                    handle: data.result_handle || null,
+                    nextCursor: data.next_cursor || null,
+                    columns: data.columns,
+                    rowCount: data.row_count
+                };
+                displayResults(data.data, data.columns);
+                updateResultsInfo(data.has_more, data.truncated);
             } else {
                 resultsInfoDiv.textContent = data.message || `Query executed successfully. ${data.rows_affected} row(s) affected.`;
                 resultsInfoDiv.style.display = 'block';
             }
+        } else if (data.reason === 'cancelled') {
+            errorDiv.textContent = 'Query cancelled';
+            errorDiv.style.display = 'block';
+        } else if (data.reason === 'timeout') {
+            errorDiv.textContent = 'Query Error: the query took too long and was stopped';
+            errorDiv.style.display = 'block';
         } else {
             errorDiv.textContent = `Query Error: ${data.error}`;
             errorDiv.style.display = 'block';
@@ -284,10 +356,25 @@ async function executeQuery() {
     } finally {
         loadingDiv.style.display = 'none';
         executeBtn.disabled = false;
+        cancelQueryBtn.style.display = 'none';
+    }
+}
+
+async function cancelQuery() {
+    const cancelQueryBtn = document.getElementById('cancelQueryBtn');
+    cancelQueryBtn.disabled = true;
+    
+    try {
+        await fetch(`${API_BASE_URL}/cancel?session_id=${sessionId}`, {
+            method: 'POST'
+        });
+    } catch (error) {
+        console.error('Error cancelling query:', error);
+        cancelQueryBtn.disabled = false;
     }
 }
 
-function displayResults(data) {
+function displayResults(data, columns) {
     const resultsContainer = document.getElementById('resultsContainer');
     
     if (!data || data.length === 0) {
@@ -295,16 +382,22 @@ function displayResults(data) {
         return;
     }
     
-    // Get column names from first row
-    const columns = Object.keys(data[0]);
+    // Column names come with the result (fall back to the first row's keys)
+    columns = columns && columns.length ? columns : Object.keys(data[0]);
     
     // Build table
     let html = '<table class="results-table"><thead><tr>';
     columns.forEach(col => {
         html += `<th>${col}</th>`;
     });
-    html += '</tr></thead><tbody>';
-    
+    html += '</tr></thead><tbody id="resultsBody">';
+    html += buildRows(data, columns);
+    html += '</tbody></table>';
+    resultsContainer.innerHTML = html;
+}
+
+function buildRows(data, columns) {
+    let html = '';
     data.forEach(row => {
         html += '<tr>';
         columns.forEach(col => {
@@ -313,9 +406,63 @@ function displayResults(data) {
         });
         html += '</tr>';
     });
+    return html;
+}
+
+function updateResultsInfo(hasMore, truncated) {
+    const resultsInfoDiv = document.getElementById('resultsInfo');
+    const loadMoreBtn = document.getElementById('loadMoreBtn');
+    
+    if (hasMore) {
+        resultsInfoDiv.textContent = `Showing first ${currentResult.rowCount} row(s)`;
+    } else if (truncated) {
+        resultsInfoDiv.textContent = `Showing ${currentResult.rowCount} row(s); the result was cut off at the row or size limit`;
+    } else {
+        resultsInfoDiv.textContent = `Query returned ${currentResult.rowCount} row(s)`;
+    }
+    resultsInfoDiv.style.display = 'block';
+    loadMoreBtn.style.display = hasMore && currentResult.handle ? 'inline-block' : 'none';
+}
+
+async function loadMoreResults() {
+    const loadMoreBtn = document.getElementById('loadMoreBtn');
+    const errorDiv = document.getElementById('errorMessage');
     
-    html += '</tbody></table>';
-    resultsContainer.innerHTML = html;
+    if (!currentResult || !currentResult.handle) {
+        return;
+    }
+    
+    const result = currentResult;
+    loadMoreBtn.disabled = true;
+    
+    try {
+        const response = await fetch(
+            `${API_BASE_URL}/results/${result.handle}?session_id=${sessionId}&cursor=${result.nextCursor}`
+        );
+        const data = await response.json();
+        
+        // A new query was run meanwhile
+        if (currentResult !== result) {
+            return;
+        }
+        
+        if (response.ok && data.success) {
+            document.getElementById('resultsBody').insertAdjacentHTML('beforeend', buildRows(data.data, result.columns));
+            result.rowCount += data.row_count;
+            result.nextCursor = data.next_cursor;
+            updateResultsInfo(data.has_more, data.truncated);
+        } else {
+            errorDiv.textContent = `Could not load more rows: ${data.error || data.detail}`;
+            errorDiv.style.display = 'block';
+            loadMoreBtn.style.display = 'none';
+        }
+    } catch (error) {
+        console.error('Error loading more results:', error);
+        errorDiv.textContent = 'Network error loading more results';
+        errorDiv.style.display = 'block';
+    } finally {
+        loadMoreBtn.disabled = false;
+    }
 }
 
 async function submitFeedback(rating) {
@@ -387,6 +534,8 @@ function clearResults() {
     document.getElementById('errorMessage').style.display = 'none';
     document.getElementById('resultsInfo').style.display = 'none';
     document.getElementById('resultsContainer').innerHTML = '';
+    document.getElementById('loadMoreBtn').style.display = 'none';
+    currentResult = null;
 }
 
 // Initialize on page load